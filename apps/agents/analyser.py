@@ -1,28 +1,122 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+import hashlib
 import json
 import logging
+import re
 
+from django.conf import settings
+from django.db import transaction
+from ..core.models import PrdSectionAnalysis
 from ..llm.base import BaseLLMService
+from ..llm.concurrency import get_concurrency_limiter
+from ..llm.tokens import estimate_tokens
 from ..knowledge.service import KnowledgeService
+from .json_stream import parse_json_object
+from .prd_sections import PrdSection, split_markdown_sections
 from .prompts import PrdAnalyserPrompt
 from langchain_core.messages import SystemMessage, HumanMessage
 from utils.logger_manager import get_logger
 
+
+# PRD分析配置, 可在settings.PRD_ANALYSIS_CONFIG中覆盖
+DEFAULT_PRD_ANALYSIS_CONFIG = {
+    'map_reduce': True,
+    'section_max_tokens': 3000,   # 文档超过该token数时按章节拆分并发分析, 也是每个章节的token上限
+    'incremental': True,          # 按文档保存各章节的分析结果, 文档修订后只重新分析新增/变更的章节
+}
+
+# 章节在增量分析中的变更状态
+SECTION_ADDED = 'added'
+SECTION_CHANGED = 'changed'
+SECTION_UNCHANGED = 'unchanged'
+
+_PRIORITY_RANK = {'高': 0, '中': 1, '低': 2}
+
+
+def _normalize_title(title: Any) -> str:
+    return re.sub(r'[\s\W_]+', '', str(title or '')).lower()
+
+
+def _storage_key(key: str, max_length: int = 255) -> str:
+    """超出字段长度的标识截断后附加哈希, 保证唯一"""
+    if len(key) <= max_length:
+        return key
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+    return f"{key[:max_length - len(digest) - 1]}~{digest}"
+
+
+def build_summary(test_points: List[Dict[str, Any]]) -> Dict[str, int]:
+    """根据测试点列表在本地计算汇总信息"""
+    priorities = [str(point.get('priority', '')).strip() for point in test_points]
+    return {
+        "total_test_points": len(test_points),
+        "total_test_scenarios": sum(len(point.get('scenarios') or []) for point in test_points),
+        "high_priority_points": priorities.count('高'),
+        "medium_priority_points": priorities.count('中'),
+        "low_priority_points": priorities.count('低'),
+    }
+
+
+def merge_test_points(section_points: List[Tuple[str, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """按章节顺序合并各章节的测试点
+
+    标题相同的测试点合并为一个(保留较高的优先级, 测试场景按标题去重), 并重新编号TP-xxx / TS-xxx-yyy,
+    每个测试点记录来源章节(section)
+    """
+    merged: List[Dict[str, Any]] = []
+    by_title: Dict[str, Dict[str, Any]] = {}
+    for section_title, points in section_points:
+        for point in points:
+            key = _normalize_title(point.get('title'))
+            existing = by_title.get(key)
+            if existing is None:
+                point = {**point, 'scenarios': list(point.get('scenarios') or []), 'section': section_title}
+                by_title[key] = point
+                merged.append(point)
+                continue
+            if _PRIORITY_RANK.get(point.get('priority'), 9) < _PRIORITY_RANK.get(existing.get('priority'), 9):
+                existing['priority'] = point['priority']
+            existing['scenarios'].extend(point.get('scenarios') or [])
+
+    for i, point in enumerate(merged, 1):
+        point['id'] = f"TP-{i:03d}"
+        seen = set()
+        scenarios = []
+        for scenario in point['scenarios']:
+            key = _normalize_title(scenario.get('title'))
+            if key in seen:
+                continue
+            seen.add(key)
+            scenarios.append({**scenario, 'id': f"TS-{i:03d}-{len(scenarios) + 1:03d}"})
+        point['scenarios'] = scenarios
+    return merged
+
+
 class PrdAnalyserAgent:
     """PRD分析Agent，用于从PRD文档中提取测试点和测试场景"""
     
-    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService = None):
+    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService = None,
+                 llm_provider: Optional[str] = None):
         self.llm_service = llm_service
         self.knowledge_service = knowledge_service
         self.prompt = PrdAnalyserPrompt()
+        self.llm_provider = llm_provider
+        self.limiter = get_concurrency_limiter(llm_provider)
+        self.config = {**DEFAULT_PRD_ANALYSIS_CONFIG, **getattr(settings, 'PRD_ANALYSIS_CONFIG', {})}
         self.logger = get_logger(self.__class__.__name__)
     
-    def analyse(self, markdown_content: str) -> Dict[str, Any]:
+    def analyse(self, markdown_content: str, document_key: Optional[str] = None) -> Dict[str, Any]:
         """
         分析PRD文档，提取测试点和测试场景
         
+        文档较大时按章节拆分并发分析(map), 再合并测试点并在本地计算汇总信息(reduce);
+        指定document_key时按章节增量分析, 只有新增/变更的章节调用大模型
+        
         Args:
             markdown_content: Markdown格式的PRD文档内容
+            document_key: 文档标识(如需求单号), 同一文档的不同版本使用相同的标识
             
         Returns:
             包含测试点和测试场景的字典，格式为：
@@ -33,48 +127,180 @@ class PrdAnalyserAgent:
         """
         try:
             self.logger.info(f"开始分析PRD文档，文档长度：{len(markdown_content)} 字符")
+            max_tokens = self.config['section_max_tokens']
+            if document_key and self.config['incremental']:
+                sections = split_markdown_sections(markdown_content, max_tokens)
+                if sections:
+                    return self.analyse_incremental(document_key, sections)
+            if self.config['map_reduce'] and estimate_tokens(markdown_content) > max_tokens:
+                sections = split_markdown_sections(markdown_content, max_tokens)
+                if len(sections) > 1:
+                    return self.analyse_sections(sections)
             
-            # 使用prompt模板格式化消息
-            messages = self.prompt.format_messages(markdown_content=markdown_content)
-            
-            self.logger.info(f"构建后的PRD分析提示词: \n{'='*50}\n{messages}\n{'='*50}")
-            
-            # 调用LLM服务
-            response = self.llm_service.invoke(messages)
-            result = response.content
-            
-            # 解析JSON结果
-            try:
-                if "```json" in result:
-                    json_str = result.split("```json")[1].split("```")[0].strip()
-                elif "```" in result:
-                    json_str = result.split("```")[1].split("```")[0].strip()
-                else:
-                    json_str = result
-                    
-                analysis_result = json.loads(json_str)
-                self.logger.info(f"成功解析PRD分析结果，包含测试点数量：{len(analysis_result.get('test_points', []))}")
-                
-                # 验证分析结果
-                self._validate_analysis_result(analysis_result)
-                
-                return analysis_result
-                
-            except json.JSONDecodeError as e:
-                self.logger.error(f"解析JSON结果失败: {str(e)}")
-                self.logger.error(f"原始响应: {result}")
-                raise ValueError(f"无法解析生成的分析结果: {str(e)}")
+            analysis_result = self._analyse_text(markdown_content)
+            # 验证分析结果
+            self._validate_analysis_result(analysis_result)
+            return analysis_result
                 
         except Exception as e:
             self.logger.error(f"PRD分析过程出错: {str(e)}", exc_info=True)
             raise Exception(f"PRD分析失败: {str(e)}")
     
-    def _validate_analysis_result(self, result: Dict[str, Any]) -> bool:
+    def analyse_sections(self, sections: List[PrdSection]) -> Dict[str, Any]:
+        """并发分析各章节并合并结果, 单个章节失败不影响其它章节"""
+        self.logger.info(f"PRD按章节拆分为 {len(sections)} 段并发分析, 最大章节约 "
+                         f"{max(section.tokens for section in sections)} tokens")
+        section_points = self.map_sections(sections)
+        if not section_points:
+            raise ValueError("所有章节分析均失败")
+        self.logger.info(f"章节分析完成: 成功 {len(section_points)}/{len(sections)} 段")
+        return self._merge_sections(sections, section_points)
+    
+    def analyse_incremental(self, document_key: str, sections: List[PrdSection]) -> Dict[str, Any]:
+        """增量分析: 与该文档上次保存的章节结果比对, 只分析新增/变更的章节, 其余章节复用已保存的测试点
+        
+        章节按标识(标题路径)对应, 标题改动但内容未变的章节按内容哈希对应;
+        分析提示词变化后已保存的结果全部失效
+        """
+        document_key = _storage_key(document_key)
+        records = {record.section_key: record
+                   for record in PrdSectionAnalysis.objects.filter(document_key=document_key)}
+        by_hash = {record.content_hash: record for record in records.values()
+                   if record.prompt_version == self.prompt.prompt_version}
+        
+        statuses: Dict[int, str] = {}
+        section_points: Dict[int, List[Dict[str, Any]]] = {}
+        to_save: List[PrdSection] = []      # 复用了其他标识下的结果, 需要按新标识保存
+        to_analyse: List[PrdSection] = []
+        for section in sections:
+            record = records.get(_storage_key(section.key))
+            if (record and record.content_hash == section.content_hash
+                    and record.prompt_version == self.prompt.prompt_version):
+                statuses[section.index] = SECTION_UNCHANGED
+                section_points[section.index] = record.test_points
+            elif section.content_hash in by_hash:
+                statuses[section.index] = SECTION_UNCHANGED
+                section_points[section.index] = by_hash[section.content_hash].test_points
+                to_save.append(section)
+            else:
+                statuses[section.index] = SECTION_CHANGED if record else SECTION_ADDED
+                to_analyse.append(section)
+        
+        self.logger.info(f"PRD增量分析[{document_key}]: 共 {len(sections)} 段, 需要分析 {len(to_analyse)} 段, "
+                         f"复用 {len(sections) - len(to_analyse)} 段")
+        analysed = self.map_sections(to_analyse)
+        section_points.update(analysed)
+        if not section_points:
+            raise ValueError("所有章节分析均失败")
+        
+        section_keys = {_storage_key(section.key) for section in sections}
+        with transaction.atomic():
+            # 锁定该文档已有的记录, 同一文档的并发分析依次保存; 删除的章节按加锁后的记录计算
+            locked = PrdSectionAnalysis.objects.select_for_update().filter(document_key=document_key)
+            removed = [key for key in locked.values_list('section_key', flat=True) if key not in section_keys]
+            for section in to_save + [section for section in to_analyse if section.index in analysed]:
+                PrdSectionAnalysis.objects.update_or_create(
+                    document_key=document_key,
+                    section_key=_storage_key(section.key),
+                    defaults={
+                        'content_hash': section.content_hash,
+                        'prompt_version': self.prompt.prompt_version,
+                        'llm_provider': self.llm_provider or '',
+                        'test_points': section_points[section.index],
+                    }
+                )
+            # 失败的章节保留原有记录, 下次分析时重试
+            if removed:
+                PrdSectionAnalysis.objects.filter(document_key=document_key, section_key__in=removed).delete()
+        
+        result = self._merge_sections(sections, section_points, statuses)
+        result['removed_sections'] = removed
+        result['changes'] = {
+            status: sum(1 for section in sections
+                        if section.index in section_points and statuses[section.index] == status)
+            for status in (SECTION_ADDED, SECTION_CHANGED, SECTION_UNCHANGED)
+        }
+        result['changes']['removed'] = len(removed)
+        return result
+    
+    def _merge_sections(self, sections: List[PrdSection], section_points: Dict[int, List[Dict[str, Any]]],
+                        statuses: Optional[Dict[int, str]] = None) -> Dict[str, Any]:
+        """合并各章节的测试点, statuses不为空时为每个测试点标记变更状态(change)"""
+        succeeded = [section for section in sections if section.index in section_points]
+        test_points = merge_test_points([(section.title, section_points[section.index]) for section in succeeded])
+        
+        if statuses is not None:
+            # 合并后的测试点可能来自多个章节: 全部未变化为unchanged, 全部新增为added, 否则为changed
+            point_statuses: Dict[str, set] = {}
+            for section in succeeded:
+                for point in section_points[section.index]:
+                    point_statuses.setdefault(_normalize_title(point.get('title')), set()).add(statuses[section.index])
+            for point in test_points:
+                found = point_statuses.get(_normalize_title(point.get('title')), set())
+                point['change'] = found.pop() if len(found) == 1 else SECTION_CHANGED
+        
+        return {
+            "test_points": test_points,
+            "summary": build_summary(test_points),
+            "sections": [{
+                "title": section.title,
+                "status": ("failed" if section.index not in section_points
+                           else statuses[section.index] if statuses is not None else "ok"),
+                "test_point_count": len(section_points.get(section.index, [])),
+            } for section in sections],
+            "failed_sections": [section.title for section in sections if section.index not in section_points],
+        }
+    
+    def map_sections(self, sections: List[PrdSection]) -> Dict[int, List[Dict[str, Any]]]:
+        """并发分析各章节, 返回{章节序号: 测试点列表}, 失败的章节不在结果中"""
+        results = {}
+        if not sections:
+            return results
+        with ThreadPoolExecutor(max_workers=min(len(sections), self.limiter.limit)) as executor:
+            # 复制当前上下文, 使bypass_llm_cache等上下文设置在线程中同样生效
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._analyse_text, section.content, section.title): section
+                for section in sections
+            }
+            for future in as_completed(futures):
+                section = futures[future]
+                try:
+                    result = future.result()
+                    self._validate_analysis_result(result, require_summary=False)
+                except Exception as e:
+                    self.logger.error(f"章节[{section.title}]分析失败: {str(e)}", exc_info=True)
+                    continue
+                results[section.index] = result['test_points']
+        return results
+    
+    def _analyse_text(self, markdown_content: str, section_title: str = "") -> Dict[str, Any]:
+        """调用大模型分析一段Markdown内容, 返回解析后的分析结果"""
+        # 使用prompt模板格式化消息
+        messages = self.prompt.format_messages(markdown_content=markdown_content, section_title=section_title)
+        
+        self.logger.info(f"构建后的PRD分析提示词: \n{'='*50}\n{messages}\n{'='*50}")
+        
+        # 调用LLM服务
+        with self.limiter:
+            response = self.llm_service.invoke(messages)
+        result = response.content
+        
+        # 解析JSON结果(兼容代码块标记、尾逗号、输出截断等情况)
+        report = parse_json_object(result)
+        analysis_result = next((item for item in report.items if isinstance(item, dict)), None)
+        if analysis_result is None:
+            self.logger.error(f"原始响应: {result}")
+            raise ValueError(f"无法解析生成的分析结果: {report.summary()}")
+        self.logger.info(f"成功解析PRD分析结果，包含测试点数量：{len(analysis_result.get('test_points', []))}")
+        return analysis_result
+    
+    def _validate_analysis_result(self, result: Dict[str, Any], require_summary: bool = True) -> bool:
         """
         验证分析结果是否符合预期格式
         
         Args:
             result: 分析结果字典
+            require_summary: 是否检查汇总信息(按章节分析时汇总信息在本地计算)
             
         Returns:
             如果符合格式返回True，否则抛出异常
@@ -101,6 +327,9 @@ class PrdAnalyserAgent:
                     if field not in scenario:
                         raise ValueError(f"测试点 #{i+1} 的测试场景 #{j+1} 缺少必要字段: {field}")
         
+        if not require_summary:
+            return True
+        
         # 检查汇总信息
         if "summary" not in result or not isinstance(result["summary"], dict):
             raise ValueError("分析结果缺少有效的summary信息")
@@ -1,45 +1,51 @@
 import json
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from .api_case_journal import ApiCaseJournal
+from .api_case_reuse import get_api_case_reuse_cache, retarget_cases, reuse_key, structure_fingerprint
+from .api_case_template import get_compiled_template
+from .api_definitions import get_api_definition_index, get_api_index_cache
+from .json_stream import parse_json_array
 from .prompts import APITestCaseGeneratorPrompt
 from ..llm.base import LLMServiceFactory
+from ..llm.concurrency import get_adaptive_limiter
+from ..llm.tokens import estimate_tokens, pack_by_budget
 
 logger = logging.getLogger(__name__)
 
+# 多个较小的接口打包到一次大模型调用中生成, 可在settings.API_CASE_BUNDLE中覆盖
+DEFAULT_API_BUNDLE_CONFIG = {
+    'enabled': True,
+    'token_budget': 2000,          # 单次调用中接口定义(请求/响应结构)的token预算, 超出预算的接口单独生成
+    'max_apis_per_bundle': 8,      # 单次调用最多的接口个数
+    'max_cases_per_bundle': 30,    # 单次调用最多生成的用例条数(接口个数 x 每个接口的用例数), 限制输出长度
+}
+
 class APITestCaseGeneratorAgent:
     """API测试用例生成Agent"""
     
-    def __init__(self, llm_provider: str = "deepseek"):
+    def __init__(self, llm_provider: str = "deepseek", use_cache: bool = True):
         self.llm_provider = llm_provider
-        self.llm = LLMServiceFactory.create(llm_provider)
+        self.use_cache = use_cache
+        # 请求在线程池中执行, 无法用bypass_llm_cache上下文跳过缓存, 因此在创建模型时直接关闭;
+        # 关闭SDK内部的重试, 限流(429)直接交给自适应并发限制器处理(减小并发并在释放名额后退避重试)
+        self.llm = LLMServiceFactory.create(llm_provider, max_retries=0, **({} if use_cache else {'cache': False}))
         self.prompt = APITestCaseGeneratorPrompt()
-        self.template = self._load_test_case_template()
-        self.max_workers = 5
-    
-    def _load_test_case_template(self) -> Dict[str, Any]:
-        """加载测试用例结构模板"""
-        template_path = os.path.join(
-            os.path.dirname(__file__),
-            'templates',
-            'api_test_case_template.jsonc'
-        )
-        # 优先使用 json5 以支持模板中的注释；若不可用则回退到标准 json
-        try:
-            import json5  # type: ignore
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return json5.load(f)
-        except Exception as e:
-            logger.warning(f"使用 json5 解析模板失败或未安装，回退到标准 JSON 解析: {e}")
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    
-    
+        # 预编译的用例模板(进程内只解析一次): 精简的大模型schema + 本地填充计划
+        self.template = get_compiled_template()
+        # 按提供商的限流情况和响应延迟自适应调整并发的大模型调用数
+        self.limiter = get_adaptive_limiter(llm_provider)
+        self.bundle_config = {**DEFAULT_API_BUNDLE_CONFIG, **getattr(settings, 'API_CASE_BUNDLE', {})}
+        # 结构相同(只有路径不同)的接口复用已生成的用例
+        self.reuse_cache = get_api_case_reuse_cache()
     
     def _generate_multiple_test_cases(self, api_info: Dict[str, Any], 
-                                      priority: str, count: int) -> Optional[List[Dict[str, Any]]]:
-        """一次生成多条测试用例（单次LLM调用返回数组）"""
+                                      priority: str, count: int,
+                                      post_process: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """一次生成多条测试用例（单次LLM调用返回数组）, post_process为False时返回未后处理的用例"""
         import threading
         thread_id = threading.current_thread().ident
         try:
@@ -48,7 +54,7 @@ class APITestCaseGeneratorAgent:
                 api_info=api_info,
                 priority=priority,
                 case_count=count,
-                test_case_template=json.dumps(self.template, ensure_ascii=False, indent=2)
+                test_case_template=self.template.schema_text
             )
 
             # 打印完整提示词
@@ -59,28 +65,11 @@ class APITestCaseGeneratorAgent:
                 pass
 
             # 单次调用生成多条
-            if hasattr(self.llm, 'generate_with_history'):
-                response = self.llm.generate_with_history(messages)
-            else:
-                from langchain_core.messages import HumanMessage, SystemMessage
-                langchain_messages = []
-                for msg in messages:
-                    if hasattr(msg, 'type') and msg.type == 'system':
-                        langchain_messages.append(SystemMessage(content=msg.content))
-                    elif hasattr(msg, 'type') and msg.type == 'human':
-                        langchain_messages.append(HumanMessage(content=msg.content))
-                    elif hasattr(msg, 'role') and msg.role == 'system':
-                        langchain_messages.append(SystemMessage(content=msg.content))
-                    elif hasattr(msg, 'role') and msg.role == 'user':
-                        langchain_messages.append(HumanMessage(content=msg.content))
-                    else:
-                        langchain_messages.append(msg)
-                invoke_result = self.llm.invoke(langchain_messages)
-                response = getattr(invoke_result, 'content', invoke_result)
+            response = self._invoke_llm(messages)
 
             cases = self._parse_response_to_test_cases(response)
-            if cases is None:
-                return None
+            if cases is None or not post_process:
+                return cases
 
             # 后处理
             processed: List[Dict[str, Any]] = []
@@ -96,31 +85,91 @@ class APITestCaseGeneratorAgent:
 
     
 
-    def _parse_response_to_test_cases(self, response: Any) -> Optional[List[Dict[str, Any]]]:
-        """解析大模型响应为测试用例列表（支持数组或单对象容错）"""
+    def _invoke_llm(self, messages: list) -> Any:
+        """在自适应并发限制内调用大模型, 返回响应内容"""
+        if hasattr(self.llm, 'generate_with_history'):
+            return self.limiter.call(self.llm.generate_with_history, messages)
+        from langchain_core.messages import HumanMessage, SystemMessage
+        langchain_messages = []
+        for msg in messages:
+            if hasattr(msg, 'type') and msg.type == 'system':
+                langchain_messages.append(SystemMessage(content=msg.content))
+            elif hasattr(msg, 'type') and msg.type == 'human':
+                langchain_messages.append(HumanMessage(content=msg.content))
+            elif hasattr(msg, 'role') and msg.role == 'system':
+                langchain_messages.append(SystemMessage(content=msg.content))
+            elif hasattr(msg, 'role') and msg.role == 'user':
+                langchain_messages.append(HumanMessage(content=msg.content))
+            else:
+                langchain_messages.append(msg)
+        invoke_result = self.limiter.call(self.llm.invoke, langchain_messages)
+        return getattr(invoke_result, 'content', invoke_result)
+
+    def plan_bundles(self, api_definitions: List[Dict[str, Any]], count_per_api: int) -> List[List[Dict[str, Any]]]:
+        """按接口定义的token数把较小的接口打包, 每个包一次调用; 较大的接口单独成包"""
+        config = self.bundle_config
+        if not config['enabled']:
+            return [[api_def] for api_def in api_definitions]
+        max_apis = max(1, min(config['max_apis_per_bundle'], config['max_cases_per_bundle'] // max(count_per_api, 1)))
+        return pack_by_budget(
+            api_definitions,
+            cost=lambda api_def: estimate_tokens(self.prompt.format_bundle_api(0, api_def)),
+            budget=config['token_budget'],
+            max_items=max_apis
+        )
+
+    def _generate_cases_for_bundle(self, apis: List[Dict[str, Any]], priority: str,
+                                   count_per_api: int) -> Dict[str, List[Dict[str, Any]]]:
+        """一次调用为多个接口生成用例, 按api_path拆回各接口, 返回{接口path: 未后处理的用例列表}
+
+        大模型漏掉了某些接口(或调用失败)时, 对这些接口逐个补生成
+        """
+        if len(apis) == 1:
+            return {apis[0].get('path'): self._generate_cases_for_single_api(apis[0], priority, count_per_api,
+                                                                              post_process=False)}
+
+        by_path = {api_def.get('path'): api_def for api_def in apis}
+        results: Dict[str, List[Dict[str, Any]]] = {path: [] for path in by_path}
         try:
-            if not isinstance(response, str):
-                response = getattr(response, 'content', str(response))
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            clean_response = clean_response.strip()
-            parsed = json.loads(clean_response)
-            if isinstance(parsed, list):
-                return [p for p in parsed if isinstance(p, dict)]
-            if isinstance(parsed, dict):
-                return [parsed]
-            return None
-        except json.JSONDecodeError as e:
-            logger.error(f"解析多用例响应失败: {e}")
+            messages = self.prompt.format_bundle_messages(
+                apis, priority, count_per_api, self.template.schema_text
+            )
+            cases = self._parse_response_to_test_cases(self._invoke_llm(messages)) or []
+            for case in cases:
+                api_path = case.pop('api_path', None) or case.get('path')
+                if api_path in by_path:
+                    results[api_path].append(case)
+        except Exception as e:
+            logger.error(f"打包生成失败, 接口: {list(by_path)}: {e}")
+
+        missing = [path for path, cases in results.items() if not cases]
+        if missing:
+            logger.warning(f"打包生成结果缺少接口 {missing}, 逐个补生成")
+            for path in missing:
+                results[path] = self._generate_cases_for_single_api(by_path[path], priority, count_per_api,
+                                                                    post_process=False)
+        return results
+
+    def _parse_response_to_test_cases(self, response: Any) -> Optional[List[Dict[str, Any]]]:
+        """解析大模型响应为测试用例列表（支持数组或单对象容错, 单个元素损坏或输出截断时保留其余元素）"""
+        if not isinstance(response, str):
+            response = getattr(response, 'content', str(response))
+        report = parse_json_array(response)
+        if report.failed or not report.complete:
+            logger.warning(f"多用例响应解析不完整: {report.summary()}")
+        cases = [item for item in report.items if isinstance(item, dict)]
+        if not cases:
+            logger.error(f"解析多用例响应失败: {report.summary()}")
             return None
+        return cases
     
     def _post_process_test_case(self, test_case: Dict[str, Any], 
                                api_info: Dict[str, Any], priority: str) -> Dict[str, Any]:
         """后处理测试用例：填充固定值、生成断言等"""
         try:
+            # 按模板的填充计划补全大模型未生成的字段(默认值、用户设置、接口定义中的固定值)
+            self.template.fill(test_case, api_info, priority)
+            
             # 填充基本信息
             test_case['priority'] = priority
             test_case['status'] = 'DONE'
@@ -176,8 +225,13 @@ class APITestCaseGeneratorAgent:
 
     def generate_test_cases_for_apis_batch(self, api_definitions: List[Dict], 
                                        selected_apis: List[str], count_per_api: int, 
-                                       priority: str) -> Dict:
-        """批量生成测试用例（多线程生成，主线程合并）"""
+                                       priority: str,
+                                       on_api_done: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None) -> Dict:
+        """批量生成测试用例（多线程生成，主线程合并）
+        
+        指定on_api_done时, 每个接口生成完成后立即在主线程中回调(接口path, 新增用例), 
+        结果不再合并到api_definitions中, 由回调负责保存
+        """
         try:
             # 建立 path -> api_def 的索引，便于快速定位
             path_to_api: Dict[str, Dict[str, Any]] = {}
@@ -187,7 +241,7 @@ class APITestCaseGeneratorAgent:
                     path_to_api[api_path] = api
 
             # 过滤有效的选择（根据文件中实际存在的 path）
-            valid_paths = [p for p in selected_apis if p in path_to_api]
+            valid_paths = list(dict.fromkeys(p for p in selected_apis if p in path_to_api))
             if not valid_paths:
                 return {
                     'success': False,
@@ -198,37 +252,97 @@ class APITestCaseGeneratorAgent:
 
             # 子线程只负责生成，不改动 api_definitions
             results_by_path: Dict[str, List[Dict[str, Any]]] = {p: [] for p in valid_paths}
+            generated_by_path: Dict[str, int] = {}
 
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_to_path = {}
-                for api_path in valid_paths:
-                    api_def = path_to_api[api_path]
-                    fut = executor.submit(self._generate_cases_for_single_api, api_def, priority, count_per_api)
-                    future_to_path[fut] = (api_path, api_def.get('name', ''))
+            def deliver(api_path: str, cases: List[Dict[str, Any]]):
+                api_name = path_to_api[api_path].get('name', '')
+                try:
+                    if on_api_done is not None:
+                        on_api_done(api_path, cases)
+                    else:
+                        results_by_path[api_path].extend(cases)
+                    generated_by_path[api_path] = generated_by_path.get(api_path, 0) + len(cases)
+                    logger.info(f"接口生成完成: {api_name} - 新增用例 {len(cases)} 条")
+                except Exception as e:
+                    logger.error(f"接口生成异常: {api_name}: {e}")
+
+            # 按结构指纹分组, 每组只由第一个接口调用大模型生成, 其余接口复用其用例;
+            # 之前生成过相同结构的接口时整组直接复用缓存
+            groups: Dict[str, List[str]] = {}
+            for api_path in valid_paths:
+                fingerprint = structure_fingerprint(path_to_api[api_path])
+                key = reuse_key(self.llm_provider, self.prompt.prompt_version, self.template.schema_text,
+                                fingerprint, priority, count_per_api)
+                groups.setdefault(key, []).append(api_path)
+
+            reused_count = 0
+            representatives: Dict[str, str] = {}
+            for key, paths in groups.items():
+                cached = self.reuse_cache.get(key) if self.reuse_cache.enabled and self.use_cache else None
+                if cached and cached.get('cases'):
+                    for api_path in paths:
+                        deliver(api_path, self._reuse_cases(cached['cases'], cached['source'],
+                                                            path_to_api[api_path], priority))
+                    reused_count += len(paths)
+                elif self.reuse_cache.enabled:
+                    representatives[paths[0]] = key
+                    reused_count += len(paths) - 1
+                else:
+                    representatives.update((api_path, key) for api_path in paths)
+            if reused_count:
+                logger.info(f"结构相同的接口复用已生成的用例: {reused_count} 个接口, 实际生成 {len(representatives)} 个接口")
+
+            # 较小的接口打包到同一次调用中, 减少重复发送模板和系统提示词
+            bundles = self.plan_bundles([path_to_api[p] for p in representatives], count_per_api)
+            logger.info(f"接口打包: {len(representatives)} 个接口共 {len(bundles)} 次调用, 各包接口数: {[len(b) for b in bundles]}")
 
-                for fut in as_completed(future_to_path):
-                    api_path, api_name = future_to_path[fut]
+            # 线程数按并发上限创建, 实际同时进行的大模型调用数由自适应限制器控制
+            max_workers = max(1, min(len(bundles), self.limiter.config['max_limit']))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_bundle = {
+                    executor.submit(self._generate_cases_for_bundle, bundle, priority, count_per_api): bundle
+                    for bundle in bundles
+                }
+
+                for fut in as_completed(future_to_bundle):
+                    bundle = future_to_bundle[fut]
                     try:
-                        cases = fut.result() or []
-                        results_by_path[api_path].extend(cases)
-                        logger.info(f"接口生成完成: {api_name} - 新增用例 {len(cases)} 条")
+                        bundle_results = fut.result()
                     except Exception as e:
-                        logger.error(f"接口生成异常: {api_name}: {e}")
+                        logger.error(f"接口生成异常: {[api_def.get('name', '') for api_def in bundle]}: {e}")
+                        continue
+                    for api_def in bundle:
+                        api_path = api_def.get('path')
+                        raw_cases = bundle_results.get(api_path) or []
+                        key = representatives[api_path]
+                        # 没有生成出用例时不缓存, 同组接口一并按失败处理(续跑时重试)
+                        if raw_cases and self.reuse_cache.enabled:
+                            self.reuse_cache.put(key, api_def, raw_cases)
+                        targets = groups[key] if self.reuse_cache.enabled else [api_path]
+                        for target_path in targets:
+                            deliver(target_path, self._reuse_cases(raw_cases, api_def,
+                                                                   path_to_api[target_path], priority))
 
             # 主线程合并结果到 api_definitions
-            total_cases = 0
-            for api_path, cases in results_by_path.items():
-                api_def = path_to_api[api_path]
-                if 'apiTestCaseList' not in api_def or not isinstance(api_def['apiTestCaseList'], list):
-                    api_def['apiTestCaseList'] = []
-                api_def['apiTestCaseList'].extend(cases)
-                total_cases += len(cases)
+            if on_api_done is None:
+                for api_path, cases in results_by_path.items():
+                    api_def = path_to_api[api_path]
+                    if 'apiTestCaseList' not in api_def or not isinstance(api_def['apiTestCaseList'], list):
+                        api_def['apiTestCaseList'] = []
+                    api_def['apiTestCaseList'].extend(cases)
+            total_cases = sum(generated_by_path.values())
 
+            concurrency = self.limiter.snapshot()
+            logger.info(f"并发生成结束, 并发状态: {concurrency}")
             return {
                 'success': True,
                 'message': f'成功为{len(valid_paths)}个接口新增生成了测试用例，共 {total_cases} 条',
                 'generated_cases': total_cases,
-                'selected_api_count': len(valid_paths)
+                'selected_api_count': len(valid_paths),
+                'llm_calls': len(bundles),
+                'reused_api_count': reused_count,
+                'failed_apis': [p for p in valid_paths if not generated_by_path.get(p)],
+                'concurrency': concurrency
             }
 
         except Exception as e:
@@ -238,13 +352,20 @@ class APITestCaseGeneratorAgent:
                 'error': str(e)
             }
 
-    def _generate_cases_for_single_api(self, api_def: Dict[str, Any], priority: str, count_per_api: int) -> List[Dict[str, Any]]:
+    def _reuse_cases(self, raw_cases: List[Dict[str, Any]], source: Dict[str, Any],
+                     target: Dict[str, Any], priority: str) -> List[Dict[str, Any]]:
+        """把源接口生成的原始用例改写为目标接口的, 并按目标接口后处理(原始用例不被修改)"""
+        return [self._post_process_test_case(case, target, priority)
+                for case in retarget_cases(raw_cases, source, target)]
+
+    def _generate_cases_for_single_api(self, api_def: Dict[str, Any], priority: str, count_per_api: int,
+                                       post_process: bool = True) -> List[Dict[str, Any]]:
         """为单个接口一次性生成多条测试用例（按接口并发，单次LLM调用）"""
         import threading
         thread_id = threading.current_thread().ident
         api_name = api_def.get('name', '')
         try:
-            cases = self._generate_multiple_test_cases(api_def, priority, count_per_api) or []
+            cases = self._generate_multiple_test_cases(api_def, priority, count_per_api, post_process) or []
             logger.info(f"[Thread-{thread_id}] 接口生成完成: {api_name} - 新增用例 {len(cases)} 条")
             return cases
         except Exception as e:
@@ -312,50 +433,89 @@ class APITestCaseGeneratorAgent:
 
 
 def parse_api_definitions(file_path: str) -> List[Dict]:
-    """解析API定义文件，提取接口列表"""
+    """解析API定义文件，提取接口列表（流式扫描, 结果按文件内容hash缓存）"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        api_list = []
-        for api in data.get('apiDefinitions', []):
-            case_count = len(api.get('apiTestCaseList', []))
-            api_list.append({
-                'path': api.get('path', ''),
-                'name': api.get('name', ''),
-                'method': api.get('method', ''),
-                'has_test_cases': case_count > 0,
-                'test_case_count': case_count
-            })
-        
-        return api_list
+        return get_api_definition_index(file_path).list_apis()
     except Exception as e:
         logger.error(f"解析API定义文件失败: {e}")
         return []
 
 
+def _append_cases(api_def: Dict[str, Any], cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if 'apiTestCaseList' not in api_def or not isinstance(api_def['apiTestCaseList'], list):
+        api_def['apiTestCaseList'] = []
+    api_def['apiTestCaseList'].extend(cases)
+    return api_def
+
+
 def generate_test_cases_for_apis(file_path: str, selected_apis: list, count_per_api: int, 
-                                 priority: str, llm_provider: str) -> Dict:
-    """为选中的API生成测试用例"""
+                                 priority: str, llm_provider: str, use_cache: bool = True,
+                                 resume: bool = True) -> Dict:
+    """为选中的API生成测试用例
+    
+    每个接口生成完成后立即写入检查点日志; 中断后以resume=True重新调用时, 跳过中断前已生成但尚未写回的接口。
+    生成结束后把日志中的用例逐个写回文件(写临时文件后原子替换), 只读取和写回选中的接口定义, 然后删除日志
+    """
+    journal = None
     try:
-        # 读取原文件
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 创建Agent
-        agent = APITestCaseGeneratorAgent(llm_provider)
+        index = get_api_definition_index(file_path)
+        selected = [path for path in dict.fromkeys(selected_apis) if index.get(path)]
+        if not selected:
+            return {
+                'success': False,
+                'message': '未找到有效的接口路径',
+            }
         
-        # 批量生成测试用例
-        result = agent.generate_test_cases_for_apis_batch(
-            data['apiDefinitions'], selected_apis, count_per_api, priority
+        journal = ApiCaseJournal.open(
+            file_path,
+            {'source_sha256': index.sha256, 'priority': priority, 'count_per_api': count_per_api},
+            resume=resume
         )
+        done = journal.done
+        remaining = [path for path in selected if path not in done]
+        result = {'success': True, 'failed_apis': []}
+        if remaining:
+            def checkpoint(api_path: str, cases: List[Dict[str, Any]]):
+                # 没有生成出用例的接口不记录, 续跑时重试
+                if cases:
+                    journal.record(api_path, cases)
+            
+            # 创建Agent
+            agent = APITestCaseGeneratorAgent(llm_provider, use_cache=use_cache)
+            
+            # 批量生成测试用例
+            result = agent.generate_test_cases_for_apis_batch(
+                list(index.load(remaining).values()), remaining, count_per_api, priority, on_api_done=checkpoint
+            )
+            if not result['success']:
+                return result
         
-        if result['success']:
-            # 写回文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        # 写回文件, 并缓存写回后文件的索引
+        total_cases = 0
+        if journal.pending:
+            def apply(api_path: str, api_def: Dict[str, Any]) -> Dict[str, Any]:
+                nonlocal total_cases
+                cases = journal.read_cases(api_path)
+                total_cases += len(cases)
+                return _append_cases(api_def, cases)
+            
+            index = index.write_back(list(journal.pending), apply)
+            get_api_index_cache().store(index)
         
-        return result
+        # 已生成的用例都已写回文件, 删除日志; 失败的接口不会被记录, 再次生成时不会被跳过
+        journal.remove()
+        failed_apis = result.get('failed_apis', [])
+        
+        return {
+            **result,
+            'success': True,
+            'message': f'成功为{len(selected) - len(failed_apis)}个接口新增生成了测试用例，共 {total_cases} 条'
+                       + (f', {len(failed_apis)} 个接口生成失败, 可重新生成' if failed_apis else ''),
+            'generated_cases': total_cases,
+            'selected_api_count': len(selected),
+            'resumed_api_count': len(selected) - len(remaining),
+            'failed_apis': failed_apis,
+        }
         
     except Exception as e:
         logger.error(f"生成测试用例失败: {e}")
@@ -363,5 +523,6 @@ def generate_test_cases_for_apis(file_path: str, selected_apis: list, count_per_
             'success': False,
             'error': str(e)
         }
-    
-
+    finally:
+        if journal is not None:
+            journal.close()
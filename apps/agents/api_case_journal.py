@@ -0,0 +1,126 @@
+"""
+接口用例批量生成的检查点日志
+
+每个接口生成完成后立即把新增用例追加写入日志(JSON Lines, 每行写入后fsync), 进程崩溃/超时/模型服务中断后,
+续跑时跳过日志中已完成的接口, 已完成的大模型调用不会浪费。日志格式:
+    {"type": "header", "source_sha256": ..., "priority": ..., "count_per_api": ...}   生成参数和源文件内容hash
+    {"type": "api", "path": ..., "cases": [...]}                                     已生成、尚未写回文件的用例
+
+日志只记录每个接口所在的字节位置, 写回文件时逐个读取用例, 内存占用与接口数量无关。
+用例写回文件后日志即删除, 不记录已写回的接口: 之后再次为这些接口生成用例属于新的请求, 不能被跳过
+"""
+
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List
+
+import orjson
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+
+def journal_path_for(file_path: str) -> str:
+    return f"{file_path}.journal.jsonl"
+
+
+class ApiCaseJournal:
+    """接口用例生成的追加写日志, 线程安全"""
+
+    def __init__(self, path: str, header: Dict[str, Any]):
+        self.path = path
+        self.header = header
+        self.pending: Dict[str, int] = {}    # 已生成未写回的接口 path -> 日志中的字节位置
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def open(cls, file_path: str, header: Dict[str, Any], resume: bool = True) -> 'ApiCaseJournal':
+        """打开文件对应的日志
+
+        resume为True且已有日志的生成参数和源文件内容与header一致时继续使用, 否则重新开始
+        """
+        journal = cls(journal_path_for(file_path), header)
+        if resume and os.path.exists(journal.path) and journal._load():
+            logger.info(f"续跑接口用例生成: 已生成未写回 {len(journal.pending)} 个接口")
+        else:
+            journal._rewrite()
+        journal._file = open(journal.path, 'ab')
+        return journal
+
+    def _load(self) -> bool:
+        """读取已有日志, 返回是否可以续跑; 末尾不完整的行(写入时崩溃)忽略"""
+        with open(self.path, 'rb') as f:
+            first = f.readline()
+            try:
+                header = orjson.loads(first)
+            except orjson.JSONDecodeError:
+                return False
+            if header.get('type') != 'header' or any(header.get(k) != v for k, v in self.header.items()):
+                logger.info("接口用例生成日志与本次生成的参数或源文件不一致, 重新开始")
+                return False
+            offset = len(first)
+            valid_end = offset
+            for line in iter(f.readline, b''):
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    break
+                if record.get('type') == 'api':
+                    self.pending[record['path']] = offset
+                offset += len(line)
+                valid_end = offset
+        # 截掉不完整的行, 后续追加的记录才能正确解析
+        if valid_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+        return True
+
+    def _rewrite(self):
+        """原子地重写日志: 只保留header"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.journal_', suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps({'type': 'header', **self.header}) + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.pending = {}
+
+    @property
+    def done(self) -> set:
+        """已生成、尚未写回文件的接口"""
+        return set(self.pending)
+
+    def record(self, path: str, cases: List[Dict[str, Any]]):
+        """追加一个接口的生成结果并落盘"""
+        line = orjson.dumps({'type': 'api', 'path': path, 'cases': cases}) + b'\n'
+        with self._lock:
+            offset = self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.pending[path] = offset
+
+    def read_cases(self, path: str) -> List[Dict[str, Any]]:
+        """读取某个接口已生成的用例"""
+        offset = self.pending.get(path)
+        if offset is None:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return orjson.loads(f.readline())['cases']
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
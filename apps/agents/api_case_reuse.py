@@ -0,0 +1,171 @@
+"""
+结构相同的接口之间复用已生成的用例
+
+接口导出文件中经常有大量请求/响应结构完全相同、只有路径不同的接口(如按版本、按租户划分的路由)。
+对每个接口计算结构指纹(完整的请求定义和响应定义, 去掉路径、名称和各类ID后按key排序归一化), 以
+    (提供商, 提示词版本, 用例模板, 结构指纹, 优先级, 每个接口的用例数)
+为key缓存大模型生成的原始用例(未后处理), 结构相同的接口直接复用:
+把用例中出现的源接口路径替换为目标接口的、用例名称中的接口名前缀替换为目标接口名,
+再按目标接口在本地后处理(重新生成ID、填充请求配置)。
+缓存保存在进程内(LRU)和磁盘上, 同一批次内结构相同的接口也只生成一次。
+"""
+
+import collections
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+import orjson
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# 缓存数据格式变化时递增, 使磁盘上的旧缓存失效
+REUSE_VERSION = 2
+
+DEFAULT_API_CASE_REUSE_CONFIG = {
+    'enabled': True,
+    'cache_dir': os.path.join(settings.MEDIA_ROOT, '.api_case_reuse'),  # 磁盘缓存目录, 为空时只缓存在进程内
+    'memory_cache_size': 256,
+}
+
+
+# 请求定义顶层与接口身份相关的字段, 不参与结构指纹
+_IDENTITY_KEYS = {'path', 'name'}
+
+
+def reuse_key(*parts: Any) -> str:
+    return hashlib.sha256('\x00'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _is_id_key(key: str) -> bool:
+    return key == 'id' or key.endswith('Id') or key.endswith('Ids')
+
+
+def _normalize(value: Any, identity_keys: frozenset = frozenset()) -> Any:
+    """去掉ID类的标量字段(如id/projectId/stepId)和identity_keys中的字段, 其余内容原样保留"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()
+                if k not in identity_keys and not (_is_id_key(k) and not isinstance(v, (dict, list)))}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def structure_fingerprint(api_info: Dict[str, Any]) -> str:
+    """接口的结构指纹: 请求方法 + 完整的请求定义(各种类型的请求体、查询/REST参数、请求头)
+    + 完整的响应定义(状态码、响应头、响应体的schema或示例值), 只有路径、名称和ID不同的接口指纹相同
+    """
+    structure = {
+        'method': api_info.get('method', ''),
+        'request': _normalize(api_info.get('request') or {}, frozenset(_IDENTITY_KEYS)),
+        'response': _normalize(api_info.get('response') or []),
+    }
+    text = json.dumps(structure, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def retarget_cases(cases: List[Dict[str, Any]], source: Dict[str, Any],
+                   target: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把源接口生成的用例改写为目标接口的, 返回副本
+
+    字符串中的源接口路径替换为目标接口的路径; 接口名只替换用例名称的前缀(用例名称为"接口名_测试点"),
+    不在断言、请求体等内容中替换, 避免"查询""列表"这类较短的接口名误伤其他文本
+    """
+    old_path, new_path = source.get('path') or '', target.get('path') or ''
+    old_name, new_name = source.get('name') or '', target.get('name') or ''
+    # 过短的路径(如'/')替换会误伤其他内容
+    replace_path = len(old_path) >= 2 and old_path != new_path
+
+    def _walk(value):
+        if isinstance(value, str):
+            return value.replace(old_path, new_path)
+        if isinstance(value, list):
+            return [_walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: _walk(v) for k, v in value.items()}
+        return value
+
+    retargeted = [_walk(case) for case in cases] if replace_path else copy.deepcopy(cases)
+    if old_name and old_name != new_name:
+        for case in retargeted:
+            name = case.get('name')
+            if isinstance(name, str) and name.startswith(old_name):
+                case['name'] = new_name + name[len(old_name):]
+    return retargeted
+
+
+class ApiCaseReuseCache:
+    """结构指纹 -> 已生成的原始用例, 线程安全"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**DEFAULT_API_CASE_REUSE_CONFIG, **(config or {})}
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config['enabled']
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        cache_dir = self.config['cache_dir']
+        return os.path.join(cache_dir, key[:2], f"{key}.v{REUSE_VERSION}.json") if cache_dir else None
+
+    def _remember(self, key: str, data: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > max(self.config['memory_cache_size'], 0):
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回{'source': {'path', 'name'}, 'cases': [...]}, 未命中返回None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = orjson.loads(f.read())
+                self._remember(key, data)
+                return data
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取接口用例复用缓存失败: {path}, {str(e)}")
+        return None
+
+    def put(self, key: str, source: Dict[str, Any], cases: List[Dict[str, Any]]):
+        data = {'source': {'path': source.get('path', ''), 'name': source.get('name', '')}, 'cases': cases}
+        self._remember(key, data)
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.reuse_', suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(orjson.dumps(data))
+            os.replace(temp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"写入接口用例复用缓存失败: {path}, {str(e)}")
+
+
+_reuse_cache = None
+_reuse_cache_lock = threading.Lock()
+
+
+def get_api_case_reuse_cache() -> ApiCaseReuseCache:
+    """获取进程内共享的接口用例复用缓存（单例模式）"""
+    global _reuse_cache
+    if _reuse_cache is None:
+        with _reuse_cache_lock:
+            if _reuse_cache is None:
+                _reuse_cache = ApiCaseReuseCache(getattr(settings, 'API_CASE_REUSE_CONFIG', {}))
+    return _reuse_cache
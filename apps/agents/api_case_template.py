@@ -0,0 +1,190 @@
+"""
+接口测试用例模板(api_test_case_template.jsonc)的预编译
+
+模板中大部分字段由本地填充, 不需要大模型生成。模板在进程内只解析、编译一次, 拆分为两部分:
+    - schema: 发给大模型的精简模板, 只保留需要大模型生成的字段(GENERATE:标记和示例值),
+      预先序列化为紧凑的JSON文本, 每次调用直接使用
+    - 填充计划: 大模型返回用例后在本地执行
+        DEFAULT:值            字段缺失时填入默认值
+        USER_SET:priority     填入用户设置的优先级
+        FIXED:api_info.xxx    填入接口定义中的对应值
+        GENERATE:current_timestamp  字段缺失时填入本地生成的时间戳ID
+    - 模板中的空列表/空对象字面量同样作为默认值在本地填充
+列表按元素模板编译, 元素模板带assertionType等固定取值时, 只作用于该类型的元素
+"""
+
+import ast
+import copy
+import itertools
+import json
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'api_test_case_template.jsonc')
+
+# 列表元素模板的区分字段: 元素模板中该字段为固定取值时, 只填充取值相同的元素
+_DISCRIMINATOR = 'assertionType'
+_LOCAL_GENERATORS = {'current_timestamp'}
+_COMMENT_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+_id_counter = itertools.count()
+
+
+def _strip_comments(text: str) -> str:
+    return _COMMENT_PATTERN.sub(lambda m: m.group() if m.group().startswith('"') else '', text)
+
+
+def load_template(path: str = TEMPLATE_PATH) -> Dict[str, Any]:
+    """解析jsonc模板, 优先使用json5, 不可用时去掉注释后按标准JSON解析"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        import json5  # type: ignore
+        return json5.loads(text)
+    except Exception as e:
+        logger.warning(f"使用 json5 解析模板失败或未安装，回退到标准 JSON 解析: {e}")
+        return json.loads(_strip_comments(text))
+
+
+def _parse_default(raw: str) -> Any:
+    """DEFAULT:后的取值: null/true/false/数字/列表字面量, 其余按字符串处理"""
+    lowered = raw.strip().lower()
+    if lowered == 'null':
+        return None
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    try:
+        return ast.literal_eval(raw.strip())
+    except (ValueError, SyntaxError):
+        return raw
+
+
+def _local_timestamp_id() -> str:
+    # 同一毫秒内生成多个ID时追加序号, 保证唯一
+    return f"{int(time.time() * 1000)}{next(_id_counter) % 1000:03d}"
+
+
+class _Leaf:
+    """本地填充的字段: kind为default / user_set / fixed / generate"""
+
+    def __init__(self, kind: str, value: Any):
+        self.kind = kind
+        self.value = value
+
+    def apply(self, target: Dict[str, Any], key: str, context: Dict[str, Any]):
+        if self.kind == 'default':
+            if target.get(key) is None:
+                target[key] = copy.deepcopy(self.value)
+        elif self.kind == 'user_set':
+            target[key] = context.get(self.value)
+        elif self.kind == 'fixed':
+            value = context
+            for part in self.value:
+                value = value.get(part) if isinstance(value, dict) else None
+            target[key] = copy.deepcopy(value)
+        elif self.kind == 'generate' and not target.get(key):
+            target[key] = _local_timestamp_id()
+
+
+class _ListPlan:
+    """列表字段的填充计划: (区分字段取值, 元素填充计划), 区分字段为None的计划作用于其余元素"""
+
+    def __init__(self, items: List[Tuple[Optional[str], Dict[str, Any]]]):
+        self.items = items
+
+    def plan_for(self, element: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        fallback = None
+        for discriminator, plan in self.items:
+            if discriminator is None:
+                fallback = fallback or plan
+            elif element.get(_DISCRIMINATOR) == discriminator:
+                return plan
+        return fallback
+
+
+def _compile(node: Any) -> Tuple[Any, Any, bool]:
+    """编译模板节点, 返回(大模型schema, 本地填充计划, 是否包含需要大模型生成的内容)"""
+    if isinstance(node, str):
+        marker, _, rest = node.partition(':')
+        if marker == 'DEFAULT':
+            return None, _Leaf('default', _parse_default(rest)), False
+        if marker == 'USER_SET':
+            return None, _Leaf('user_set', rest.strip()), False
+        if marker == 'FIXED' and rest.startswith('api_info.'):
+            return None, _Leaf('fixed', rest[len('api_info.'):].split('.')), False
+        if marker == 'GENERATE' and rest.strip() in _LOCAL_GENERATORS:
+            return None, _Leaf('generate', rest.strip()), False
+        return node, None, True
+    if isinstance(node, dict):
+        if not node:
+            return None, _Leaf('default', {}), False
+        schema, plan = {}, {}
+        for key, value in node.items():
+            child_schema, child_plan, has_llm = _compile(value)
+            if has_llm:
+                schema[key] = child_schema
+            if child_plan:
+                plan[key] = child_plan
+        return schema, plan, bool(schema)
+    if isinstance(node, list):
+        if not node:
+            return None, _Leaf('default', []), False
+        schema, items = [], []
+        for element in node:
+            child_schema, child_plan, has_llm = _compile(element)
+            if has_llm:
+                schema.append(child_schema)
+            if isinstance(child_plan, dict) and child_plan:
+                discriminator = element.get(_DISCRIMINATOR) if isinstance(element, dict) else None
+                items.append((discriminator if isinstance(discriminator, str) and ':' not in discriminator else None,
+                              child_plan))
+        if not schema:
+            return None, _Leaf('default', copy.deepcopy(node)), False
+        return schema, _ListPlan(items) if items else None, True
+    return node, None, True
+
+
+def _apply_plan(plan: Dict[str, Any], target: Dict[str, Any], context: Dict[str, Any]):
+    for key, node in plan.items():
+        if isinstance(node, _Leaf):
+            node.apply(target, key, context)
+        elif isinstance(node, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _apply_plan(node, target[key], context)
+        elif isinstance(node, _ListPlan) and isinstance(target.get(key), list):
+            for element in target[key]:
+                element_plan = node.plan_for(element) if isinstance(element, dict) else None
+                if element_plan:
+                    _apply_plan(element_plan, element, context)
+
+
+class CompiledTemplate:
+    """编译后的用例模板"""
+
+    def __init__(self, template: Dict[str, Any]):
+        schema, plan, _ = _compile(template)
+        self.schema: Dict[str, Any] = schema or {}
+        self.plan: Dict[str, Any] = plan or {}
+        # 紧凑格式, 去掉缩进和多余空格
+        self.schema_text = json.dumps(self.schema, ensure_ascii=False, separators=(',', ':'))
+
+    def fill(self, test_case: Dict[str, Any], api_info: Dict[str, Any], priority: str) -> Dict[str, Any]:
+        """按填充计划补全大模型生成的用例(原地修改并返回)"""
+        _apply_plan(self.plan, test_case, {**api_info, 'priority': priority})
+        return test_case
+
+
+@lru_cache(maxsize=None)
+def get_compiled_template(path: str = TEMPLATE_PATH) -> CompiledTemplate:
+    """获取编译后的用例模板, 每个进程只解析和编译一次"""
+    compiled = CompiledTemplate(load_template(path))
+    logger.info(f"接口用例模板编译完成, 发给大模型的模板长度: {len(compiled.schema_text)} 字符")
+    return compiled
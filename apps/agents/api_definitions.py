@@ -0,0 +1,324 @@
+"""
+接口定义文件(MeterSphere导出的JSON)的流式索引
+
+导出文件可能有几百MB, 不再整体json.load:
+    - 用mmap扫描文件, 只识别括号和字符串边界, 找出顶层apiDefinitions数组中每个接口的字节区间,
+      逐个解析单个接口以提取path/name/method/已有用例数, 生成紧凑的索引
+    - 索引按文件内容的sha256缓存(进程内 + 磁盘), 同一文件只扫描一次
+    - 生成用例时按path读取选中接口的定义, 写回时逐个替换这些接口所在的字节区间, 其余内容原样复制,
+      同一时刻只有一个接口的定义在内存中
+"""
+
+import collections
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from django.conf import settings
+
+from ..core.file_storage import BLOCK_SIZE, get_file_hash_index
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# 索引格式变化时递增, 使磁盘上的旧索引失效
+INDEX_VERSION = 1
+
+DEFAULT_API_INDEX_CONFIG = {
+    'cache_dir': os.path.join(settings.MEDIA_ROOT, '.api_index'),  # 磁盘缓存目录, 为空时只缓存在进程内
+    'memory_cache_size': 16,
+}
+
+_TOKEN_PATTERN = re.compile(rb'[{}\[\]"]')
+_STRING_PATTERN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_COLON_PATTERN = re.compile(rb'\s*:')
+
+
+@dataclass
+class ApiDefinitionEntry:
+    """索引中的一个接口: 基本信息 + 在文件中的字节区间[start, end)"""
+    path: str
+    name: str
+    method: str
+    start: int
+    end: int
+    test_case_count: int = 0
+
+
+def _file_sha256(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def scan_api_definitions(buffer) -> Iterable[Tuple[int, int]]:
+    """扫描JSON文本, 逐个返回顶层apiDefinitions数组中对象元素的字节区间(start, end)"""
+    pos = 0
+    depth = 0
+    key = None
+    in_definitions = False
+    element_start = None
+    while True:
+        match = _TOKEN_PATTERN.search(buffer, pos)
+        if match is None:
+            return
+        index = match.start()
+        char = buffer[index:index + 1]
+        if char == b'"':
+            string = _STRING_PATTERN.match(buffer, index)
+            if string is None:
+                raise ValueError(f"接口定义文件中的字符串未闭合, 位置: {index}")
+            pos = string.end()
+            # 顶层对象的键: 深度为1且后面紧跟冒号的字符串
+            if depth == 1:
+                key = string.group()[1:-1] if _COLON_PATTERN.match(buffer, pos) else None
+            continue
+        if char in b'{[':
+            if depth == 1 and char == b'[' and key == b'apiDefinitions':
+                in_definitions = True
+            elif in_definitions and depth == 2 and char == b'{':
+                element_start = index
+            depth += 1
+        else:
+            depth -= 1
+            if in_definitions and depth == 2 and element_start is not None:
+                yield element_start, index + 1
+                element_start = None
+            elif in_definitions and depth == 1:
+                return
+        pos = index + 1
+
+
+def _indent_before(buffer, start: int) -> bytes:
+    """元素所在行的缩进, 写回时保持原有格式"""
+    line_start = buffer.rfind(b'\n', 0, start) + 1
+    prefix = bytes(buffer[line_start:start])
+    return prefix if not prefix.strip() else b''
+
+
+class ApiDefinitionIndex:
+    """接口定义文件的索引"""
+
+    def __init__(self, file_path: str, sha256: str, entries: List[ApiDefinitionEntry]):
+        self.file_path = file_path
+        self.sha256 = sha256
+        self.entries = entries
+        self._by_path = {entry.path: entry for entry in entries if entry.path}
+
+    @classmethod
+    def build(cls, file_path: str, sha256: str) -> 'ApiDefinitionIndex':
+        """流式扫描文件生成索引, 同一时刻只解析一个接口的定义"""
+        entries = []
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls(file_path, sha256, entries)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for start, end in scan_api_definitions(buffer):
+                    api = orjson.loads(buffer[start:end])
+                    case_list = api.get('apiTestCaseList')
+                    entries.append(ApiDefinitionEntry(
+                        path=api.get('path', '') or '',
+                        name=api.get('name', '') or '',
+                        method=api.get('method', '') or '',
+                        start=start,
+                        end=end,
+                        test_case_count=len(case_list) if isinstance(case_list, list) else 0,
+                    ))
+        return cls(file_path, sha256, entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': INDEX_VERSION, 'sha256': self.sha256, 'entries': [asdict(entry) for entry in self.entries]}
+
+    @classmethod
+    def from_dict(cls, file_path: str, data: Dict[str, Any]) -> 'ApiDefinitionIndex':
+        return cls(file_path, data['sha256'], [ApiDefinitionEntry(**entry) for entry in data['entries']])
+
+    def get(self, path: str) -> Optional[ApiDefinitionEntry]:
+        return self._by_path.get(path)
+
+    def list_apis(self) -> List[Dict[str, Any]]:
+        """接口列表(与parse_api_definitions的返回格式一致)"""
+        return [{
+            'path': entry.path,
+            'name': entry.name,
+            'method': entry.method,
+            'has_test_cases': entry.test_case_count > 0,
+            'test_case_count': entry.test_case_count,
+        } for entry in self.entries]
+
+    def load(self, paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """按path读取接口定义, 文件中不存在的path忽略"""
+        selected = [self._by_path[path] for path in dict.fromkeys(paths) if path in self._by_path]
+        apis = {}
+        with open(self.file_path, 'rb') as f:
+            for entry in sorted(selected, key=lambda e: e.start):
+                f.seek(entry.start)
+                apis[entry.path] = orjson.loads(f.read(entry.end - entry.start))
+        return apis
+
+    def write_back(self, paths: Iterable[str],
+                   transform: Callable[[str, Dict[str, Any]], Dict[str, Any]]) -> 'ApiDefinitionIndex':
+        """修改指定接口的定义并写回文件: 逐个读取接口定义交给transform(path, 接口定义)修改,
+        只替换对应接口的字节区间, 写临时文件后原子替换原文件
+
+        Returns:
+            写回后文件的新索引
+        """
+        replacements = sorted(
+            (self._by_path[path] for path in dict.fromkeys(paths) if path in self._by_path),
+            key=lambda entry: entry.start
+        )
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.api_', suffix='.part')
+        sha = hashlib.sha256()
+        changed: Dict[int, Tuple[int, int, int]] = {}   # 原start -> (新start, 新end, 用例数)
+        try:
+            with open(self.file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst, \
+                    mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                written = 0
+
+                def write(data):
+                    nonlocal written
+                    sha.update(data)
+                    dst.write(data)
+                    written += len(data)
+
+                pos = 0
+                for entry in replacements:
+                    while pos < entry.start:
+                        block_end = min(entry.start, pos + BLOCK_SIZE)
+                        write(buffer[pos:block_end])
+                        pos = block_end
+                    api = transform(entry.path, orjson.loads(buffer[entry.start:entry.end]))
+                    indent = _indent_before(buffer, entry.start)
+                    data = orjson.dumps(api, option=orjson.OPT_INDENT_2)
+                    if indent:
+                        data = data.replace(b'\n', b'\n' + indent)
+                    start = written
+                    write(data)
+                    case_list = api.get('apiTestCaseList')
+                    changed[entry.start] = (start, written, len(case_list) if isinstance(case_list, list) else 0)
+                    pos = entry.end
+                while pos < len(buffer):
+                    block_end = min(len(buffer), pos + BLOCK_SIZE)
+                    write(buffer[pos:block_end])
+                    pos = block_end
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(temp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # 未修改的接口按累计的长度差平移字节区间, 不需要重新扫描文件
+        entries, shift = [], 0
+        for entry in self.entries:
+            if entry.start in changed:
+                start, end, case_count = changed[entry.start]
+                shift = end - entry.end
+                entries.append(ApiDefinitionEntry(entry.path, entry.name, entry.method, start, end, case_count))
+            else:
+                entries.append(ApiDefinitionEntry(
+                    entry.path, entry.name, entry.method, entry.start + shift, entry.end + shift, entry.test_case_count
+                ))
+        new_index = ApiDefinitionIndex(self.file_path, sha.hexdigest(), entries)
+        get_file_hash_index().add(self.file_path, new_index.sha256)
+        return new_index
+
+
+class ApiDefinitionIndexCache:
+    """按文件内容hash缓存的接口索引, 线程安全"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**DEFAULT_API_INDEX_CONFIG, **(config or {})}
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _disk_path(self, sha256: str) -> Optional[str]:
+        cache_dir = self.config['cache_dir']
+        return os.path.join(cache_dir, f"{sha256}.v{INDEX_VERSION}.json") if cache_dir else None
+
+    def _remember(self, sha256: str, data: Dict[str, Any]):
+        with self._lock:
+            self._memory[sha256] = data
+            self._memory.move_to_end(sha256)
+            while len(self._memory) > max(self.config['memory_cache_size'], 0):
+                self._memory.popitem(last=False)
+
+    def _lookup(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if sha256 in self._memory:
+                self._memory.move_to_end(sha256)
+                return self._memory[sha256]
+        path = self._disk_path(sha256)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = orjson.loads(f.read())
+                self._remember(sha256, data)
+                return data
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取接口索引缓存失败: {path}, {str(e)}")
+        return None
+
+    def store(self, index: ApiDefinitionIndex):
+        data = index.to_dict()
+        self._remember(index.sha256, data)
+        path = self._disk_path(index.sha256)
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.index_', suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(orjson.dumps(data))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入接口索引缓存失败: {path}, {str(e)}")
+
+    def get(self, file_path: str) -> ApiDefinitionIndex:
+        """获取文件的接口索引, 文件内容未变化时直接使用缓存"""
+        hash_index = get_file_hash_index()
+        sha256 = hash_index.get_hash(file_path)
+        if sha256 is None:
+            sha256 = _file_sha256(file_path)
+            hash_index.add(file_path, sha256)
+        data = self._lookup(sha256)
+        if data is None:
+            with self._build_lock:
+                data = self._lookup(sha256)
+                if data is None:
+                    index = ApiDefinitionIndex.build(file_path, sha256)
+                    self.store(index)
+                    logger.info(f"接口定义索引生成完成: {file_path}, 接口数: {len(index.entries)}")
+                    return index
+        return ApiDefinitionIndex.from_dict(file_path, data)
+
+
+_index_cache = None
+_index_cache_lock = threading.Lock()
+
+
+def get_api_index_cache() -> ApiDefinitionIndexCache:
+    """获取进程内共享的接口索引缓存（单例模式）"""
+    global _index_cache
+    if _index_cache is None:
+        with _index_cache_lock:
+            if _index_cache is None:
+                _index_cache = ApiDefinitionIndexCache(getattr(settings, 'API_DEFINITION_INDEX_CONFIG', {}))
+    return _index_cache
+
+
+def get_api_definition_index(file_path: str) -> ApiDefinitionIndex:
+    """获取接口定义文件的索引"""
+    return get_api_index_cache().get(file_path)
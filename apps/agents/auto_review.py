@@ -0,0 +1,264 @@
+"""
+待评审用例的后台自动AI评审
+
+按优先级(P0最先, 未设置优先级的最后)持续拉取status='pending'的用例, 分批并发评审并保存评审结果(TestCaseReview)。
+    - 游标: 每个优先级记录已处理到的(updated_at, id), 保存在状态文件中, 重启后从游标处继续;
+      用例被编辑后updated_at变大, 会重新进入队列
+    - 预算: 按滑动窗口限制每小时的大模型调用次数
+    - 失败的用例在后续轮次中重试, 超过max_attempts次后不再重试(直到用例被编辑)
+    - 状态文件中同时记录累计评审数、吞吐量等统计, 供命令行和状态接口查看
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..core.models import TestCase
+from .reviewer import TestCaseReviewerAgent
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_AUTO_REVIEW_CONFIG = {
+    'round_size': 40,                 # 每轮最多拉取的用例条数
+    'poll_interval': 30,              # 队列为空时的轮询间隔(秒)
+    'max_llm_calls_per_hour': 120,    # 每小时最多的大模型调用次数(批次调用和批次内的逐条补评都计入), 0表示不限制
+    'max_attempts': 3,                # 单条用例评审失败后的最大尝试次数
+    'state_path': os.path.join(settings.BASE_DIR, 'auto_review_state.json'),
+}
+
+# 拉取顺序: P0 -> P3, 未设置优先级的用例最后
+PRIORITY_ORDER = [value for value, _ in TestCase.PRIORITY_CHOICES] + ['']
+
+
+def _epoch() -> datetime:
+    epoch = datetime(1970, 1, 1)
+    return timezone.make_aware(epoch, dt_timezone.utc) if settings.USE_TZ else epoch
+
+
+def get_auto_review_config() -> Dict[str, Any]:
+    return {**DEFAULT_AUTO_REVIEW_CONFIG, **getattr(settings, 'AUTO_REVIEW_CONFIG', {})}
+
+
+class AutoReviewState:
+    """状态文件(游标 + 重试记录 + 统计), 每次修改后原子写入"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取自动评审状态文件失败, 将从头开始: {str(e)}")
+        data.setdefault('cursors', {})
+        data.setdefault('attempts', {})
+        data.setdefault('stats', {'reviewed': 0, 'failed': 0, 'llm_calls': 0, 'rounds': 0})
+        return data
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def cursor(self, priority: str) -> tuple:
+        cursor = self.data['cursors'].get(priority)
+        if not cursor:
+            return _epoch(), 0
+        return datetime.fromisoformat(cursor['updated_at']), cursor['id']
+
+    def advance(self, test_case: TestCase):
+        updated_at, case_id = self.cursor(test_case.priority)
+        if (test_case.updated_at, test_case.id) > (updated_at, case_id):
+            self.data['cursors'][test_case.priority] = {
+                'updated_at': test_case.updated_at.isoformat(), 'id': test_case.id
+            }
+
+
+class LLMCallBudget:
+    """滑动窗口内的大模型调用次数预算, 线程安全(批次内的补评在评审线程中申请额度)"""
+
+    def __init__(self, calls_per_hour: int, window: float = 3600.0):
+        self.calls_per_hour = calls_per_hour
+        self.window = window
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._calls and now - self._calls[0] >= self.window:
+            self._calls.popleft()
+
+    def reserve(self, wanted: int) -> int:
+        """预留至多wanted次调用, 返回实际可用的次数"""
+        if self.calls_per_hour <= 0:
+            return wanted
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            granted = max(0, min(wanted, self.calls_per_hour - len(self._calls)))
+            self._calls.extend([now] * granted)
+        return granted
+
+    def seconds_until_available(self) -> float:
+        with self._lock:
+            if self.calls_per_hour <= 0 or not self._calls:
+                return 0.0
+            self._expire(time.monotonic())
+            if len(self._calls) < self.calls_per_hour:
+                return 0.0
+            return max(0.0, self.window - (time.monotonic() - self._calls[0]))
+
+
+class AutoReviewWorker:
+    """待评审队列的自动评审worker"""
+
+    def __init__(self, reviewer: TestCaseReviewerAgent, config: Optional[Dict[str, Any]] = None):
+        self.reviewer = reviewer
+        self.config = {**get_auto_review_config(), **(config or {})}
+        self.state = AutoReviewState(self.config['state_path'])
+        self.budget = LLMCallBudget(self.config['max_llm_calls_per_hour'])
+
+    def next_cases(self, limit: int) -> List[TestCase]:
+        """按优先级依次取游标之后的待评审用例, 需要重试的失败用例排在最前"""
+        attempts = self.state.data['attempts']
+        retry_ids = [int(i) for i, n in attempts.items() if n < self.config['max_attempts']]
+        cases = list(TestCase.objects.filter(id__in=retry_ids, status='pending').order_by('id')[:limit])
+        for priority in PRIORITY_ORDER:
+            if len(cases) >= limit:
+                break
+            updated_at, case_id = self.state.cursor(priority)
+            cases.extend(
+                TestCase.objects
+                .filter(status='pending', priority=priority)
+                .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=case_id))
+                .exclude(id__in=retry_ids)
+                .order_by('updated_at', 'id')[:limit - len(cases)]
+            )
+        return cases
+
+    def run_round(self) -> int:
+        """评审一轮, 返回本轮处理的用例条数(0表示队列为空或预算用尽)"""
+        cases = self.next_cases(self.config['round_size'])
+        if not cases:
+            return 0
+
+        # 内容未变化的用例已有评审结果(如状态文件丢失后重启), 直接跳过
+        stored = self.reviewer.get_stored_reviews(cases)
+        to_review = [test_case for test_case in cases if test_case.id not in stored]
+        batches = self.reviewer.plan_batches(to_review)
+        granted = self.budget.reserve(len(batches))
+        if batches and not granted:
+            return 0
+        to_review = [test_case for batch in batches[:granted] for test_case in batch]
+        reviewing = {test_case.id for test_case in to_review}
+        # 游标只推进到第一条因预算不足未评审的用例之前, 其余用例留到下一轮
+        selected_ids = set()
+        for test_case in cases:
+            if test_case.id not in stored and test_case.id not in reviewing:
+                break
+            selected_ids.add(test_case.id)
+
+        # 批次内逐条补评的额外调用同样计入预算, 预算用尽时不再补评(这些用例按失败处理, 下一轮重试)
+        llm_calls = granted
+        calls_lock = threading.Lock()
+
+        def reserve_call() -> bool:
+            nonlocal llm_calls
+            if not self.budget.reserve(1):
+                return False
+            with calls_lock:
+                llm_calls += 1
+            return True
+
+        start = time.perf_counter()
+        reviewed = failed = 0
+        attempts = self.state.data['attempts']
+        for test_case, review_result, error in self.reviewer.review_many(to_review, reserve_call):
+            key = str(test_case.id)
+            if error:
+                failed += 1
+                attempts[key] = attempts.get(key, 0) + 1
+                logger.warning(f"自动评审用例 {test_case.id} 失败(第 {attempts[key]} 次): {error}")
+            else:
+                self.reviewer.store_review(test_case, review_result)
+                attempts.pop(key, None)
+                reviewed += 1
+        for test_case in cases:
+            if test_case.id in selected_ids:
+                self.state.advance(test_case)
+            if test_case.id in stored:
+                attempts.pop(str(test_case.id), None)
+
+        elapsed = time.perf_counter() - start
+        stats = self.state.data['stats']
+        stats['reviewed'] += reviewed
+        stats['failed'] += failed
+        stats['llm_calls'] += llm_calls
+        stats['rounds'] += 1
+        stats['last_round'] = {
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'reviewed': reviewed,
+            'skipped': len(stored),
+            'failed': failed,
+            'llm_calls': llm_calls,
+            'elapsed_seconds': round(elapsed, 2),
+            'cases_per_minute': round(reviewed / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        }
+        self.state.save()
+        logger.info(f"自动评审一轮完成: 评审 {reviewed} 条, 跳过 {len(stored)} 条, 失败 {failed} 条, "
+                    f"耗时 {elapsed:.1f} 秒")
+        return len(to_review) + len(stored)
+
+    def run(self, once: bool = False, stop_event: Optional[threading.Event] = None):
+        """持续评审, once为True时只处理到队列为空(或预算用尽)为止"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            processed = self.run_round()
+            last_round = self.state.data['stats'].get('last_round', {})
+            if processed and last_round.get('failed') and not last_round.get('reviewed') and not once:
+                # 整轮都失败(如大模型服务不可用)时等待一个轮询间隔再重试, 避免空转
+                logger.warning(f"本轮评审全部失败, {self.config['poll_interval']} 秒后重试")
+                stop_event.wait(self.config['poll_interval'])
+                continue
+            if processed:
+                continue
+            if once:
+                return
+            wait = self.budget.seconds_until_available() or self.config['poll_interval']
+            logger.info(f"待评审队列为空或预算已用尽, {wait:.0f} 秒后继续")
+            stop_event.wait(wait)
+
+
+def get_auto_review_status() -> Dict[str, Any]:
+    """队列深度与吞吐量: 各优先级游标之后的待评审用例数 + 状态文件中的统计"""
+    state = AutoReviewState(get_auto_review_config()['state_path'])
+    queue = {}
+    for priority in PRIORITY_ORDER:
+        updated_at, case_id = state.cursor(priority)
+        queue[priority or 'unset'] = (
+            TestCase.objects
+            .filter(status='pending', priority=priority)
+            .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=case_id))
+            .count()
+        )
+    return {
+        'pending_total': TestCase.objects.filter(status='pending').count(),
+        'queue_depth': sum(queue.values()),
+        'queue_by_priority': queue,
+        'retrying': sum(1 for n in state.data['attempts'].values() if n < get_auto_review_config()['max_attempts']),
+        'stats': state.data['stats'],
+    }
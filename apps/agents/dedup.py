@@ -0,0 +1,122 @@
+"""
+基于向量相似度的测试用例语义去重
+
+对每条用例的"描述 + 测试步骤"做一次批量向量化(BGE-M3, 已归一化), 用矩阵乘得到两两余弦相似度,
+相似度超过阈值的用例通过并查集聚成一簇, 每簇只保留最早出现的一条, 其余记为被合并的重复用例。
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DEDUP_CONFIG = {
+    'enabled': True,
+    'threshold': 0.92,   # 余弦相似度不低于该值视为重复
+}
+
+
+def get_dedup_config() -> Dict[str, Any]:
+    return {**DEFAULT_DEDUP_CONFIG, **getattr(settings, 'CASE_DEDUP_CONFIG', {})}
+
+
+def case_text(test_case: Dict[str, Any]) -> str:
+    """用于向量化的用例文本: 描述 + 测试步骤"""
+    steps = test_case.get('test_steps') or []
+    if isinstance(steps, str):
+        steps = [steps]
+    return '\n'.join([str(test_case.get('description', ''))] + [str(step) for step in steps])
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@dataclass
+class DedupResult:
+    """一次去重的结果"""
+    kept: List[Dict[str, Any]] = field(default_factory=list)
+    merged: List[Dict[str, Any]] = field(default_factory=list)   # 每簇: 保留的用例和被合并的重复用例
+    elapsed_ms: float = 0.0
+
+    @property
+    def removed_count(self) -> int:
+        return sum(len(group['duplicates']) for group in self.merged)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'removed_count': self.removed_count, 'merged': self.merged, 'elapsed_ms': round(self.elapsed_ms, 2)}
+
+
+class SemanticDeduplicator:
+    """测试用例语义去重
+
+    可多次调用dedupe: 后续批次会同时与之前已保留的用例比较(用于分批/流式生成)
+    """
+
+    def __init__(self, embedder, threshold: Optional[float] = None):
+        self.embedder = embedder
+        self.threshold = get_dedup_config()['threshold'] if threshold is None else threshold
+        self._accepted_cases: List[Dict[str, Any]] = []
+        self._accepted_vectors: Optional[np.ndarray] = None
+
+    def dedupe(self, cases: List[Dict[str, Any]]) -> DedupResult:
+        """对一批用例去重, 返回保留的用例(保持原顺序)和合并明细"""
+        result = DedupResult()
+        if not cases:
+            return result
+        start = time.perf_counter()
+        vectors = np.asarray(self.embedder.get_embeddings([case_text(case) for case in cases]), dtype=np.float32)
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        n_old = 0 if self._accepted_vectors is None else len(self._accepted_vectors)
+        all_vectors = vectors if not n_old else np.vstack([self._accepted_vectors, vectors])
+        all_cases = self._accepted_cases + list(cases)
+
+        # 新用例与(已保留 + 新用例)的相似度, 只取上三角避免重复计算自身和对称项
+        similarity = vectors @ all_vectors.T
+        rows, cols = np.nonzero(similarity >= self.threshold)
+        rows = rows + n_old
+        mask = cols < rows
+        parent = list(range(len(all_cases)))
+        for i, j in zip(rows[mask].tolist(), cols[mask].tolist()):
+            root_i, root_j = _find(parent, i), _find(parent, j)
+            if root_i != root_j:
+                # 以更早出现的用例作为簇的代表
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(n_old, len(all_cases)):
+            root = _find(parent, i)
+            if root != i:
+                groups.setdefault(root, []).append(i)
+
+        duplicate_indices = {i for members in groups.values() for i in members}
+        kept_indices = [i for i in range(n_old, len(all_cases)) if i not in duplicate_indices]
+        result.kept = [all_cases[i] for i in kept_indices]
+        for root, members in sorted(groups.items()):
+            result.merged.append({
+                'kept_index': root,
+                'kept': all_cases[root].get('description', ''),
+                'duplicates': [{
+                    'index': i,
+                    'description': all_cases[i].get('description', ''),
+                    'similarity': round(float(all_vectors[i] @ all_vectors[root]), 4),
+                } for i in members],
+            })
+
+        self._accepted_cases.extend(result.kept)
+        kept_vectors = all_vectors[kept_indices]
+        self._accepted_vectors = kept_vectors if not n_old else np.vstack([self._accepted_vectors, kept_vectors])
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"用例语义去重: 输入 {len(cases)} 条, 保留 {len(result.kept)} 条, 合并 {result.removed_count} 条, "
+                    f"向量化 {embed_ms:.1f}ms, 聚类 {result.elapsed_ms - embed_ms:.1f}ms")
+        return result
@@ -1,67 +1,370 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+import contextvars
 import json
+from django.conf import settings
 from langchain_core.messages import SystemMessage, HumanMessage
 from ..llm.base import BaseLLMService
+from ..llm.concurrency import get_concurrency_limiter
+from ..knowledge.case_index import get_test_case_index_config
 from ..knowledge.service import KnowledgeService
+from .dedup import DedupResult, SemanticDeduplicator, get_dedup_config
+from .json_stream import JsonArrayStreamParser, parse_json_array
 from .prompts import TestCaseGeneratorPrompt
 from utils.logger_manager import get_logger
 import re
+
+
+# 用例条数较多时的分批并行生成配置, 可在settings.CASE_GENERATION_SHARDING中覆盖
+DEFAULT_SHARDING_CONFIG = {
+    'enabled': True,
+    'shard_size': 10,    # 每个批次最多生成的用例条数
+    'max_shards': 10,    # 最多拆分的批次数, 超出时自动增大每批条数
+}
+
+# 合法用例条数不足时的补充生成配置, 可在settings.CASE_GENERATION_TOPUP中覆盖
+DEFAULT_TOPUP_CONFIG = {
+    'enabled': True,
+    'max_rounds': 2,               # 每次生成最多补充请求的次数
+    'max_listed': 30,              # 补充请求中最多列出的已生成用例条数
+    'description_max_chars': 80,   # 列出的用例描述的最大长度
+}
+
+
+@dataclass
+class GenerationShard:
+    """分批生成时的一个批次"""
+    index: int
+    case_design_methods: List[str]
+    case_categories: List[str]
+    case_count: int
+    focus: str = ""
+
+
+def _case_key(test_case: Dict[str, Any]) -> str:
+    """用例去重的key: 忽略空白、标点和步骤编号的差异"""
+    def _norm(text) -> str:
+        text = re.sub(r'^\s*\d+[.、)）]\s*', '', str(text))
+        return re.sub(r'[\s\W_]+', '', text).lower()
+
+    parts = [_norm(test_case.get('description', ''))]
+    parts.extend(_norm(step) for step in test_case.get('test_steps', []))
+    return '|'.join(parts)
+
+
 class TestCaseGeneratorAgent:
     """测试用例生成Agent"""
     
-    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService, case_design_methods: List[str], case_categories: List[str], case_count: int = 10):
+    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService, case_design_methods: List[str], case_categories: List[str], case_count: int = 10, llm_provider: Optional[str] = None, case_index=None):
         self.llm_service = llm_service
         self.case_design_methods = case_design_methods
         self.case_categories = case_categories
         self.case_count = case_count
         self.knowledge_service = knowledge_service
         self.prompt = TestCaseGeneratorPrompt()
+        self.limiter = get_concurrency_limiter(llm_provider)
+        self.sharding_config = {**DEFAULT_SHARDING_CONFIG, **getattr(settings, 'CASE_GENERATION_SHARDING', {})}
+        self.topup_config = {**DEFAULT_TOPUP_CONFIG, **getattr(settings, 'CASE_GENERATION_TOPUP', {})}
+        self.deduplicator = None
+        self.dedup_report = DedupResult()   # 最近一次生成中被语义去重合并的用例
+        self.case_index = case_index        # 已保存用例的向量索引, 用于检索相似的历史用例作为参考
+        self.reference_cases = []           # 最近一次生成中作为参考示例的历史用例
         self.logger = get_logger(self.__class__.__name__)  # 添加logger
     
     def generate(self, input_text: str, input_type: str = "requirement") -> List[Dict[str, Any]]:
         """生成测试用例"""
         self.logger.info(f"开始生成测试用例,进入生成测试用例的TestCaseGeneratorAgent")
-        # 确定输入类型描述
-        input_type_desc = "需求描述" if input_type == "requirement" else "代码片段"
-        
-        # 获取知识上下文
+        self._reset_deduplicator()
+        self._load_reference_cases(input_text)
         knowledge_context = self._get_knowledge_context(input_text)
-        self.logger.info(f"获取到知识库上下文: \n{'='*50}\n{knowledge_context}\n{'='*50}")
-        
-        # 处理设计方法和测试类型
-        case_design_methods = ",".join(self.case_design_methods) if self.case_design_methods else ""
-        case_categories = ",".join(self.case_categories) if self.case_categories else ""
-        
-        # 使用新的 format_messages 方法获取消息列表
-        messages = self.prompt.format_messages(
-            requirements=input_text,
-            case_design_methods=case_design_methods,
-            case_categories=case_categories,
-            case_count=self.case_count,
-            knowledge_context=knowledge_context
-        )
-        self.logger.info(f"构建后大模型提示词+用户需求消息: \n{'='*50}\n{messages}\n{'='*50}")
+        shards = self._plan_shards()
+        if len(shards) > 1:
+            return self._generate_sharded(input_text, knowledge_context, shards)
+
+        messages = self._build_messages(input_text, knowledge_context)
+        result = ""
         
         # 调用LLM服务
         try:
-            response = self.llm_service.invoke(messages)
+            with self.limiter:
+                response = self.llm_service.invoke(messages)
             result = response.content
             self.logger.info(f"LLM原始响应: \n{'='*50}\n{result}\n{'='*50}")
             
-            # 尝试提取JSON部分
-            json_str = self._extract_json_from_response(result)
-            if not json_str:
-                raise ValueError("无法从响应中提取有效的JSON数据")
-                
-            # 尝试解析JSON
-            test_cases = json.loads(json_str)
+            # 解析JSON数组, 单个元素格式错误或输出被截断时尽量恢复其余元素
+            report = parse_json_array(result)
+            self.logger.info(f"JSON解析结果: {report.summary()}")
+            if not report.items:
+                self.logger.warning("无法从响应中提取有效的JSON数据")
+            test_cases = report.items
             self.logger.info(f"_validate_test_cases处理前的用例个数: {len(test_cases)}")
             
-            valid_test_cases = self._validate_test_cases(test_cases)
-            return valid_test_cases
-            
+            valid_test_cases = self._validate_test_cases(test_cases, raise_on_empty=False)
+            accepted = self._semantic_dedupe(valid_test_cases)
+            # 合法用例不足时只补充缺少的部分, 不整体重新生成
+            accepted += list(self._iter_topup(input_text, knowledge_context, accepted))
         except Exception as e:
             raise ValueError(f"无法解析生成的测试用例: {str(e)}\n原始响应: {result}")
+        if not accepted:
+            raise ValueError(f"没有找到任何合法的测试用例\n原始响应: {result}")
+        return accepted
+
+    def generate_stream(self, input_text: str, input_type: str = "requirement") -> Iterator[Dict[str, Any]]:
+        """流式生成测试用例, 每解析出一条合法用例立即返回
+
+        需要分批生成时, 每完成一个批次就返回该批次中去重后的用例
+        """
+        self.logger.info(f"开始流式生成测试用例")
+        self._reset_deduplicator()
+        self._load_reference_cases(input_text)
+        knowledge_context = self._get_knowledge_context(input_text)
+        shards = self._plan_shards()
+        if len(shards) > 1:
+            seen_keys = set()
+            accepted = []
+            for _, cases in self._iter_shard_results(input_text, knowledge_context, shards):
+                cases = self._semantic_dedupe(self._dedupe(cases, seen_keys, len(cases)))
+                for test_case in cases[:self.case_count - len(accepted)]:
+                    accepted.append(test_case)
+                    yield test_case
+            for test_case in self._iter_topup(input_text, knowledge_context, accepted):
+                accepted.append(test_case)
+                yield test_case
+            if not accepted:
+                raise ValueError("没有找到任何合法的测试用例")
+            return
+
+        messages = self._build_messages(input_text, knowledge_context)
+        parser = JsonArrayStreamParser()
+        chunks = []
+        index = 0
+        accepted = []
+        with self.limiter:
+            for chunk in self.llm_service.stream(messages):
+                content = chunk.content if isinstance(chunk.content, str) else ''
+                chunks.append(content)
+                for test_case in parser.feed(content):
+                    index += 1
+                    if self._validate_test_case(test_case, index) and self._semantic_dedupe([test_case]):
+                        accepted.append(test_case)
+                        yield test_case
+        # 输出被截断时尝试恢复最后一个元素
+        for test_case in parser.close():
+            index += 1
+            if self._validate_test_case(test_case, index) and self._semantic_dedupe([test_case]):
+                accepted.append(test_case)
+                yield test_case
+        self.logger.info(f"LLM原始响应: \n{'='*50}\n{''.join(chunks)}\n{'='*50}")
+        self.logger.info(f"JSON流式解析结果: {parser.report.summary()}")
+        self.logger.info(f"共处理 {index} 个测试用例，其中 {len(accepted)} 个合法")
+        for test_case in self._iter_topup(input_text, knowledge_context, accepted):
+            accepted.append(test_case)
+            yield test_case
+        if not accepted:
+            raise ValueError("没有找到任何合法的测试用例")
+
+    def _plan_shards(self) -> List[GenerationShard]:
+        """拆分批次: 优先按选择的多个设计方法(或多个用例类型)拆分, 单个批次条数过多时再按固定条数切片"""
+        config = self.sharding_config
+        if not config['enabled'] or self.case_count <= config['shard_size']:
+            return [GenerationShard(1, self.case_design_methods, self.case_categories, self.case_count)]
+
+        if len(self.case_design_methods or []) > 1:
+            groups = [([method], self.case_categories) for method in self.case_design_methods]
+        elif len(self.case_categories or []) > 1:
+            groups = [(self.case_design_methods, [category]) for category in self.case_categories]
+        else:
+            groups = [(self.case_design_methods, self.case_categories)]
+
+        # 用例条数按组平均分配, 余数分给前面的组
+        base, remainder = divmod(self.case_count, len(groups))
+        counts = [base + (1 if i < remainder else 0) for i in range(len(groups))]
+        shard_size = max(config['shard_size'], -(-self.case_count // config['max_shards']))
+
+        shards = []
+        focuses = self.prompt.slice_focuses
+        for (methods, categories), count in zip(groups, counts):
+            n_slices = -(-count // shard_size)
+            for i in range(n_slices):
+                slice_count = count // n_slices + (1 if i < count % n_slices else 0)
+                if slice_count <= 0:
+                    continue
+                focus = focuses[i % len(focuses)] if n_slices > 1 and focuses else ""
+                shards.append(GenerationShard(len(shards) + 1, methods, categories, slice_count, focus))
+        return shards
+
+    def _generate_shard(self, input_text: str, knowledge_context: str,
+                        shard: GenerationShard, shard_total: int, topup_hint: str = "") -> List[Dict[str, Any]]:
+        """生成单个批次的用例, 返回校验通过的用例"""
+        messages = self._build_messages(input_text, knowledge_context, shard, shard_total, topup_hint)
+        with self.limiter:
+            response = self.llm_service.invoke(messages)
+        report = parse_json_array(response.content)
+        label = "补充生成" if topup_hint else f"批次 {shard.index}/{shard_total}"
+        self.logger.info(f"{label} 解析结果: {report.summary()}")
+        return [case for i, case in enumerate(report.items) if self._validate_test_case(case, i + 1)]
+
+    def _iter_shard_results(self, input_text: str, knowledge_context: str,
+                            shards: List[GenerationShard]) -> Iterator[Tuple[GenerationShard, List[Dict[str, Any]]]]:
+        """并发生成所有批次, 按完成顺序返回(批次, 用例列表), 单个批次失败不影响其它批次"""
+        self.logger.info(f"用例分 {len(shards)} 批并行生成: "
+                         f"{[(s.case_design_methods, s.case_categories, s.case_count, s.focus) for s in shards]}")
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            # 复制当前上下文, 使bypass_llm_cache等上下文设置在线程中同样生效
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._generate_shard,
+                                input_text, knowledge_context, shard, len(shards)): shard
+                for shard in shards
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    cases = future.result()
+                except Exception as e:
+                    self.logger.error(f"批次 {shard.index}/{len(shards)} 生成失败: {str(e)}", exc_info=True)
+                    continue
+                yield shard, cases
+
+    def _generate_sharded(self, input_text: str, knowledge_context: str,
+                          shards: List[GenerationShard]) -> List[Dict[str, Any]]:
+        """分批并行生成, 按批次顺序合并并去重"""
+        results = dict(
+            (shard.index, cases) for shard, cases in self._iter_shard_results(input_text, knowledge_context, shards)
+        )
+        seen_keys = set()
+        merged = []
+        for index in sorted(results):
+            merged.extend(self._dedupe(results[index], seen_keys, len(results[index])))
+        merged = self._semantic_dedupe(merged)[:self.case_count]
+        total = sum(len(cases) for cases in results.values())
+        self.logger.info(f"分批生成完成: 成功批次 {len(results)}/{len(shards)}, "
+                         f"合法用例 {total} 条, 去重后 {len(merged)} 条")
+        merged += list(self._iter_topup(input_text, knowledge_context, merged))
+        if not merged:
+            raise ValueError("没有找到任何合法的测试用例")
+        return merged
+
+    def _iter_topup(self, input_text: str, knowledge_context: str,
+                    accepted: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """合法用例不足case_count时, 只针对缺少的条数补充生成, 逐条返回新增的用例
+
+        补充请求中列出已生成用例的描述以避免重复, 补充次数不超过max_rounds
+        """
+        config = self.topup_config
+        if not config['enabled']:
+            return
+        accepted = list(accepted)
+        seen_keys = {_case_key(case) for case in accepted}
+        for round_index in range(1, config['max_rounds'] + 1):
+            missing = self.case_count - len(accepted)
+            if missing <= 0:
+                return
+            self.logger.info(f"合法用例 {len(accepted)}/{self.case_count} 条, 第 {round_index} 次补充生成 {missing} 条")
+            shard = GenerationShard(0, self.case_design_methods, self.case_categories, missing)
+            try:
+                cases = self._generate_shard(input_text, knowledge_context, shard, 1, self._topup_hint(accepted, missing))
+            except Exception as e:
+                self.logger.error(f"第 {round_index} 次补充生成失败: {str(e)}", exc_info=True)
+                continue
+            cases = self._semantic_dedupe(self._dedupe(cases, seen_keys, missing))
+            self.logger.info(f"第 {round_index} 次补充生成新增 {len(cases)} 条用例")
+            accepted.extend(cases)
+            yield from cases
+
+    def _topup_hint(self, accepted: List[Dict[str, Any]], missing: int) -> str:
+        """补充生成的说明, 只列出最近的max_listed条已生成用例且截断过长的描述, 控制提示词长度"""
+        config = self.topup_config
+        max_chars = config['description_max_chars']
+        descriptions = [
+            str(case.get('description', ''))[:max_chars]
+            for case in accepted[-config['max_listed']:]
+        ] if config['max_listed'] > 0 else []
+        return self.prompt.format_topup_hint(descriptions, missing)
+
+    def _dedupe(self, cases: List[Dict[str, Any]], seen_keys: set, limit: int) -> List[Dict[str, Any]]:
+        """去掉与已接受用例重复的用例, 最多返回limit条"""
+        accepted = []
+        for case in cases:
+            if len(accepted) >= limit:
+                break
+            key = _case_key(case)
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            accepted.append(case)
+        return accepted
+
+    def _reset_deduplicator(self):
+        """每次生成开始时重置语义去重状态, 未配置嵌入模型或关闭去重时不做语义去重"""
+        self.dedup_report = DedupResult()
+        embedder = getattr(self.knowledge_service, 'embedder', None)
+        if embedder is not None and get_dedup_config()['enabled']:
+            self.deduplicator = SemanticDeduplicator(embedder)
+        else:
+            self.deduplicator = None
+
+    def _semantic_dedupe(self, cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按语义相似度去掉与已保留用例重复的用例, 合并明细累计到dedup_report"""
+        if self.deduplicator is None or not cases:
+            return cases
+        try:
+            result = self.deduplicator.dedupe(cases)
+        except Exception as e:
+            self.logger.warning(f"用例语义去重失败, 保留全部用例: {str(e)}")
+            return cases
+        self.dedup_report.merged.extend(result.merged)
+        self.dedup_report.elapsed_ms += result.elapsed_ms
+        return result.kept
+
+    def _load_reference_cases(self, input_text: str):
+        """从用例索引中检索与需求相似的已评审通过用例, 作为生成时的参考示例"""
+        self.reference_cases = []
+        config = get_test_case_index_config()
+        if self.case_index is None or config['few_shot_count'] <= 0:
+            return
+        try:
+            similar = self.case_index.similar_cases(
+                input_text, top_k=config['few_shot_count'], min_score=config['few_shot_min_score']
+            )
+        except Exception as e:
+            self.logger.warning(f"检索相似历史用例失败: {str(e)}")
+            return
+        self.reference_cases = [{
+            'id': case.id,
+            'score': score,
+            'description': case.description,
+            'test_steps': case.test_steps,
+            'expected_results': case.expected_results,
+        } for case, score in similar]
+        if self.reference_cases:
+            self.logger.info(f"找到 {len(self.reference_cases)} 条相似的已通过用例作为参考: "
+                             f"{[(case['id'], round(case['score'], 3)) for case in self.reference_cases]}")
+
+    def _build_messages(self, input_text: str, knowledge_context: str,
+                        shard: Optional[GenerationShard] = None, shard_total: int = 1, topup_hint: str = ""):
+        """构建生成测试用例的提示词消息"""
+        self.logger.info(f"获取到知识库上下文: \n{'='*50}\n{knowledge_context}\n{'='*50}")
+        case_design_methods = shard.case_design_methods if shard else self.case_design_methods
+        case_categories = shard.case_categories if shard else self.case_categories
+        shard_hint = ""
+        if shard and shard_total > 1:
+            shard_hint = self.prompt.format_shard_hint(shard.index, shard_total, shard.case_count, shard.focus)
+        if topup_hint:
+            shard_hint = topup_hint
+        
+        # 使用新的 format_messages 方法获取消息列表
+        messages = self.prompt.format_messages(
+            requirements=input_text,
+            case_design_methods=",".join(case_design_methods) if case_design_methods else "",
+            case_categories=",".join(case_categories) if case_categories else "",
+            case_count=shard.case_count if shard else self.case_count,
+            knowledge_context=knowledge_context,
+            shard_hint=shard_hint,
+            reference_cases=self.prompt.format_reference_cases(self.reference_cases)
+        )
+        self.logger.info(f"构建后大模型提示词+用户需求消息: \n{'='*50}\n{messages}\n{'='*50}")
+        return messages
     
     def _get_knowledge_context(self, input_text: str) -> str:
         """获取相关知识上下文"""
@@ -75,67 +378,22 @@ class TestCaseGeneratorAgent:
             self.logger.warning(f"获取知识上下文失败: {str(e)}")
         return ""
     
-    def _validate_test_cases(self, test_cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _validate_test_cases(self, test_cases: List[Dict[str, Any]], raise_on_empty: bool = True) -> List[Dict[str, Any]]:
         """验证并修复测试用例格式
         
         Args:
             test_cases: 原始测试用例列表
+            raise_on_empty: 没有合法用例时是否抛出异常(需要补充生成时传False)
             
         Returns:
             验证并修复后的测试用例列表
         """  
-        valid_test_cases = []
-        required_fields = {"description", "test_steps", "expected_results"}
-        
-        for i, test_case in enumerate(test_cases):
-            try:
-                # 如果不是字典格式，跳过这个测试用例
-                if not isinstance(test_case, dict):
-                    self.logger.warning(f"测试用例 #{i+1} 不是字典格式，已跳过")
-                    continue
-                
-                # 检查必要字段是否存在
-                missing_fields = required_fields - set(test_case.keys())
-                if missing_fields:
-                    self.logger.warning(f"测试用例 #{i+1} 缺少必要字段: {missing_fields}，已跳过")
-                    continue
-                
-                # 验证并修复字段格式
-                # 1. description必须是字符串
-                if not isinstance(test_case['description'], str):
-                    self.logger.warning(f"测试用例 #{i+1} 的description不是字符串格式，已跳过")
-                    continue
-                
-                # 2. test_steps必须是列表
-                if not isinstance(test_case['test_steps'], list):
-                    self.logger.warning(f"测试用例 #{i+1} 的test_steps格式无法修复，已跳过")
-                    continue
-                
-                # 3. expected_results必须是列表
-                if not isinstance(test_case['expected_results'], list):
-                    self.logger.warning(f"测试用例 #{i+1} 的expected_results格式无法修复，已跳过")
-                    continue
-                
-                # 确保所有字段都不为空
-                if not test_case['description'].strip():
-                    self.logger.warning(f"测试用例 #{i+1} 的description为空，已跳过")
-                    continue
-                
-                if not test_case['test_steps']:
-                    self.logger.warning(f"测试用例 #{i+1} 的test_steps为空，已跳过")
-                    continue
-                
-                if not test_case['expected_results']:
-                    self.logger.warning(f"测试用例 #{i+1} 的expected_results为空，已跳过")
-                    continue
-                # 通过所有验证，添加到有效列表
-                valid_test_cases.append(test_case)
-                
-            except Exception as e:
-                self.logger.warning(f"处理测试用例 #{i+1} 时出错: {str(e)}，已跳过")
-                continue
+        valid_test_cases = [
+            test_case for i, test_case in enumerate(test_cases)
+            if self._validate_test_case(test_case, i + 1)
+        ]
         
-        if not valid_test_cases:
+        if not valid_test_cases and raise_on_empty:
             raise ValueError("没有找到任何合法的测试用例")
         
         self.logger.info(f"共处理 {len(test_cases)} 个测试用例，"
@@ -143,28 +401,52 @@ class TestCaseGeneratorAgent:
         
         return valid_test_cases
             
-    def _extract_json_from_response(self, response: str) -> str:
-        """从响应中提取JSON部分并进行基础修复
-        
-        Args:
-            response: 原始响应字符串
+    def _validate_test_case(self, test_case: Any, index: int) -> bool:
+        """校验单个测试用例的格式, 不合法时记录原因并返回False"""
+        required_fields = {"description", "test_steps", "expected_results"}
+        try:
+            # 如果不是字典格式，跳过这个测试用例
+            if not isinstance(test_case, dict):
+                self.logger.warning(f"测试用例 #{index} 不是字典格式，已跳过")
+                return False
             
-        Returns:
-            修复后的JSON字符串
-        """
-        # 使用正则表达式提取JSON字符串
-        result = ""
-        right_format_pattern = r'^\[([\s\S]*)\]$'
-        match = re.search(right_format_pattern, response)
-        if match:
-            result = match.group(0)  # 使用group(0)返回完整匹配，包含方括号
-        else:
-            #从字符串中找到最后一个出现},的位置，然后取},前面的内容,并补全]和json结束标记```
-            last_comma_index = response.rfind('},')
-            if last_comma_index != -1:
-                result = response[:last_comma_index+1] + ']'
-        # self.logger.info(f"_extract_json_from_response函数处理结果: \n{'='*50}\n{result}\n{'='*50}")    
-        return result
-        
-
+            # 检查必要字段是否存在
+            missing_fields = required_fields - set(test_case.keys())
+            if missing_fields:
+                self.logger.warning(f"测试用例 #{index} 缺少必要字段: {missing_fields}，已跳过")
+                return False
+            
+            # 验证并修复字段格式
+            # 1. description必须是字符串
+            if not isinstance(test_case['description'], str):
+                self.logger.warning(f"测试用例 #{index} 的description不是字符串格式，已跳过")
+                return False
             
+            # 2. test_steps必须是列表
+            if not isinstance(test_case['test_steps'], list):
+                self.logger.warning(f"测试用例 #{index} 的test_steps格式无法修复，已跳过")
+                return False
+            
+            # 3. expected_results必须是列表
+            if not isinstance(test_case['expected_results'], list):
+                self.logger.warning(f"测试用例 #{index} 的expected_results格式无法修复，已跳过")
+                return False
+            
+            # 确保所有字段都不为空
+            if not test_case['description'].strip():
+                self.logger.warning(f"测试用例 #{index} 的description为空，已跳过")
+                return False
+            
+            if not test_case['test_steps']:
+                self.logger.warning(f"测试用例 #{index} 的test_steps为空，已跳过")
+                return False
+            
+            if not test_case['expected_results']:
+                self.logger.warning(f"测试用例 #{index} 的expected_results为空，已跳过")
+                return False
+            # 通过所有验证
+            return True
+            
+        except Exception as e:
+            self.logger.warning(f"处理测试用例 #{index} 时出错: {str(e)}，已跳过")
+            return False
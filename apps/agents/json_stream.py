@@ -0,0 +1,257 @@
+"""
+大模型JSON数组输出的增量解析
+
+大模型返回形如 [{...}, {...}] 的JSON数组时(流式token或完整文本均可), 每当一个顶层元素完整出现就立即解析并返回,
+不需要等待整个数组生成完毕。容错处理:
+    - 数组前后的说明文字、```json代码块标记会被跳过
+    - 尾逗号、注释、单引号等不规范写法用json5兜底解析
+    - 输出被截断时, 补全未闭合的字符串和括号后尝试恢复最后一个元素
+    - 单个元素解析失败只丢弃该元素, 不影响其它元素
+每个元素的解析结果记录在ParseReport中, 便于定位丢失了哪些元素。
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import json5
+
+# 顶层数组'['之后允许出现的首个非空白字符, 用来区分正文中的"[1]"、"[注]"之类的文字
+_ARRAY_START_CHARS = set('{["]')
+_CLOSING = {'{': '}', '[': ']'}
+
+
+@dataclass
+class ElementStatus:
+    """单个顶层元素的解析结果"""
+    index: int                     # 在数组中的位置(从1开始)
+    status: str                    # ok / repaired(不规范写法已修复) / truncated(截断后补全) / failed
+    error: str = ''
+    preview: str = ''              # 原始文本片段, 便于排查
+
+    @property
+    def recovered(self) -> bool:
+        return self.status != 'failed'
+
+
+@dataclass
+class ParseReport:
+    """一次解析的汇总结果"""
+    items: List[Any] = field(default_factory=list)
+    elements: List[ElementStatus] = field(default_factory=list)
+    array_found: bool = False
+    complete: bool = False         # 是否读到了顶层数组的结束符']'
+
+    @property
+    def failed(self) -> List[ElementStatus]:
+        return [e for e in self.elements if e.status == 'failed']
+
+    def summary(self) -> str:
+        counts = {}
+        for element in self.elements:
+            counts[element.status] = counts.get(element.status, 0) + 1
+        failed = ', '.join(f"#{e.index}({e.error})" for e in self.failed)
+        return (f"共 {len(self.elements)} 个元素, 恢复 {len(self.items)} 个, 状态分布 {counts}, "
+                f"数组{'完整' if self.complete else '未结束(可能被截断)'}"
+                + (f", 失败元素: {failed}" if failed else ''))
+
+
+def _loads_lenient(raw: str):
+    """先按标准JSON解析, 失败后用json5兼容尾逗号/注释/单引号等写法, 返回(值, 是否经过修复)"""
+    try:
+        return json.loads(raw), False
+    except ValueError:
+        return json5.loads(raw), True
+
+
+def _close_brackets(text: str, stack: List[str]) -> str:
+    return text + ''.join(_CLOSING[ch] for ch in reversed(stack))
+
+
+class JsonArrayStreamParser:
+    """增量解析JSON数组的顶层元素
+
+    用法:
+        parser = JsonArrayStreamParser()
+        for chunk in llm.stream(messages):
+            for item in parser.feed(chunk.content):
+                ...
+        for item in parser.close():   # 流结束, 尝试恢复被截断的最后一个元素
+            ...
+        logger.info(parser.report.summary())
+    """
+
+    def __init__(self):
+        self.report = ParseReport()
+        self._buffer = []          # 当前元素已接收的字符
+        self._candidate = False    # 已看到'[', 等待下一个非空白字符确认是否为数组开始
+        self._stack = []           # 当前元素内部未闭合的括号
+        self._commas = []          # 当前元素内部逗号的(位置, 括号栈)
+        self._in_string = False
+        self._escape = False
+        self._closed = False
+
+    @property
+    def finished(self) -> bool:
+        return self.report.complete
+
+    def feed(self, text: str) -> List[Any]:
+        """追加一段文本, 返回本段文本中新完成的元素"""
+        items = []
+        for ch in text or '':
+            if self.report.complete:
+                break
+            if not self.report.array_found:
+                # 确认数组开始的字符同时也是第一个元素的首字符(或空数组的']')
+                self._seek_array_start(ch)
+                if not self.report.array_found or self.report.complete:
+                    continue
+            self._consume(ch, items)
+        return items
+
+    def close(self) -> List[Any]:
+        """输入结束时调用, 处理被截断的最后一个元素"""
+        items = []
+        if self._closed:
+            return items
+        self._closed = True
+        if self.report.complete or not ''.join(self._buffer).strip():
+            return items
+        if not self._stack and not self._in_string:
+            # 标量元素或已闭合但缺少逗号/']'的元素
+            self._emit(items)
+            return items
+
+        # 先补全未闭合的字符串和括号; 仍无法解析时, 依次退回到前一个逗号处丢弃不完整的键值后再补全
+        raw = ''.join(self._buffer)
+        candidates = [_close_brackets(raw + ('"' if self._in_string else ''), self._stack)]
+        for position, stack in reversed(self._commas):
+            candidates.append(_close_brackets(raw[:position], stack))
+        for candidate in candidates:
+            try:
+                _loads_lenient(candidate)
+            except Exception:
+                continue
+            self._emit(items, raw=candidate, truncated=True)
+            return items
+        self._emit(items, truncated=True)
+        return items
+
+    def _seek_array_start(self, ch: str):
+        if self._candidate:
+            if ch.isspace():
+                return
+            if ch in _ARRAY_START_CHARS:
+                self.report.array_found = True
+                if ch == ']':
+                    self.report.complete = True
+                return
+            self._candidate = False
+        if ch == '[':
+            self._candidate = True
+
+    def _consume(self, ch: str, items: List[Any]):
+        if self._in_string:
+            self._buffer.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return
+
+        if not self._stack:
+            # 顶层数组中元素之间的位置
+            if ch in ',]':
+                self._emit(items)
+                if ch == ']':
+                    self.report.complete = True
+                return
+            if ch.isspace() and not self._buffer:
+                return
+
+        if ch == ',':
+            # 记录元素内部逗号的位置和当时的括号栈, 截断恢复时使用
+            self._commas.append((len(self._buffer), list(self._stack)))
+        self._buffer.append(ch)
+        if ch == '"':
+            self._in_string = True
+        elif ch in '{[':
+            self._stack.append(ch)
+        elif ch in '}]':
+            if self._stack:
+                self._stack.pop()
+            if not self._stack:
+                self._emit(items)
+
+    def _emit(self, items: List[Any], raw: Optional[str] = None, truncated: bool = False):
+        raw = (raw if raw is not None else ''.join(self._buffer)).strip()
+        self._buffer = []
+        self._stack = []
+        self._commas = []
+        self._in_string = False
+        self._escape = False
+        if not raw:
+            # 尾逗号或连续逗号产生的空元素
+            return
+        index = len(self.report.elements) + 1
+        try:
+            value, repaired = _loads_lenient(raw)
+        except Exception as e:
+            self.report.elements.append(ElementStatus(index, 'failed', str(e), raw[:100]))
+            return
+        status = 'truncated' if truncated else ('repaired' if repaired else 'ok')
+        self.report.elements.append(ElementStatus(index, status, preview=raw[:100]))
+        self.report.items.append(value)
+        items.append(value)
+
+
+def parse_json_array(text: str) -> ParseReport:
+    """解析完整文本中的JSON数组; 文本中没有数组时, 尝试把第一个JSON对象当作单元素数组"""
+    parser = JsonArrayStreamParser()
+    parser.feed(text)
+    parser.close()
+    report = parser.report
+    if report.array_found:
+        return report
+
+    start = text.find('{') if text else -1
+    end = text.rfind('}') if text else -1
+    if start != -1 and end > start:
+        raw = text[start:end + 1]
+        try:
+            value, repaired = _loads_lenient(raw)
+            report.items.append(value)
+            report.elements.append(ElementStatus(1, 'repaired' if repaired else 'ok', preview=raw[:100]))
+            report.complete = True
+        except Exception as e:
+            report.elements.append(ElementStatus(1, 'failed', str(e), raw[:100]))
+    return report
+
+
+def parse_json_object(text: str) -> ParseReport:
+    """解析完整文本中的第一个JSON对象(大模型应返回单个对象时使用), 输出被截断时补全后尝试恢复"""
+    report = ParseReport()
+    start = text.find('{') if text else -1
+    if start == -1:
+        return report
+    end = text.rfind('}')
+    if end > start:
+        raw = text[start:end + 1]
+        try:
+            value, repaired = _loads_lenient(raw)
+            report.items.append(value)
+            report.elements.append(ElementStatus(1, 'repaired' if repaired else 'ok', preview=raw[:100]))
+            report.array_found = report.complete = True
+            return report
+        except Exception:
+            pass
+    # 对象不完整(如输出被截断), 当作单元素数组增量解析, 由close()补全未闭合的括号
+    parser = JsonArrayStreamParser()
+    parser.feed('[' + text[start:])
+    parser.close()
+    report = parser.report
+    report.items = report.items[:1]
+    report.elements = [element for element in report.elements if element.recovered][:1] or report.elements[:1]
+    return report
@@ -0,0 +1,57 @@
+"""
+后台自动AI评审待评审的测试用例
+
+用法:
+    python manage.py auto_review                # 持续运行, 队列为空时定期轮询
+    python manage.py auto_review --once         # 处理完当前队列后退出(适合定时任务)
+    python manage.py auto_review --status       # 查看队列深度和吞吐量
+"""
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.agents.auto_review import AutoReviewWorker, get_auto_review_status
+from apps.agents.reviewer import TestCaseReviewerAgent
+from apps.llm import LLMServiceFactory
+
+
+class Command(BaseCommand):
+    help = "按优先级持续评审status='pending'的测试用例并保存AI评审结果"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='处理完当前队列后退出')
+        parser.add_argument('--status', action='store_true', help='只输出队列深度和吞吐量统计')
+        parser.add_argument('--provider', default=None, help='评审使用的大模型提供商, 默认使用default_provider')
+        parser.add_argument('--round-size', type=int, default=None, help='每轮最多拉取的用例条数')
+        parser.add_argument('--max-calls-per-hour', type=int, default=None, help='每小时最多的大模型调用次数, 0表示不限制')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.stdout.write(json.dumps(get_auto_review_status(), ensure_ascii=False, indent=2))
+            return
+
+        llm_config = getattr(settings, 'LLM_PROVIDERS', {})
+        provider = options['provider'] or llm_config.get('default_provider', 'deepseek')
+        reviewer = TestCaseReviewerAgent(
+            LLMServiceFactory.create(provider, **llm_config.get(provider, {})),
+            knowledge_service=None,
+            llm_provider=provider
+        )
+        overrides = {}
+        if options['round_size']:
+            overrides['round_size'] = options['round_size']
+        if options['max_calls_per_hour'] is not None:
+            overrides['max_llm_calls_per_hour'] = options['max_calls_per_hour']
+
+        worker = AutoReviewWorker(reviewer, overrides)
+        self.stdout.write(f"开始自动评审, provider={provider}, 状态文件: {worker.config['state_path']}")
+        try:
+            worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write("已停止, 进度已保存")
+        stats = worker.state.data['stats']
+        self.stdout.write(self.style.SUCCESS(
+            f"累计评审 {stats['reviewed']} 条, 失败 {stats['failed']} 次, 大模型调用 {stats['llm_calls']} 次"
+        ))
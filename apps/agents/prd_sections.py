@@ -0,0 +1,166 @@
+"""
+按标题层级把Markdown格式的PRD拆分为token数受限的章节
+
+拆分规则:
+    - 整个章节(含所有子章节)不超过预算时作为一个整体
+    - 超出预算时, 章节正文(第一个子标题之前的内容)单独成段, 子章节递归拆分,
+      相邻的较小子章节在预算内合并为一段, 减少大模型调用次数
+    - 没有子标题且超出预算的章节按段落切分
+每一段都带有标题路径(如 "2 功能需求 > 2.1 登录"), 分析时作为上下文提供给大模型
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from ..llm.tokens import estimate_tokens
+
+_HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+
+@dataclass
+class PrdSection:
+    """拆分后的一段PRD内容"""
+    index: int
+    path: List[str]                # 所属章节的标题路径
+    content: str
+    key: str = ''                  # 段的标识(标题路径 + 合并/切分信息), 同一文档内唯一
+
+    @property
+    def title(self) -> str:
+        return self.key or '文档开头'
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.content)
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content.strip().encode('utf-8')).hexdigest()
+
+
+@dataclass
+class _Node:
+    level: int
+    title: str
+    heading: str = ''
+    body: List[str] = field(default_factory=list)
+    children: List['_Node'] = field(default_factory=list)
+
+    def own_text(self) -> str:
+        return '\n'.join(([self.heading] if self.heading else []) + self.body).strip()
+
+    def full_text(self) -> str:
+        parts = [self.own_text()] + [child.full_text() for child in self.children]
+        return '\n\n'.join(part for part in parts if part)
+
+
+def _parse_tree(markdown: str) -> _Node:
+    root = _Node(level=0, title='')
+    stack = [root]
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_PATTERN.match(line)
+        if match:
+            level = len(match.group(1))
+            while stack[-1].level >= level:
+                stack.pop()
+            node = _Node(level=level, title=match.group(2).strip(), heading=line.strip())
+            stack[-1].children.append(node)
+            stack.append(node)
+        else:
+            stack[-1].body.append(line)
+    return root
+
+
+def _split_paragraphs(text: str, max_tokens: int) -> List[str]:
+    """按空行切分段落并在预算内合并, 单个段落超出预算时按行切分"""
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(paragraph.splitlines())
+    chunks, current, used = [], [], 0
+    for piece in pieces:
+        cost = estimate_tokens(piece)
+        if current and used + cost > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += cost
+    if current:
+        chunks.append('\n\n'.join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class _Splitter:
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.sections: List[PrdSection] = []
+        self._keys = {}
+
+    def add(self, path: List[str], content: str, suffix: str = ''):
+        if not content.strip():
+            return
+        key = (' > '.join(path) or '文档开头') + suffix
+        # 同名章节加序号保证key唯一
+        count = self._keys.get(key, 0)
+        self._keys[key] = count + 1
+        if count:
+            key = f"{key} #{count + 1}"
+        self.sections.append(PrdSection(len(self.sections) + 1, list(path), content.strip(), key))
+
+    def split(self, node: _Node, path: List[str]):
+        text = node.full_text()
+        if estimate_tokens(text) <= self.max_tokens:
+            self.add(path, text)
+            return
+        if not node.children:
+            chunks = _split_paragraphs(text, self.max_tokens)
+            for i, chunk in enumerate(chunks, 1):
+                self.add(path, chunk, f" ({i}/{len(chunks)})" if len(chunks) > 1 else '')
+            return
+
+        # 章节正文(带标题)单独成段, 只有标题没有正文时跳过
+        if any(line.strip() for line in node.body):
+            chunks = _split_paragraphs(node.own_text(), self.max_tokens)
+            for i, chunk in enumerate(chunks, 1):
+                self.add(path, chunk, f" (正文 {i}/{len(chunks)})" if len(chunks) > 1 else ' (正文)')
+
+        # 相邻的较小子章节在预算内合并
+        group: List[_Node] = []
+        used = 0
+        for child in node.children + [None]:
+            child_tokens = estimate_tokens(child.full_text()) if child else 0
+            fits = child is not None and child_tokens <= self.max_tokens
+            if group and (not fits or used + child_tokens > self.max_tokens):
+                self._add_group(group, path)
+                group, used = [], 0
+            if child is None:
+                break
+            if fits:
+                group.append(child)
+                used += child_tokens
+            else:
+                self.split(child, path + [child.title])
+
+    def _add_group(self, group: List[_Node], path: List[str]):
+        content = '\n\n'.join(child.full_text() for child in group)
+        if len(group) == 1:
+            self.add(path + [group[0].title], content)
+        else:
+            self.add(path, content, f" [{group[0].title} ~ {group[-1].title}]")
+
+
+def split_markdown_sections(markdown: str, max_tokens: int) -> List[PrdSection]:
+    """按标题层级拆分Markdown, 每段的token数不超过max_tokens(单行超长的内容除外)"""
+    root = _parse_tree(markdown or '')
+    splitter = _Splitter(max_tokens)
+    splitter.split(root, [])
+    return splitter.sections
+
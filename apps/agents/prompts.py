@@ -1,7 +1,8 @@
 from pathlib import Path
 import yaml
 import json
-from typing import Dict, Any
+import hashlib
+from typing import Dict, Any, List
 from langchain.prompts import ChatPromptTemplate
 from langchain.prompts.chat import SystemMessagePromptTemplate, HumanMessagePromptTemplate
 
@@ -14,6 +15,12 @@ class PromptTemplateManager:
         with open(config_path, "r", encoding="utf-8") as f:
             self.config = yaml.safe_load(f)
 
+    def config_version(self, section: str) -> str:
+        """某个提示词配置的指纹, 修改该配置后依赖它保存的结果(评审结果、章节分析、复用的用例等)自动失效"""
+        return hashlib.sha256(
+            json.dumps(self.config[section], ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+
     def get_test_case_generator_prompt(self) -> ChatPromptTemplate:
         """获取测试用例生成的提示词模板"""
         config = self.config['test_case_generator']
@@ -42,8 +49,8 @@ class PromptTemplateManager:
             human_message_prompt
         ])
 
-    def get_test_case_reviewer_prompt(self) -> ChatPromptTemplate:
-        """获取测试用例评审的提示词模板"""
+    def get_test_case_reviewer_prompt(self, template_key: str = 'human_template') -> ChatPromptTemplate:
+        """获取测试用例评审的提示词模板, 批量评审时template_key为batch_human_template"""
         config = self.config['test_case_reviewer']
         
         # 准备系统消息的变量并格式化模板
@@ -64,7 +71,7 @@ class PromptTemplateManager:
         
         # 创建人类消息模板 - 不要在这里格式化 test_case
         human_message_prompt = HumanMessagePromptTemplate.from_template(
-            config['human_template']
+            config[template_key]
         )
         
         # 组合成聊天提示词模板
@@ -100,8 +107,8 @@ class PromptTemplateManager:
             human_message_prompt
         ])
     
-    def get_api_test_case_generator_prompt(self) -> ChatPromptTemplate:
-        """获取API测试用例生成的提示词模板"""
+    def get_api_test_case_generator_prompt(self, template_key: str = 'human_template') -> ChatPromptTemplate:
+        """获取API测试用例生成的提示词模板, 多个接口打包生成时template_key为bundle_human_template"""
         config = self.config['api_test_case_generator']
         
         # 准备系统消息的变量并格式化模板
@@ -120,7 +127,7 @@ class PromptTemplateManager:
         
         # 创建人类消息模板
         human_message_prompt = HumanMessagePromptTemplate.from_template(
-            config['human_template']
+            config[template_key]
         )
         
         # 组合成聊天提示词模板
@@ -135,9 +142,45 @@ class TestCaseGeneratorPrompt:
     def __init__(self):
         self.prompt_manager = PromptTemplateManager()
         self.prompt_template = self.prompt_manager.get_test_case_generator_prompt()
+        self.config = self.prompt_manager.config['test_case_generator']
+        self.slice_focuses = self.config.get('slice_focuses', [])
+    
+    def format_shard_hint(self, shard_index: int, shard_total: int, case_count: int, focus: str = "") -> str:
+        """生成分批并行生成时追加在人类消息末尾的批次说明"""
+        shard_focus = self.config['shard_focus_template'].format(focus=focus) if focus else ""
+        return self.config['shard_hint_template'].format(
+            shard_index=shard_index,
+            shard_total=shard_total,
+            case_count=case_count,
+            shard_focus=shard_focus
+        )
+    
+    def format_topup_hint(self, accepted_descriptions: List[str], case_count: int) -> str:
+        """生成补充生成时追加在人类消息末尾的说明, 列出已生成用例的描述"""
+        return self.config['topup_template'].format(
+            accepted_count=len(accepted_descriptions),
+            case_count=case_count,
+            accepted='\n'.join(f"- {description}" for description in accepted_descriptions)
+        )
+    
+    def format_reference_cases(self, cases: List[Dict[str, Any]]) -> str:
+        """把相似的历史用例格式化为参考示例, cases中每项包含description/test_steps/expected_results/score"""
+        if not cases:
+            return ""
+        return self.config['reference_cases_template'].format(cases='\n'.join(
+            self.config['reference_case_template'].format(
+                index=index,
+                score=f"{case['score']:.2f}",
+                description=case['description'],
+                test_steps=case['test_steps'],
+                expected_results=case['expected_results']
+            )
+            for index, case in enumerate(cases, 1)
+        ))
     
     def format_messages(self, requirements: str, case_design_methods: str = "", 
-                       case_categories: str = "", knowledge_context: str = "",case_count: int = 10) -> list:
+                       case_categories: str = "", knowledge_context: str = "",case_count: int = 10,
+                       shard_hint: str = "", reference_cases: str = "") -> list:
         """格式化消息
         
         Args:
@@ -146,6 +189,8 @@ class TestCaseGeneratorPrompt:
             case_categories: 测试用例类型
             knowledge_context: 知识库上下文
             case_count: 生成用例条数
+            shard_hint: 分批生成时的批次说明
+            reference_cases: 相似的历史用例示例
         Returns:
             格式化后的消息列表
         """
@@ -168,7 +213,9 @@ class TestCaseGeneratorPrompt:
             case_design_methods=case_design_methods,
             case_categories=case_categories,
             case_count=case_count,
-            knowledge_context=knowledge_prompt
+            knowledge_context=knowledge_prompt,
+            shard_hint=shard_hint,
+            reference_cases=reference_cases
         )
 
 class TestCaseReviewerPrompt:
@@ -177,6 +224,20 @@ class TestCaseReviewerPrompt:
     def __init__(self):
         self.prompt_manager = PromptTemplateManager()
         self.prompt_template = self.prompt_manager.get_test_case_reviewer_prompt()
+        self.batch_prompt_template = self.prompt_manager.get_test_case_reviewer_prompt('batch_human_template')
+        self.config = self.prompt_manager.config['test_case_reviewer']
+        self.prompt_version = self.prompt_manager.config_version('test_case_reviewer')
+    
+    def format_test_case(self, test_case: Dict[str, Any]) -> str:
+        """格式化测试用例数据为字符串"""
+        return (
+            f"测试用例描述：\n{test_case.get('description', '')}\n\n"
+            f"测试步骤：\n{test_case.get('test_steps', '')}\n\n"
+            f"预期结果：\n{test_case.get('expected_results', '')}"
+        )
+    
+    def _review_points(self) -> str:
+        return '\n'.join(f"- {point}" for point in self.config['review_points'])
     
     def format_messages(self, test_case: Dict[str, Any]) -> list:
         """格式化消息
@@ -187,22 +248,31 @@ class TestCaseReviewerPrompt:
         Returns:
             格式化后的消息列表
         """
-        # 格式化测试用例数据为字符串
-        test_case_str = (
-            f"测试用例描述：\n{test_case.get('description', '')}\n\n"
-            f"测试步骤：\n{test_case.get('test_steps', '')}\n\n"
-            f"预期结果：\n{test_case.get('expected_results', '')}"
+        return self.prompt_template.format_messages(
+            test_case=self.format_test_case(test_case),
+            review_points=self._review_points()
         )
-        
-        # 获取评审点列表
-        review_points = '\n'.join(
-            f"- {point}" 
-            for point in self.prompt_manager.config['test_case_reviewer']['review_points']
+    
+    def format_batch_case(self, test_case: Dict[str, Any]) -> str:
+        """批量评审时单条用例的文本(带用例ID)"""
+        return self.config['batch_case_template'].format(
+            test_case_id=test_case['test_case_id'],
+            test_case=self.format_test_case(test_case)
         )
+    
+    def format_batch_messages(self, test_cases: List[Dict[str, Any]]) -> list:
+        """格式化批量评审消息
         
-        return self.prompt_template.format_messages(
-            test_case=test_case_str,
-            review_points=review_points
+        Args:
+            test_cases: 测试用例数据列表, 每条必须包含test_case_id
+            
+        Returns:
+            格式化后的消息列表
+        """
+        return self.batch_prompt_template.format_messages(
+            case_count=len(test_cases),
+            test_cases='\n'.join(self.format_batch_case(test_case) for test_case in test_cases),
+            review_points=self._review_points()
         )
 
 class PrdAnalyserPrompt:
@@ -211,18 +281,26 @@ class PrdAnalyserPrompt:
     def __init__(self):
         self.prompt_manager = PromptTemplateManager()
         self.prompt_template = self.prompt_manager.get_prd_analyser_prompt()
+        self.prompt_version = self.prompt_manager.config_version('prd_analyser')
     
-    def format_messages(self, markdown_content: str) -> list:
+    def format_messages(self, markdown_content: str, section_title: str = "") -> list:
         """格式化消息
         
         Args:
             markdown_content: Markdown格式的PRD文档内容
+            section_title: 按章节拆分分析时当前章节的标题路径
             
         Returns:
             格式化后的消息列表
         """
+        section_hint = ""
+        if section_title:
+            section_hint = self.prompt_manager.config['prd_analyser']['section_hint_template'].format(
+                section_title=section_title
+            )
         return self.prompt_template.format_messages(
-            markdown_content=markdown_content
+            markdown_content=markdown_content,
+            section_hint=section_hint
         )
 
 
@@ -232,6 +310,9 @@ class APITestCaseGeneratorPrompt:
     def __init__(self):
         self.prompt_manager = PromptTemplateManager()
         self.prompt_template = self.prompt_manager.get_api_test_case_generator_prompt()
+        self.bundle_prompt_template = self.prompt_manager.get_api_test_case_generator_prompt('bundle_human_template')
+        self.config = self.prompt_manager.config['api_test_case_generator']
+        self.prompt_version = self.prompt_manager.config_version('api_test_case_generator')
     
     def format_messages(self, api_info: Dict[str, Any], priority: str, 
                        case_count: int, test_case_template: str) -> list:
@@ -257,6 +338,39 @@ class APITestCaseGeneratorPrompt:
             test_case_template=test_case_template
         )
     
+    def format_bundle_api(self, index: int, api_info: Dict[str, Any]) -> str:
+        """打包生成时单个接口的文本(带接口路径)"""
+        return self.config['bundle_api_template'].format(
+            index=index,
+            path=api_info.get('path', ''),
+            api_name=api_info.get('name', ''),
+            method=api_info.get('method', ''),
+            request_structure=self._format_request_structure(api_info),
+            response_structure=self._format_response_structure(api_info)
+        )
+    
+    def format_bundle_messages(self, apis: List[Dict[str, Any]], priority: str,
+                               case_count: int, test_case_template: str) -> list:
+        """格式化多个接口打包生成的消息
+        
+        Args:
+            apis: API接口信息列表
+            priority: 测试用例优先级
+            case_count: 每个接口生成的测试用例数量
+            test_case_template: 测试用例结构模板
+            
+        Returns:
+            格式化后的消息列表
+        """
+        return self.bundle_prompt_template.format_messages(
+            api_count=len(apis),
+            case_count_per_api=case_count,
+            case_count=case_count * len(apis),
+            priority=priority,
+            api_sections='\n'.join(self.format_bundle_api(i, api) for i, api in enumerate(apis, 1)),
+            test_case_template=test_case_template
+        )
+    
     def _format_request_structure(self, api_info: Dict[str, Any]) -> str:
         """格式化请求结构信息"""
         request = api_info.get('request', {})
@@ -1,23 +1,62 @@
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+import hashlib
 import json
 import logging
 
+from django.conf import settings
 from ..llm.base import BaseLLMService
+from ..llm.concurrency import get_concurrency_limiter
+from ..llm.tokens import estimate_tokens, pack_by_budget
 from ..knowledge.service import KnowledgeService 
-from ..core.models import TestCase
+from ..core.models import TestCase, TestCaseReview
+from .json_stream import parse_json_array
 from .prompts import TestCaseReviewerPrompt
 from langchain_core.messages import SystemMessage, HumanMessage
 from utils.logger_manager import get_logger
 
 
+# 批量评审配置, 可在settings.CASE_REVIEW_BATCH中覆盖
+DEFAULT_BATCH_REVIEW_CONFIG = {
+    'token_budget': 3000,        # 单个批次中用例内容的token预算, 超出时拆到下一批
+    'max_cases_per_batch': 8,    # 单个批次最多的用例条数
+}
+
+
+def parse_review_result(content: str) -> Dict[str, Any]:
+    """把单条评审的大模型输出解析为字典, 无法解析时原文放在comments中"""
+    report = parse_json_array(content)
+    if report.items and isinstance(report.items[0], dict):
+        return report.items[0]
+    return {'comments': content}
+
+
+def review_content_hash(test_case: TestCase) -> str:
+    """参与评审的用例内容(描述/步骤/预期结果)的哈希"""
+    content = '\x1f'.join([test_case.description or '', test_case.test_steps or '', test_case.expected_results or ''])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def invalidate_stored_reviews(test_case: TestCase) -> int:
+    """删除与用例当前内容不一致的AI评审结果(人工评审记录保留), 返回删除条数"""
+    deleted, _ = (TestCaseReview.objects
+                  .filter(test_case=test_case, reviewer__isnull=True)
+                  .exclude(content_hash=review_content_hash(test_case))
+                  .delete())
+    return deleted
+
 
 class TestCaseReviewerAgent:
     """测试用例评审Agent"""
     
-    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService):
+    def __init__(self, llm_service: BaseLLMService, knowledge_service: KnowledgeService, llm_provider: Optional[str] = None):
         self.llm_service = llm_service
         self.knowledge_service = knowledge_service
         self.prompt = TestCaseReviewerPrompt()
+        self.llm_provider = llm_provider
+        self.limiter = get_concurrency_limiter(llm_provider)
+        self.batch_config = {**DEFAULT_BATCH_REVIEW_CONFIG, **getattr(settings, 'CASE_REVIEW_BATCH', {})}
         self.logger = get_logger(self.__class__.__name__)  # 添加logger
 
     
@@ -38,7 +77,8 @@ class TestCaseReviewerAgent:
             self.logger.info(f"构建后的评审提示词: \n{'='*50}\n{messages}\n{'='*50}")
             
             # 调用LLM服务
-            result = self.llm_service.invoke(messages)  # 使用 invoke 方法替代 chat
+            with self.limiter:
+                result = self.llm_service.invoke(messages)  # 使用 invoke 方法替代 chat
             
             return result
             
@@ -46,6 +86,118 @@ class TestCaseReviewerAgent:
             self.logger.error(f"评审过程出错: {str(e)}", exc_info=True)
             raise Exception(f"评审失败: {str(e)}")
 
+    def get_stored_reviews(self, test_cases: List[TestCase]) -> Dict[int, TestCaseReview]:
+        """查询用例内容和评审提示词版本都未变化的AI评审结果, 返回{用例ID: 最近一次评审}"""
+        hashes = {test_case.id: review_content_hash(test_case) for test_case in test_cases}
+        stored = {}
+        reviews = (TestCaseReview.objects
+                   .filter(test_case_id__in=list(hashes), reviewer__isnull=True,
+                           prompt_version=self.prompt.prompt_version)
+                   .order_by('-review_date'))
+        for review in reviews:
+            if review.test_case_id not in stored and review.content_hash == hashes[review.test_case_id]:
+                stored[review.test_case_id] = review
+        return stored
+
+    def store_review(self, test_case: TestCase, review_result: Dict[str, Any],
+                     review_comments: Optional[str] = None) -> TestCaseReview:
+        """保存AI评审结果, review_comments为空时保存结构化结果的JSON文本"""
+        return TestCaseReview.objects.create(
+            test_case=test_case,
+            review_comments=review_comments or json.dumps(review_result, ensure_ascii=False, indent=2),
+            review_result=review_result,
+            content_hash=review_content_hash(test_case),
+            prompt_version=self.prompt.prompt_version,
+            llm_provider=self.llm_provider or ''
+        )
+
+    def _batch_case_dict(self, test_case: TestCase) -> Dict[str, Any]:
+        return {
+            "test_case_id": test_case.id,
+            "description": test_case.description,
+            "test_steps": test_case.test_steps,
+            "expected_results": test_case.expected_results
+        }
+
+    def plan_batches(self, test_cases: List[TestCase]) -> List[List[TestCase]]:
+        """按token预算把多条较短的用例打包到同一个评审批次, 较长的用例单独成批"""
+        return pack_by_budget(
+            test_cases,
+            cost=lambda test_case: estimate_tokens(self.prompt.format_batch_case(self._batch_case_dict(test_case))),
+            budget=self.batch_config['token_budget'],
+            max_items=self.batch_config['max_cases_per_batch']
+        )
+
+    def review_batch(self, test_cases: List[TestCase],
+                     reserve_call: Optional[Callable[[], bool]] = None) -> Dict[int, Dict[str, Any]]:
+        """在一次大模型调用中评审多条用例, 返回{用例ID: 评审结果}
+
+        大模型漏掉或返回了无法识别的用例时, 对这些用例逐条补评; 每次补评是一次额外的大模型调用,
+        指定reserve_call时补评前先调用它申请调用额度, 返回False时不再补评, 这些用例不出现在返回结果中
+        """
+        if len(test_cases) == 1:
+            return {test_cases[0].id: parse_review_result(self.review(test_cases[0]).content)}
+
+        messages = self.prompt.format_batch_messages([self._batch_case_dict(tc) for tc in test_cases])
+        with self.limiter:
+            response = self.llm_service.invoke(messages)
+        report = parse_json_array(response.content)
+        self.logger.info(f"批量评审 {len(test_cases)} 条用例, 解析结果: {report.summary()}")
+
+        expected_ids = {test_case.id for test_case in test_cases}
+        results = {}
+        for item in report.items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                test_case_id = int(item.get('test_case_id'))
+            except (TypeError, ValueError):
+                continue
+            if test_case_id in expected_ids:
+                results[test_case_id] = item
+
+        missing = [test_case for test_case in test_cases if test_case.id not in results]
+        if missing:
+            self.logger.warning(f"批量评审结果缺少用例 {[tc.id for tc in missing]}, 逐条补评")
+            for test_case in missing:
+                if reserve_call is not None and not reserve_call():
+                    self.logger.warning(f"调用额度不足, 跳过补评用例 {test_case.id}")
+                    continue
+                results[test_case.id] = parse_review_result(self.review(test_case).content)
+        return results
+
+    def review_many(self, test_cases: List[TestCase],
+                    reserve_call: Optional[Callable[[], bool]] = None
+                    ) -> Iterator[Tuple[TestCase, Optional[Dict[str, Any]], Optional[str]]]:
+        """批量并发评审, 按批次完成顺序逐条返回(用例, 评审结果, 错误信息)
+
+        并发数受提供商的并发限制器约束, 单个批次失败只影响该批次的用例;
+        reserve_call用于批次内逐条补评前申请调用额度(见review_batch), 会在多个线程中调用
+        """
+        batches = self.plan_batches(list(test_cases))
+        if not batches:
+            return
+        self.logger.info(f"批量评审 {sum(len(b) for b in batches)} 条用例, 共 {len(batches)} 个批次: "
+                         f"{[len(b) for b in batches]}")
+        with ThreadPoolExecutor(max_workers=min(len(batches), self.limiter.limit)) as executor:
+            # 复制当前上下文, 使bypass_llm_cache等上下文设置在线程中同样生效
+            futures = {
+                executor.submit(contextvars.copy_context().run, self.review_batch, batch, reserve_call): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.logger.error(f"批量评审失败, 用例: {[tc.id for tc in batch]}: {str(e)}", exc_info=True)
+                    for test_case in batch:
+                        yield test_case, None, str(e)
+                    continue
+                for test_case in batch:
+                    result = results.get(test_case.id)
+                    yield test_case, result, None if result is not None else '批量评审结果中缺少该用例'
+
     def _format_prompt(self, test_case):
         """格式化提示词"""
         try:
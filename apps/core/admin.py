@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TestCase, TestCaseReview, KnowledgeBase
+from .models import TestCase, TestCaseReview, KnowledgeBase, PrdSectionAnalysis
 
 @admin.register(TestCase)
 class TestCaseAdmin(admin.ModelAdmin):
@@ -10,11 +10,18 @@ class TestCaseAdmin(admin.ModelAdmin):
 
 @admin.register(TestCaseReview)
 class TestCaseReviewAdmin(admin.ModelAdmin):
-    list_display = ('test_case', 'reviewer', 'review_date')
-    list_filter = ('review_date',)
+    list_display = ('test_case', 'reviewer', 'llm_provider', 'prompt_version', 'review_date')
+    list_filter = ('review_date', 'llm_provider')
     search_fields = ('test_case__title', 'review_comments')
     readonly_fields = ('review_date',)
 
+@admin.register(PrdSectionAnalysis)
+class PrdSectionAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('document_key', 'section_key', 'prompt_version', 'updated_at')
+    list_filter = ('updated_at',)
+    search_fields = ('document_key', 'section_key')
+    readonly_fields = ('created_at', 'updated_at')
+
 @admin.register(KnowledgeBase)
 class KnowledgeBaseAdmin(admin.ModelAdmin):
     list_display = ('title', 'created_at')
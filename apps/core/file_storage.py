@@ -0,0 +1,398 @@
+"""
+上传/下载文件的公共处理
+
+- 上传: HashingUploadHandler在Django解析请求体时直接写入保存目录下的临时文件并计算sha256,
+  超出大小限制时立即中止接收(不再先完整接收到Django的临时文件再复制一遍); 相同内容的文件只保存一份
+- 下载: 使用FileResponse流式返回, 支持ETag/If-None-Match和单段Range请求
+"""
+
+import functools
+import hashlib
+import mimetypes
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# 读写文件的块大小
+BLOCK_SIZE = 1024 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UploadTooLargeError(ValueError):
+    """上传文件超出大小限制"""
+
+
+@dataclass
+class StoredFile:
+    """保存后的上传文件信息"""
+    path: str
+    name: str
+    sha256: str
+    size: int
+    duplicate: bool = False  # 是否与已保存的文件内容完全相同(此时path指向已有文件)
+
+
+class FileHashIndex:
+    """文件内容hash索引(sqlite), 记录 sha256 -> 文件路径
+
+    记录同时保存文件的size和mtime, 文件被修改或删除后对应记录自动失效;
+    另外记录文件所在目录, 上传去重只在同一保存目录内查找
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " dir TEXT)"
+            )
+            # 旧版本的索引没有dir列, 补上并按path回填
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+            if 'dir' not in columns:
+                conn.execute("ALTER TABLE files ADD COLUMN dir TEXT")
+                conn.executemany(
+                    "UPDATE files SET dir = ? WHERE path = ?",
+                    [(os.path.dirname(path), path) for (path,) in conn.execute("SELECT path FROM files").fetchall()]
+                )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256, dir)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _stat_matches(path: str, size: int, mtime_ns: int) -> bool:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return st.st_size == size and st.st_mtime_ns == mtime_ns
+
+    def find_by_hash(self, sha256: str, save_dir: Optional[str] = None) -> Optional[str]:
+        """查找内容相同且未被修改过的文件, 指定save_dir时只查找该目录下的文件"""
+        with self._lock, self._connect() as conn:
+            if save_dir is None:
+                rows = conn.execute(
+                    "SELECT path, size, mtime_ns FROM files WHERE sha256 = ?", (sha256,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT path, size, mtime_ns FROM files WHERE sha256 = ? AND dir = ?",
+                    (sha256, os.path.abspath(save_dir))
+                ).fetchall()
+            for path, size, mtime_ns in rows:
+                if self._stat_matches(path, size, mtime_ns):
+                    return path
+                conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        return None
+
+    def get_hash(self, path: str) -> Optional[str]:
+        """获取文件的内容hash, 文件已被修改时返回None"""
+        path = os.path.abspath(path)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT sha256, size, mtime_ns FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row and self._stat_matches(path, row[1], row[2]):
+            return row[0]
+        return None
+
+    def add(self, path: str, sha256: str):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (path, sha256, size, mtime_ns, dir) VALUES (?, ?, ?, ?, ?)",
+                (path, sha256, st.st_size, st.st_mtime_ns, os.path.dirname(path))
+            )
+
+
+_hash_index = None
+_hash_index_lock = threading.Lock()
+
+
+def get_file_hash_index() -> FileHashIndex:
+    """获取进程内共享的文件hash索引（单例模式）"""
+    global _hash_index
+    if _hash_index is None:
+        with _hash_index_lock:
+            if _hash_index is None:
+                _hash_index = FileHashIndex(os.path.join(settings.MEDIA_ROOT, '.file_index.sqlite3'))
+    return _hash_index
+
+
+def get_upload_limit(kind: str) -> Optional[int]:
+    """获取某类上传文件的大小上限(字节), 未配置时不限制"""
+    return getattr(settings, 'FILE_UPLOAD_LIMITS', {}).get(kind)
+
+
+def _too_large_message(max_size: int) -> str:
+    return f"文件大小超出限制({max_size // (1024 * 1024)}MB)"
+
+
+class HashedUploadedFile(UploadedFile):
+    """HashingUploadHandler接收完成的文件: 已在保存目录下的临时文件中, 并已计算好sha256"""
+
+    def __init__(self, temp_path: str, name: str, content_type: str, size: int, charset, sha256: str):
+        super().__init__(open(temp_path, 'rb'), name, content_type, size, charset)
+        self.temp_path = temp_path
+        self.sha256 = sha256
+
+    def temporary_file_path(self) -> str:
+        return self.temp_path
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """边接收边写入保存目录下的临时文件并计算sha256, 超出大小上限时抛出StopUpload立即中止接收
+
+    中止后request.upload_error中记录原因, 视图通过get_upload_error获取;
+    未被save_upload使用的临时文件在请求结束时删除
+    """
+
+    def __init__(self, request, save_dir: str, max_size: Optional[int] = None):
+        super().__init__(request)
+        self.save_dir = save_dir
+        self.max_size = max_size
+        self.temp_path = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        os.makedirs(self.save_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=self.save_dir, prefix='.upload_', suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.request._upload_temp_paths = getattr(self.request, '_upload_temp_paths', []) + [self.temp_path]
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.upload_interrupted()
+            self._reject()
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        return HashedUploadedFile(self.temp_path, self.file_name, self.content_type, self.size,
+                                  self.charset, self.sha.hexdigest())
+
+    def upload_interrupted(self):
+        # 关闭后仍保留self.file: Django中止上传时会对处理器的file属性再调用一次close
+        if getattr(self, 'file', None) is not None:
+            self.file.close()
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def _reject(self):
+        self.request.upload_error = _too_large_message(self.max_size)
+        logger.warning(f"上传文件超出大小限制, 中止接收: {self.request.path}")
+        raise StopUpload(connection_reset=True)
+
+
+def streaming_upload(kind: str, save_dir: str):
+    """视图装饰器: 在Django解析请求体之前安装HashingUploadHandler, 按kind对应的大小上限边接收边校验
+
+    CSRF中间件会在视图之前读取request.POST(即解析请求体), 因此外层csrf_exempt、内层csrf_protect,
+    保证处理器在解析前安装且CSRF校验照常进行
+    """
+    def decorator(view):
+        protected = view if getattr(view, 'csrf_exempt', False) else csrf_protect(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST':
+                request.upload_handlers.insert(0, HashingUploadHandler(request, save_dir, get_upload_limit(kind)))
+            try:
+                return protected(request, *args, **kwargs)
+            finally:
+                # save_upload已把临时文件移动到最终位置, 剩下的(未使用/出错)一律删除
+                for temp_path in getattr(request, '_upload_temp_paths', []):
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+def get_upload_error(request) -> Optional[str]:
+    """上传被HashingUploadHandler中止时返回原因"""
+    request.FILES  # 确保请求体已解析
+    return getattr(request, 'upload_error', None)
+
+
+def _unique_path(save_dir: str, file_name: str) -> str:
+    """生成不重名的文件路径"""
+    base_name, ext = os.path.splitext(file_name)
+    file_path = os.path.join(save_dir, file_name)
+    counter = 1
+    while os.path.exists(file_path):
+        file_path = os.path.join(save_dir, f"{base_name}_{counter}{ext}")
+        counter += 1
+    return file_path
+
+
+def save_upload(uploaded_file, save_dir: str, max_size: Optional[int] = None,
+                dedupe: bool = True) -> StoredFile:
+    """流式保存上传文件
+
+    Args:
+        uploaded_file: Django的UploadedFile对象
+        save_dir: 保存目录
+        max_size: 文件大小上限(字节), None表示不限制
+        dedupe: 是否按内容去重; 同一保存目录下已有内容相同的文件时直接返回该文件, 不再重复保存
+
+    Returns:
+        StoredFile
+
+    Raises:
+        UploadTooLargeError: 文件超出大小限制
+    """
+    # 客户端声明的大小超限时, 不读取内容直接拒绝
+    if max_size is not None and uploaded_file.size and uploaded_file.size > max_size:
+        raise UploadTooLargeError(_too_large_message(max_size))
+
+    os.makedirs(save_dir, exist_ok=True)
+    file_name = os.path.basename(uploaded_file.name)
+    if (isinstance(uploaded_file, HashedUploadedFile)
+            and os.path.dirname(os.path.abspath(uploaded_file.temp_path)) == os.path.abspath(save_dir)):
+        # 接收时已写入保存目录并计算了hash, 不再复制和重新计算
+        uploaded_file.close()
+        return _store(uploaded_file.temp_path, save_dir, file_name, uploaded_file.sha256,
+                      uploaded_file.size, dedupe)
+
+    sha = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=save_dir, prefix='.upload_', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in uploaded_file.chunks(BLOCK_SIZE):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(_too_large_message(max_size))
+                sha.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return _store(temp_path, save_dir, file_name, sha.hexdigest(), size, dedupe)
+
+
+def _store(temp_path: str, save_dir: str, file_name: str, sha256: str, size: int, dedupe: bool) -> StoredFile:
+    """把保存目录下已写完的临时文件去重或移动到最终位置"""
+    try:
+        index = get_file_hash_index()
+        if dedupe:
+            # 只在同一目录内去重: 其他用途(如PRD、接口定义)保存过相同内容不算重复
+            existing_path = index.find_by_hash(sha256, save_dir)
+            if existing_path:
+                os.remove(temp_path)
+                logger.info(f"上传文件与已有文件内容相同, 复用: {existing_path}")
+                return StoredFile(existing_path, os.path.basename(existing_path), sha256, size, duplicate=True)
+
+        file_path = _unique_path(save_dir, file_name)
+        os.replace(temp_path, file_path)
+        os.chmod(file_path, 0o644)  # mkstemp创建的文件默认仅属主可读写
+        index.add(file_path, sha256)
+        logger.info(f"上传文件保存成功: {file_path}, 大小: {size} 字节, sha256: {sha256}")
+        return StoredFile(file_path, os.path.basename(file_path), sha256, size)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _file_etag(file_path: str, st: os.stat_result) -> str:
+    sha256 = get_file_hash_index().get_hash(file_path)
+    if sha256:
+        return f'"{sha256}"'
+    # 不在索引中的文件用size+mtime生成弱ETag, 避免每次下载都对整个文件求hash
+    return f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _iter_file_range(file_path: str, start: int, length: int):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def build_file_response(request, file_path: str, content_type: Optional[str] = None,
+                        as_attachment: bool = True) -> HttpResponse:
+    """构造文件下载响应, 流式输出, 支持ETag和Range"""
+    st = os.stat(file_path)
+    file_name = os.path.basename(file_path)
+    content_type = content_type or mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    etag = _file_etag(file_path, st)
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    range_header = request.headers.get('Range')
+    # If-Range与当前ETag不一致时, 文件已变化, 忽略Range返回完整文件
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        match = _RANGE_RE.match(range_header.strip())
+        start = end = None
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else st.st_size - 1
+            else:
+                # bytes=-N 表示最后N个字节
+                start = max(st.st_size - int(match.group(2)), 0)
+                end = st.st_size - 1
+            end = min(end, st.st_size - 1)
+        if start is None or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{st.st_size}'
+            return response
+
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_file_range(file_path, start, length), status=206, content_type=content_type
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    else:
+        response = FileResponse(
+            open(file_path, 'rb'), as_attachment=as_attachment, filename=file_name, content_type=content_type
+        )
+
+    if as_attachment and not response.has_header('Content-Disposition'):
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
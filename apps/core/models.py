@@ -80,10 +80,17 @@ class TestCaseReview(models.Model):
         User, 
         on_delete=models.CASCADE, 
         related_name='reviews',
-        verbose_name="评审人"
+        verbose_name="评审人",
+        null=True,
+        blank=True  # AI评审没有评审人
     )
     review_comments = models.TextField(verbose_name="评审意见")
     review_date = models.DateTimeField(auto_now_add=True, verbose_name="评审时间")
+    # AI评审结果按(用例内容哈希, 评审提示词版本)复用, 用例内容或提示词变化后需要重新评审
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="用例内容哈希")
+    prompt_version = models.CharField(max_length=32, blank=True, verbose_name="评审提示词版本")
+    llm_provider = models.CharField(max_length=50, blank=True, verbose_name="评审模型提供商")
+    review_result = models.JSONField(null=True, blank=True, verbose_name="结构化评审结果")
     
     def __str__(self):
         return f"Review for {self.test_case.title}"
@@ -92,6 +99,25 @@ class TestCaseReview(models.Model):
         verbose_name = "测试用例评审"
         verbose_name_plural = "测试用例评审"
 
+class PrdSectionAnalysis(models.Model):
+    """PRD章节分析结果, 文档修订后内容未变化的章节直接复用"""
+    document_key = models.CharField(max_length=255, db_index=True, verbose_name="文档标识")
+    section_key = models.CharField(max_length=255, verbose_name="章节标识")
+    content_hash = models.CharField(max_length=64, db_index=True, verbose_name="章节内容哈希")
+    prompt_version = models.CharField(max_length=32, blank=True, verbose_name="分析提示词版本")
+    llm_provider = models.CharField(max_length=50, blank=True, verbose_name="分析模型提供商")
+    test_points = models.JSONField(default=list, verbose_name="章节测试点")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    
+    def __str__(self):
+        return f"{self.document_key} / {self.section_key}"
+    
+    class Meta:
+        verbose_name = "PRD章节分析"
+        verbose_name_plural = "PRD章节分析"
+        unique_together = ('document_key', 'section_key')
+
 class KnowledgeBase(models.Model):
     """知识库条目"""
     title = models.CharField(max_length=200, verbose_name="知识条目标题")
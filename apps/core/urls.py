@@ -5,6 +5,7 @@ urlpatterns = [
     # 页面路由
     path('', views.index, name='index'),
     path('generate/', views.generate, name='generate'),
+    path('generate/stream/', views.generate_stream, name='generate_stream'),  # 流式生成测试用例(SSE)
     path('review/', views.review_view, name='review'),
     path('knowledge/', views.knowledge_view, name='knowledge'),
     path('case-review-detail/', views.case_review_detail, name='case_review_detail'),
@@ -28,8 +29,12 @@ urlpatterns = [
     path('api/update-test-case/', views.update_test_case, name='update_test_case'),#更新单个测试用例的状态到mysql
     path('core/save-test-case/', views.save_test_case, name='save_test_case'),#批量保存大模型生成的测试用例
     path('api/review/', views.case_review, name='case_review'),#调用大模型对单个测试用例进行AI评审
+    path('api/review/batch/', views.case_review_batch, name='case_review_batch'),#批量并发AI评审(SSE)
+    path('api/review/auto/status/', views.auto_review_status, name='auto_review_status'),#后台自动评审的队列深度和吞吐量
+    path('api/llm/concurrency/', views.llm_concurrency_status, name='llm_concurrency_status'),#自适应并发的当前并发数和吞吐量
     path('api/add-knowledge/', views.add_knowledge, name='add_knowledge'),
     path('api/knowledge-list/', views.knowledge_list, name='knowledge_list'),
     path('api/search-knowledge/', views.search_knowledge, name='search_knowledge'),   
+    path('api/similar-test-cases/', views.similar_test_cases, name='similar_test_cases'), #按需求检索相似的已通过用例
     path('api/delete-test-cases/', views.delete_test_cases, name='delete_test_cases'), #删除选中的测试用例
 ] 
\ No newline at end of file
@@ -1,13 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 import json
 
 from .models import TestCase, TestCaseReview, KnowledgeBase
 from .forms import TestCaseForm, TestCaseReviewForm, KnowledgeBaseForm
 from ..agents.generator import TestCaseGeneratorAgent
-from ..agents.reviewer import TestCaseReviewerAgent
+from ..agents.reviewer import TestCaseReviewerAgent, parse_review_result, invalidate_stored_reviews
+from ..agents.auto_review import get_auto_review_status
 from ..agents.analyser import PrdAnalyserAgent
 from ..agents.api_case_generator import APITestCaseGeneratorAgent, parse_api_definitions, generate_test_cases_for_apis
 from ..knowledge.service import KnowledgeService
@@ -15,8 +16,12 @@ from ..knowledge.service import KnowledgeService
 # 初始化服务
 from django.conf import settings
 from apps.llm import LLMServiceFactory
+from apps.llm.cache import bypass_llm_cache
+from apps.llm.concurrency import get_adaptive_concurrency_stats
 from ..knowledge.vector_store import MilvusVectorStore
+from ..knowledge.snapshot import InMemoryVectorIndex
 from ..knowledge.embedding import BGEM3Embedder
+from ..knowledge.case_index import get_test_case_index
 from utils.logger_manager import get_logger
 
 from django.http import JsonResponse
@@ -24,14 +29,20 @@ from django.views.decorators.csrf import csrf_exempt
 import os
 from datetime import datetime
 from .milvus_helper import get_embedding_model, init_milvus_collection, process_singel_file
+from ..knowledge.ingestion import SUPPORTED_EXTENSIONS, parse_file_to_texts, embed_and_insert
+from .file_storage import (
+    save_upload, build_file_response, get_upload_limit, UploadTooLargeError, streaming_upload, get_upload_error
+)
 from langchain.text_splitter import CharacterTextSplitter
 import hashlib
 import numpy as np
 import gc
+import time
 import xlwt
 from django.http import HttpResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from utils.file_transfer import word_to_markdown
+from django.db import connection, transaction
+from utils.file_transfer import docx_to_markdown
 
 logger = get_logger(__name__)
 
@@ -53,17 +64,23 @@ llm_service = LLMServiceFactory.create(
     **DEFAULT_LLM_CONFIG
 )
 
-vector_store = MilvusVectorStore(
-    host=settings.VECTOR_DB_CONFIG['host'],
-    port=settings.VECTOR_DB_CONFIG['port'],
-    collection_name=settings.VECTOR_DB_CONFIG['collection_name']
-)
+if settings.VECTOR_DB_CONFIG.get('backend') == 'snapshot':
+    # Milvus不可用时, 从快照加载只读的进程内索引用于知识检索
+    vector_store = InMemoryVectorIndex.load(settings.VECTOR_DB_CONFIG['snapshot_dir'])
+else:
+    vector_store = MilvusVectorStore(
+        host=settings.VECTOR_DB_CONFIG['host'],
+        port=settings.VECTOR_DB_CONFIG['port'],
+        collection_name=settings.VECTOR_DB_CONFIG['collection_name']
+    )
 
 embedder = BGEM3Embedder(
     model_name="BAAI/bge-m3"
 )
 
 knowledge_service = KnowledgeService(vector_store, embedder)
+# 已保存测试用例的向量索引, 不可用时为None
+test_case_index = get_test_case_index(embedder)
 # test_case_generator = TestCaseGeneratorAgent(llm_service, knowledge_service)
 #test_case_reviewer = TestCaseReviewerAgent(llm_service, knowledge_service)
 
@@ -129,6 +146,7 @@ def generate(request):
     case_design_methods = data.get('case_design_methods', [])  # 获取测试方法
     case_categories = data.get('case_categories', [])         # 获取测试类型
     case_count = int(data.get('case_count', 10))            # 获取生成用例条数
+    use_cache = _parse_bool(data.get('use_cache'))          # 是否使用LLM响应缓存
     
     logger.info(f"接收到的数据: {json.dumps(data, ensure_ascii=False)}")
     
@@ -138,7 +156,7 @@ def generate(request):
         llm_service = LLMServiceFactory.create(llm_provider, **PROVIDERS.get(llm_provider, {}))
         
         
-        generator_agent = TestCaseGeneratorAgent(llm_service=llm_service, knowledge_service=knowledge_service, case_design_methods=case_design_methods, case_categories=case_categories, case_count=case_count)
+        generator_agent = TestCaseGeneratorAgent(llm_service=llm_service, knowledge_service=knowledge_service, case_design_methods=case_design_methods, case_categories=case_categories, case_count=case_count, llm_provider=llm_provider, case_index=test_case_index)
         logger.info(f"开始生成测试用例 - 需求: {requirements}...")
         logger.info(f"选择的测试用例设计方法: {case_design_methods}")
         logger.info(f"选择的测试用例类型: {case_categories}")
@@ -147,7 +165,8 @@ def generate(request):
         # 生成测试用例
         #mock数据
         # test_cases = [{'description': '测试系统对用户输入为纯文本时的处理', 'test_steps': ['1. 打开应用程序', "2. 在输入框中输入纯文本，例如：'肥肥的'", '3. 提交输入'], 'expected_results': ['1. 应用程序成功启动', "2. 输入框正确显示输入的文本：'肥肥的'", '3. 系统正确识别并处理为纯文本输入，不进行代码段处理']}, {'description': '测试系统对用户输入为代码段时的处理', 'test_steps': ['1. 打开应用程序', '2. 在输入框中输入代码段，例如：\'print("Hello, World!")\'', '3. 提交输入'], 'expected_results': ['1. 应用程序成功启动', '2. 输入框正确显示输入的代码段：\'print("Hello, World!")\'', '3. 系统正确识别并处理为代码段输入，进行相应的代码处理']}, {'description': '测试系统对用户输入为空时的处理', 'test_steps': ['1. 打开应用程序', '2. 在输入框中不输入任何内容', '3. 提交输入'], 'expected_results': ['1. 应用程序成功启动', '2. 输入框保持为空', '3. 系统提示输入不能为空，要求重新输入']}, {'description': '测试系统对用户输入为混合内容（文本和代码）时的处理', 'test_steps': ['1. 打开应用程序', '2. 在输入框中输入混合内容，例如：\'肥肥的 print("Hello, World!")\'', '3. 提交输入'], 'expected_results': ['1. 应用程序成功启动', '2. 输入框正确显示输入的混合内容：\'肥肥的 print("Hello, World!")\'', '3. 系统正确识别并处理为混合内容，分别对文本和代码段进行相应处理']}, {'description': '测试系统对用户输入为特殊字符时的处理', 'test_steps': ['1. 打开应用程序', "2. 在输入框中输入特殊字符，例如：'@#$%^&*()'", '3. 提交输入'], 'expected_results': ['1. 应用程序成功启动', "2. 输入框正确显示输入的特殊字符：'@#$%^&*()'", '3. 系统正确识别并处理为特殊字符输入，不进行代码段处理']}]
-        test_cases = generator_agent.generate(requirements, input_type="requirement")
+        with bypass_llm_cache(not use_cache):
+            test_cases = generator_agent.generate(requirements, input_type="requirement")
         logger.info(f"测试用例生成成功 - 生成数量: {len(test_cases)}")
         
         context.update({
@@ -156,7 +175,9 @@ def generate(request):
         
         return JsonResponse({
             'success': True,
-            'test_cases': test_cases
+            'test_cases': test_cases,
+            'dedup': generator_agent.dedup_report.to_dict(),  # 语义去重合并的用例
+            'reference_case_ids': [case['id'] for case in generator_agent.reference_cases]  # 作为参考的相似历史用例
         })
             
     except Exception as e:
@@ -166,6 +187,75 @@ def generate(request):
             'message': str(e)
         }, status=500)
 
+def _parse_bool(value, default: bool = True) -> bool:
+    """解析请求中的布尔参数: JSON中的true/false, 以及表单或字符串形式的"true"/"false"/"1"/"0"等"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('false', '0', 'no', 'off'):
+            return False
+        if value in ('true', '1', 'yes', 'on'):
+            return True
+        return default
+    return bool(value)
+
+
+def _sse_event(event: str, data) -> str:
+    """格式化一条server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@require_http_methods(["POST"])
+def generate_stream(request):
+    """
+    API-流式生成测试用例(SSE), 每解析出一条合法用例立即推送给前端
+    事件: case(单条用例) / done(生成结束) / error(出错)
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': '无效的JSON数据'}, status=400)
+
+    requirements = data.get('requirements', '')
+    if not requirements:
+        return JsonResponse({'success': False, 'message': '需求描述不能为空'}, status=400)
+
+    llm_provider = data.get('llm_provider', DEFAULT_PROVIDER)
+    use_cache = _parse_bool(data.get('use_cache'))
+    generator_agent = TestCaseGeneratorAgent(
+        llm_service=LLMServiceFactory.create(llm_provider, **PROVIDERS.get(llm_provider, {})),
+        knowledge_service=knowledge_service,
+        case_design_methods=data.get('case_design_methods', []),
+        case_categories=data.get('case_categories', []),
+        case_count=int(data.get('case_count', 10)),
+        llm_provider=llm_provider,
+        case_index=test_case_index
+    )
+    logger.info(f"开始流式生成测试用例 - provider: {llm_provider}, 需求: {requirements}")
+
+    def event_stream():
+        count = 0
+        try:
+            # 生成器在响应输出时才执行, 跳过缓存的上下文需要放在生成器内部
+            with bypass_llm_cache(not use_cache):
+                for test_case in generator_agent.generate_stream(requirements, input_type="requirement"):
+                    count += 1
+                    yield _sse_event('case', {'index': count, 'test_case': test_case})
+            yield _sse_event('done', {
+                'count': count,
+                'dedup': generator_agent.dedup_report.to_dict(),
+                'reference_case_ids': [case['id'] for case in generator_agent.reference_cases]
+            })
+        except Exception as e:
+            logger.error(f"流式生成测试用例时出错: {str(e)}", exc_info=True)
+            yield _sse_event('error', {'message': str(e), 'count': count})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭nginx缓冲, 保证事件及时送达
+    return response
+
 def format_test_cases_to_html(test_cases):
     """将测试用例格式化为HTML"""
     html = ""
@@ -232,10 +322,17 @@ def save_test_case(request):
             )
             test_cases_to_create.append(test_case_instance)
         
-        # 批量创建测试用例
-        created_test_cases = TestCase.objects.bulk_create(test_cases_to_create)
+        # 批量创建测试用例; MySQL的bulk_create不回填主键, 此时在一个事务内逐条保存以获得id用于建索引
+        if connection.features.can_return_rows_from_bulk_insert:
+            created_test_cases = TestCase.objects.bulk_create(test_cases_to_create)
+        else:
+            with transaction.atomic():
+                for test_case_instance in test_cases_to_create:
+                    test_case_instance.save()
+            created_test_cases = test_cases_to_create
         
         logger.info(f"成功保存 {len(created_test_cases)} 条测试用例")
+        _index_test_cases(created_test_cases)
         
         return JsonResponse({
             'success': True,
@@ -256,6 +353,25 @@ def save_test_case(request):
             'message': f'保存失败：{str(e)}'
         }, status=500)
 
+def _index_test_cases(test_cases):
+    """增量更新测试用例索引, 索引失败只记录日志, 不影响用例的保存"""
+    if test_case_index is None:
+        return
+    try:
+        test_case_index.upsert(test_cases)
+    except Exception as e:
+        logger.error(f"更新测试用例索引失败: {str(e)}", exc_info=True)
+
+
+def _unindex_test_cases(test_case_ids):
+    if test_case_index is None:
+        return
+    try:
+        test_case_index.delete(test_case_ids)
+    except Exception as e:
+        logger.error(f"删除测试用例索引失败: {str(e)}", exc_info=True)
+
+
 # @login_required 先屏蔽登录
 def review_view(request):
     """页面-测试用例评审页面视图"""
@@ -334,18 +450,35 @@ def case_review(request):
                 'message': f'找不到ID为 {test_case_id} 的测试用例'
             }, status=404)
         
+        test_case_reviewer = TestCaseReviewerAgent(llm_service, knowledge_service, llm_provider=DEFAULT_PROVIDER)
+        use_cache = _parse_bool(data.get('use_cache'))
+        
+        # 用例内容和评审提示词都未变化时直接返回已保存的评审结果
+        if use_cache:
+            stored_review = test_case_reviewer.get_stored_reviews([test_case]).get(test_case.id)
+            if stored_review:
+                logger.info(f"测试用例 {test_case.id} 内容未变化, 返回已保存的评审结果")
+                return JsonResponse({
+                    'success': True,
+                    'review_result': stored_review.review_comments,
+                    'cached': True,
+                    'reviewed_at': stored_review.review_date.strftime('%Y-%m-%d %H:%M:%S')
+                })
+        
         # 调用测试用例评审Agent
         logger.info("开始调用评审Agent...")
-        test_case_reviewer = TestCaseReviewerAgent(llm_service, knowledge_service)
-        review_result = test_case_reviewer.review(test_case)
+        with bypass_llm_cache(not use_cache):
+            review_result = test_case_reviewer.review(test_case)
         logger.info(f"评审完成，结果: {review_result}")
         
         # 从AIMessage对象中提取内容
         review_content = review_result.content if hasattr(review_result, 'content') else str(review_result)
+        test_case_reviewer.store_review(test_case, parse_review_result(review_content), review_content)
         
         return JsonResponse({
             'success': True,
-            'review_result': review_content  # 只返回评审内容文本
+            'review_result': review_content,  # 只返回评审内容文本
+            'cached': False
         })
         
     except json.JSONDecodeError:
@@ -362,6 +495,92 @@ def case_review(request):
         }, status=500)
 
 
+# @login_required 先屏蔽登录
+@require_http_methods(["GET"])
+def auto_review_status(request):
+    """后台自动评审(python manage.py auto_review)的队列深度和吞吐量"""
+    try:
+        return JsonResponse({'success': True, **get_auto_review_status()})
+    except Exception as e:
+        logger.error(f"获取自动评审状态失败: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+
+
+def llm_concurrency_status(request):
+    """各提供商自适应并发的当前并发数和吞吐量(接口用例批量生成时使用)"""
+    return JsonResponse({'success': True, 'providers': get_adaptive_concurrency_stats()})
+
+
+# @login_required 先屏蔽登录
+@require_http_methods(["POST"])
+def case_review_batch(request):
+    """
+    API-批量AI评审(SSE), 按用例ID列表(ids)或状态(status, 配合limit)选择用例,
+    多条用例按token预算打包后并发评审, 每完成一个批次立即推送其中各用例的评审结果
+    事件: review(单条用例的评审结果) / done(全部完成) / error(出错)
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': '无效的JSON数据'}, status=400)
+
+    ids = data.get('ids') or []
+    if isinstance(ids, str):
+        ids = [i for i in ids.split(',') if i]
+    if ids:
+        test_cases = list(TestCase.objects.filter(id__in=ids).order_by('id'))
+    elif data.get('status'):
+        limit = int(data.get('limit', 100))
+        test_cases = list(TestCase.objects.filter(status=data['status']).order_by('-created_at')[:limit])
+    else:
+        return JsonResponse({'success': False, 'message': '请提供测试用例ID列表或状态'}, status=400)
+    if not test_cases:
+        return JsonResponse({'success': False, 'message': '没有找到需要评审的测试用例'}, status=404)
+
+    use_cache = _parse_bool(data.get('use_cache'))
+    test_case_reviewer = TestCaseReviewerAgent(llm_service, knowledge_service, llm_provider=DEFAULT_PROVIDER)
+    # 内容和评审提示词都未变化的用例直接返回已保存的评审结果, 只评审其余用例
+    stored_reviews = test_case_reviewer.get_stored_reviews(test_cases) if use_cache else {}
+    to_review = [test_case for test_case in test_cases if test_case.id not in stored_reviews]
+    logger.info(f"开始批量评审 {len(test_cases)} 条测试用例, 其中 {len(stored_reviews)} 条使用已保存的评审结果")
+
+    def event_stream():
+        start = time.perf_counter()
+        reviewed = failed = 0
+        try:
+            yield _sse_event('start', {'total': len(test_cases), 'cached': len(stored_reviews)})
+            for test_case_id, stored_review in stored_reviews.items():
+                reviewed += 1
+                yield _sse_event('review', {'test_case_id': test_case_id, 'success': True, 'cached': True,
+                                            'review_result': stored_review.review_result
+                                            or parse_review_result(stored_review.review_comments)})
+            with bypass_llm_cache(not use_cache):
+                for test_case, review_result, error in test_case_reviewer.review_many(to_review):
+                    if error:
+                        failed += 1
+                        yield _sse_event('review', {'test_case_id': test_case.id, 'success': False, 'message': error})
+                        continue
+                    reviewed += 1
+                    test_case_reviewer.store_review(test_case, review_result)
+                    yield _sse_event('review', {'test_case_id': test_case.id, 'success': True, 'cached': False,
+                                                'review_result': review_result})
+            yield _sse_event('done', {
+                'total': len(test_cases),
+                'reviewed': reviewed,
+                'cached': len(stored_reviews),
+                'failed': failed,
+                'elapsed_seconds': round(time.perf_counter() - start, 2)
+            })
+        except Exception as e:
+            logger.error(f"批量评审时出错: {str(e)}", exc_info=True)
+            yield _sse_event('error', {'message': str(e), 'reviewed': reviewed})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭nginx缓冲, 保证事件及时送达
+    return response
+
+
 # @login_required 先屏蔽登录
 def knowledge_view(request):
     """知识库管理页面"""
@@ -450,22 +669,60 @@ def search_knowledge(request):
             'message': str(e)
         })
 
+
+# @login_required 先屏蔽登录
+@require_http_methods(["POST"])
+def similar_test_cases(request):
+    """按需求描述检索最相似的已保存测试用例(默认只返回已评审通过的用例)"""
+    try:
+        data = json.loads(request.body)
+        query = data.get('requirement') or data.get('query')
+        if not query:
+            return JsonResponse({'success': False, 'message': '需求描述不能为空'}, status=400)
+        status = data.get('status', 'approved') or None
+        if status is not None and status not in dict(TestCase.STATUS_CHOICES):
+            return JsonResponse({'success': False, 'message': f'不支持的评审状态: {status}'}, status=400)
+        if test_case_index is None:
+            return JsonResponse({'success': False, 'message': '测试用例索引不可用'}, status=503)
+
+        start = time.perf_counter()
+        similar = test_case_index.similar_cases(
+            query,
+            top_k=int(data.get('top_k', 5)),
+            status=status,
+            min_score=float(data.get('min_score', 0.0)),
+        )
+        results = [{
+            'id': case.id,
+            'score': round(score, 4),
+            'status': case.status,
+            'description': case.description,
+            'test_steps': case.test_steps.split('\n') if case.test_steps else [],
+            'expected_results': case.expected_results.split('\n') if case.expected_results else [],
+            'requirements': case.requirements,
+        } for case, score in similar]
+        return JsonResponse({
+            'success': True,
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+    except Exception as e:
+        logger.error(f"检索相似测试用例失败: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+
+@streaming_upload('knowledge', 'uploads/')
 @csrf_exempt
 def upload_single_file(request):
     """处理文件上传的视图函数"""
     if request.method == 'GET':
         return render(request, 'upload.html')
     elif request.method == 'POST':
+        upload_error = get_upload_error(request)
+        if upload_error:
+            return JsonResponse({'success': False, 'error': upload_error})
         if 'single_file' in request.FILES:  # 修改这里匹配前端的 name 属性
             uploaded_file = request.FILES['single_file']  # 修改这里匹配前端的 name 属性
-            file_path = os.path.join(settings.MEDIA_ROOT, uploaded_file.name)
-            
-            # 先检查文件是否存在
-            if os.path.exists(file_path):
-                return JsonResponse({
-                    'success': False,
-                    'error': '文件已存在'
-                })
+            file_path = None
                 
             try:
                 # 1. 接收文件
@@ -473,25 +730,6 @@ def upload_single_file(request):
                 if not uploaded_file:
                     return JsonResponse({'success': False, 'error': '未接收到文件'})
                 
-                file_categories = {
-                    "CSV": [".csv"],
-                    "E-mail": [".eml", ".msg", ".p7s"],
-                    "EPUB": [".epub"],
-                    "Excel": [".xls", ".xlsx"],
-                    "HTML": [".html"],
-                    "Image": [".bmp", ".heic", ".jpeg", ".png", ".tiff"],
-                    "Markdown": [".md"],
-                    "Org Mode": [".org"],
-                    "Open Office": [".odt"],
-                    "PDF": [".pdf"],
-                    "Plain text": [".txt"],
-                    "PowerPoint": [".ppt", ".pptx"],
-                    "reStructured Text": [".rst"],
-                    "Rich Text": [".rtf"],
-                    "TSV": [".tsv"],
-                    "Word": [".doc", ".docx"],
-                    "XML": [".xml"]
-                }
                 file_type = os.path.splitext(uploaded_file.name)[1]
                 logger.info(f"上传文件类型: {file_type}")
                 logger.info(f"上传文件名: {uploaded_file.name}")
@@ -500,78 +738,41 @@ def upload_single_file(request):
                     logger.error("文件没有扩展名")
                     return JsonResponse({'success': False, 'error': '文件必须包含扩展名'})
                 
-                # 获取所有支持的文件扩展名
-                supported_extensions = [ext.lower() for exts in file_categories.values() for ext in exts]
-
-                if file_type not in supported_extensions:
+                if file_type.lower() not in SUPPORTED_EXTENSIONS:
                     return JsonResponse({'success': False, 'error': '不支持的文件类型'})
                 
-                # 2. 保存临时文件
-                save_dir = 'uploads/'
-                os.makedirs(save_dir, exist_ok=True)
-                file_path = os.path.join(save_dir, f"{uploaded_file.name}")
-                with open(file_path, 'wb+') as f:
-                    for chunk in uploaded_file.chunks():
-                        f.write(chunk)
+                # 2. 流式保存文件, 同时计算内容hash; 内容完全相同的文件视为已存在
+                try:
+                    stored = save_upload(uploaded_file, 'uploads/', max_size=get_upload_limit('knowledge'))
+                except UploadTooLargeError as e:
+                    return JsonResponse({'success': False, 'error': str(e)})
+                if stored.duplicate:
+                    return JsonResponse({
+                        'success': False,
+                        'error': '文件已存在'
+                    })
+                file_path = stored.path
                 logger.info(f"临时文件保存成功, 文件保存路径: {file_path}")
 
                 # 3. 处理文件
-                chunks = process_singel_file(file_path)  # 获取原始数据和文本
-                if not chunks:
+                text_contents = parse_file_to_texts(file_path)  # 获取chunking后的文本
+                if not text_contents:
                     return JsonResponse({'success': False, 'error': '文件中无有效内容'})
-
-                # 提取所有chunk.text并记录日志
-                if isinstance(chunks, list):
-                    # 直接从chunks中提取text属性
-                    text_contents = []
-                    for i, chunk in enumerate(chunks):
-                        if hasattr(chunk, 'text'):
-                            text_contents.append(str(chunk.text))
-                        else:
-                            text_contents.append(str(chunk))
-                
-                    logger.info(f"共提取了 {len(text_contents)} 个文本内容")
-                else:
-                    # 单一文本块的情况
-                    if hasattr(chunks, 'text'):
-                        text_contents = [str(chunks.text)]
-                    else:
-                        text_contents = [str(chunks)]
-                    logger.info(f"提取了单个文本内容: {text_contents[0][:100]}...")
+                logger.info(f"共提取了 {len(text_contents)} 个文本内容")
 
                 # 直接生成所有文本内容的向量
                 logger.info("开始生成向量")
                 start_time = datetime.now()
 
                 try:
-                    # 直接为所有文本内容生成向量
-                    all_embeddings = embedder.get_embeddings(texts=text_contents, show_progress_bar=False)
-                    logger.info(f"成功生成 {len(all_embeddings)} 个向量")
-                    
-                    # 确保embeddings是列表格式
-                    embeddings_list = []
-                    for emb in all_embeddings:
-                        if hasattr(emb, 'tolist'):
-                            emb = emb.tolist()
-                        embeddings_list.append(emb)
-                    
-                    # 准备插入数据
-                    data_to_insert = []
-                    for i in range(len(text_contents)):
-                        item = {
-                            "embedding": embeddings_list[i],  # 单个embedding向量
-                            "content": text_contents[i],      # 文本内容
-                            "metadata": '{}',                 # 元数据
-                            "source": file_path,              # 来源
-                            "doc_type": file_type,            # 文档类型
-                            "chunk_id": f"{hashlib.md5(os.path.basename(file_path).encode()).hexdigest()[:10]}_{i:04d}",  # 块ID
-                            "upload_time": datetime.now().isoformat()  # 上传时间
-                        }
-                        data_to_insert.append(item)
-                    
-                    # 插入数据到Milvus
-                    logger.info(f"开始往milvus中插入 {len(data_to_insert)} 条数据")
-                    vector_store.add_data(data_to_insert)
+                    # 生成向量并插入数据到Milvus
+                    logger.info(f"开始往milvus中插入 {len(text_contents)} 条数据")
+                    embed_and_insert(
+                        text_contents, embedder, vector_store,
+                        source=file_path,
+                        doc_type=file_type,
+                        chunk_prefix=stored.sha256[:10],
+                    )
                     logger.info("数据插入完成")
                     
                     total_time = (datetime.now() - start_time).total_seconds()
@@ -598,7 +799,7 @@ def upload_single_file(request):
                 })
             finally:
                 # 清理临时文件
-                if os.path.exists(file_path):
+                if file_path and os.path.exists(file_path):
                     pass
                     # os.remove(file_path)
         else:
@@ -661,6 +862,9 @@ def update_test_case(request):
         test_case.test_steps = data['test_steps']
         test_case.expected_results = data['expected_results']
         test_case.save()
+        # 用例内容变化后, 之前的AI评审结果不再适用
+        invalidate_stored_reviews(test_case)
+        _index_test_cases([test_case])
         return JsonResponse({'success': True})
     except TestCase.DoesNotExist:
         return JsonResponse({'success': False, 'message': '测试用例不存在'})
@@ -766,6 +970,7 @@ def delete_test_cases(request):
             
         test_case_ids = ids.split(',')
         TestCase.objects.filter(id__in=test_case_ids).delete()
+        _unindex_test_cases(test_case_ids)
         
         return JsonResponse({
             'success': True,
@@ -778,20 +983,17 @@ def delete_test_cases(request):
             'message': f'删除失败: {str(e)}'
         }) 
     
+@streaming_upload('prd', 'prd/')
 def prd_analyser(request):
     """从PRD文件中提取测试点&测试场景"""
     if request.method == 'GET':
         return render(request, 'analyser.html')
     elif request.method == 'POST':
+        upload_error = get_upload_error(request)
+        if upload_error:
+            return JsonResponse({'success': False, 'error': upload_error})
         if 'single_file' in request.FILES:  # 修改这里匹配前端的 name 属性
             uploaded_file = request.FILES['single_file']  # 修改这里匹配前端的 name 属性
-            file_path = os.path.join(settings.MEDIA_ROOT, uploaded_file.name)
-            # 先检查文件是否存在
-            if os.path.exists(file_path):
-                return JsonResponse({
-                    'success': False,
-                    'error': '文件已存在'
-                })
             logger.info(f"Uploaded file: {uploaded_file}")
             if not uploaded_file:
                 return JsonResponse({'success': False, 'error': '未接收到文件'})
@@ -801,23 +1003,29 @@ def prd_analyser(request):
                 return JsonResponse({'success': False, 'error': '不支持的文件类型'})
             logger.info(f"上传文件类型: {file_type}")
             logger.info(f"上传文件名: {uploaded_file.name}")
-             # 2. 保存临时文件
-            save_dir = 'prd/'
-            os.makedirs(save_dir, exist_ok=True)
-            file_path = os.path.join(save_dir, f"{uploaded_file.name}")
-            with open(file_path, 'wb+') as f:
-                for chunk in uploaded_file.chunks():
-                    f.write(chunk)
+            # 2. 流式保存文件, 内容相同的PRD直接复用已保存的文件
+            try:
+                stored = save_upload(uploaded_file, 'prd/', max_size=get_upload_limit('prd'))
+            except UploadTooLargeError as e:
+                return JsonResponse({'success': False, 'error': str(e)})
+            file_path = stored.path
             logger.info(f"临时文件保存成功, 文件保存路径: {file_path}")
-            #3. 处理文件
-            word_to_markdown(file_path, file_path.replace('.docx', '.md'))
-            #读取出转化后md文件的内容
-            with open(file_path.replace('.docx', '.md'), 'r', encoding='utf-8') as f:
-                prd_content = f.read()
+            #3. 处理文件: 进程内转换为Markdown, 结果按文件内容hash缓存
+            try:
+                prd_content = docx_to_markdown(file_path, stored.sha256)
+            except Exception as e:
+                logger.error(f"Word文档转换失败: {str(e)}", exc_info=True)
+                return JsonResponse({'success': False, 'error': f'文档转换失败: {str(e)}'})
             logger.info(f"PRD内容: {prd_content}")
             #调用PRD分析器
-            analyser = PrdAnalyserAgent(llm_service=llm_service)
-            result = analyser.analyse(prd_content)
+            analyser = PrdAnalyserAgent(llm_service=llm_service, llm_provider=DEFAULT_PROVIDER)
+            # 页面填写了文档标识时, 同一标识视为同一文档的不同版本, 只重新分析变更的章节;
+            # 不按文件名识别(不同PRD常用相同的文件名), 登录用户的标识互相隔离
+            document_key = request.POST.get('document_key', '').strip() or None
+            if document_key and request.user.is_authenticated:
+                document_key = f"{request.user.pk}/{document_key}"
+            with bypass_llm_cache(not _parse_bool(request.POST.get('use_cache'))):
+                result = analyser.analyse(prd_content, document_key=document_key)
             return JsonResponse({
                 'success': True,
                 'result': result
@@ -849,14 +1057,11 @@ def download_file(request):
     if not file_abs_path.startswith(uploads_dir):
         return JsonResponse({'error': '访问被拒绝'}, status=404)
     
-    # 返回文件
-    with open(file_path, 'rb') as f:
-        response = HttpResponse(f.read())
-        response['Content-Type'] = 'application/json'
-        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-        return response
+    # 流式返回文件, 支持ETag和Range
+    return build_file_response(request, file_path)
 
 
+@streaming_upload('api_definition', settings.MEDIA_ROOT)
 def api_case_generate(request):
     """
     页面-接口case生成页面视图函数
@@ -871,6 +1076,9 @@ def api_case_generate(request):
         }
         return render(request, 'api_case_generate.html', context)
     elif request.method == 'POST':
+        upload_error = get_upload_error(request)
+        if upload_error:
+            return JsonResponse({'success': False, 'error': upload_error})
         if 'single_file' in request.FILES:
             uploaded_file = request.FILES['single_file']
             logger.info(f"接收到文件: {uploaded_file.name}")
@@ -883,23 +1091,12 @@ def api_case_generate(request):
                 })
             
             try:
-                # 确保uploads目录存在
-                uploads_dir = os.path.join(settings.MEDIA_ROOT)
-                os.makedirs(uploads_dir, exist_ok=True)
-                
-                # 生成唯一文件名（避免重名）
-                file_name = uploaded_file.name
-                base_name, ext = os.path.splitext(file_name)
-                counter = 1
-                while os.path.exists(os.path.join(uploads_dir, file_name)):
-                    file_name = f"{base_name}_{counter}{ext}"
-                    counter += 1
-                
-                # 保存文件到uploads目录
-                file_path = os.path.join(uploads_dir, file_name)
-                with open(file_path, 'wb+') as f:
-                    for chunk in uploaded_file.chunks():
-                        f.write(chunk)
+                # 保存文件到uploads目录（自动避免重名）
+                # 生成用例时会回写该文件, 因此不按内容去重, 每次上传都是独立的工作副本
+                file_path = save_upload(
+                    uploaded_file, settings.MEDIA_ROOT,
+                    max_size=get_upload_limit('api_definition'), dedupe=False
+                ).path
                 
                 logger.info(f"文件保存成功: {file_path}")
                 
@@ -926,10 +1123,12 @@ def api_case_generate(request):
             count_per_api = int(request.POST.get('count_per_api', 1))
             priority = request.POST.get('priority', 'P0')
             llm_provider = request.POST.get('llm_provider', 'deepseek')
+            use_cache = _parse_bool(request.POST.get('use_cache'))
+            resume = _parse_bool(request.POST.get('resume'))   # 跳过上次中断前已生成完成的接口
             
             # 生成测试用例
             result = generate_test_cases_for_apis(
-                file_path, selected_apis, count_per_api, priority, llm_provider
+                file_path, selected_apis, count_per_api, priority, llm_provider, use_cache=use_cache, resume=resume
             )
             
             # 在返回结果中添加 file_path 字段，以便前端下载
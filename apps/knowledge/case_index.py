@@ -0,0 +1,161 @@
+"""
+已保存测试用例的向量索引
+
+每条TestCase的"描述 + 测试步骤"向量化后写入单独的Milvus集合, 以test_case_id为主键,
+保存/更新/删除用例时增量维护。按需求描述检索最相似的已评审通过用例, 供生成用例时作为参考(few-shot)。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+
+from ..core.models import TestCase
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_TEST_CASE_INDEX_CONFIG = {
+    'enabled': True,
+    'collection_name': 'test_case_collection',
+    'few_shot_count': 3,          # 生成用例时作为参考的已通过用例条数, 0表示不使用
+    'few_shot_min_score': 0.6,    # 参考用例与需求的最低相似度
+}
+
+# description字段的长度限制(字节), 超出部分截断, 仅用于展示
+_DESCRIPTION_MAX_BYTES = 2048
+
+
+def get_test_case_index_config() -> Dict[str, Any]:
+    return {**DEFAULT_TEST_CASE_INDEX_CONFIG, **getattr(settings, 'TEST_CASE_INDEX_CONFIG', {})}
+
+
+def test_case_text(test_case) -> str:
+    """用于向量化的用例文本: 描述 + 测试步骤"""
+    return f"{test_case.description}\n{test_case.test_steps}"
+
+
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    return text.encode('utf-8')[:max_bytes].decode('utf-8', errors='ignore')
+
+
+class TestCaseVectorIndex:
+    """测试用例向量索引(Milvus), 集合常驻内存以保证检索延迟"""
+
+    def __init__(self, embedder, host: str = "localhost", port: str = "19530",
+                 collection_name: Optional[str] = None, dim: int = 1024):
+        self.embedder = embedder
+        self.collection_name = collection_name or get_test_case_index_config()['collection_name']
+        self.dim = dim
+        connections.connect(alias="default", host=host, port=port)
+        self.collection = self._ensure_collection()
+        self.collection.load()
+
+    def _ensure_collection(self) -> Collection:
+        if utility.has_collection(self.collection_name):
+            return Collection(self.collection_name)
+        logger.info(f"创建测试用例索引集合: {self.collection_name}")
+        fields = [
+            FieldSchema(name="test_case_id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
+            FieldSchema(name="status", dtype=DataType.VARCHAR, max_length=20),
+            FieldSchema(name="description", dtype=DataType.VARCHAR, max_length=_DESCRIPTION_MAX_BYTES),
+        ]
+        collection = Collection(
+            name=self.collection_name,
+            schema=CollectionSchema(fields=fields, description="测试用例索引")
+        )
+        collection.create_index(
+            field_name="embedding",
+            index_params={"metric_type": "COSINE", "index_type": "HNSW", "params": {"M": 8, "efConstruction": 64}}
+        )
+        return collection
+
+    def upsert(self, test_cases: Iterable, flush: bool = True) -> int:
+        """新增或更新用例的索引(一次批量向量化), 返回写入条数"""
+        test_cases = [tc for tc in test_cases if tc.pk is not None]
+        if not test_cases:
+            return 0
+        embeddings = self.embedder.get_embeddings([test_case_text(tc) for tc in test_cases])
+        self.collection.upsert([{
+            "test_case_id": tc.pk,
+            "embedding": emb,
+            "status": tc.status or '',
+            "description": _truncate_utf8(tc.description or '', _DESCRIPTION_MAX_BYTES),
+        } for tc, emb in zip(test_cases, embeddings)])
+        if flush:
+            self.collection.flush()
+        return len(test_cases)
+
+    def delete(self, test_case_ids: Iterable[int]) -> None:
+        ids = [int(pk) for pk in test_case_ids]
+        if ids:
+            self.collection.delete(expr=f"test_case_id in {ids}")
+
+    def search(self, query: str, top_k: int = 5, status: Optional[str] = 'approved',
+               min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """检索与query最相似的用例, 返回[{test_case_id, score, status, description}]"""
+        # status会拼接到Milvus过滤表达式中, 只允许合法的评审状态
+        if status and status not in dict(TestCase.STATUS_CHOICES):
+            raise ValueError(f"不支持的评审状态: {status}")
+        query_vector = self.embedder.get_embeddings(query)[0]
+        results = self.collection.search(
+            data=[query_vector],
+            anns_field="embedding",
+            param={"metric_type": "COSINE", "params": {"ef": max(32, top_k * 2)}},
+            limit=top_k,
+            expr=f'status == "{status}"' if status else None,
+            output_fields=["status", "description"],
+        )
+        hits = []
+        for hit in results[0]:
+            if hit.score < min_score:
+                continue
+            hits.append({
+                "test_case_id": hit.id,
+                "score": hit.score,
+                "status": hit.entity.get("status"),
+                "description": hit.entity.get("description"),
+            })
+        return hits
+
+    def similar_cases(self, query: str, top_k: int = 5, status: Optional[str] = 'approved',
+                      min_score: float = 0.0) -> List[Tuple[TestCase, float]]:
+        """检索相似用例并从数据库取回完整用例, 返回按相似度降序的[(TestCase, score)]"""
+        hits = self.search(query, top_k=top_k, status=status, min_score=min_score)
+        cases = TestCase.objects.in_bulk([hit['test_case_id'] for hit in hits])
+        # 索引可能短暂落后于数据库(如删除后索引更新失败), 跳过已不存在的用例
+        return [(cases[hit['test_case_id']], hit['score']) for hit in hits if hit['test_case_id'] in cases]
+
+    def rebuild(self, queryset, batch_size: int = 256) -> int:
+        """清空并按批重建索引, 返回写入条数"""
+        self.collection.release()
+        self.collection.drop()
+        self.collection = self._ensure_collection()
+        total = 0
+        batch = []
+        for test_case in queryset.iterator(chunk_size=batch_size):
+            batch.append(test_case)
+            if len(batch) >= batch_size:
+                total += self.upsert(batch, flush=False)
+                batch = []
+                logger.info(f"测试用例索引重建进度: {total}")
+        total += self.upsert(batch, flush=False)
+        self.collection.flush()
+        self.collection.load()
+        return total
+
+
+def get_test_case_index(embedder) -> Optional[TestCaseVectorIndex]:
+    """按配置创建测试用例索引, 未启用或Milvus不可用时返回None(不影响用例的保存和生成)"""
+    if not get_test_case_index_config()['enabled'] or settings.VECTOR_DB_CONFIG.get('backend') == 'snapshot':
+        return None
+    try:
+        return TestCaseVectorIndex(
+            embedder,
+            host=settings.VECTOR_DB_CONFIG['host'],
+            port=settings.VECTOR_DB_CONFIG['port'],
+        )
+    except Exception as e:
+        logger.error(f"测试用例索引初始化失败, 相似用例检索不可用: {str(e)}", exc_info=True)
+        return None
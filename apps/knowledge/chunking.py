@@ -0,0 +1,161 @@
+"""
+基于嵌入模型tokenizer的chunking
+
+unstructured按字符数切分出的chunk在token维度上长短不一, 向量化时batch内padding浪费严重,
+过长的内容还可能超过Milvus中content字段的长度限制导致插入失败。
+这里用BGE-M3的tokenizer度量长度, 把文档重新切分为固定token窗口(带重叠), 并保证不超过字段长度限制。
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# 文档中相邻元素之间的分隔符
+ELEMENT_SEPARATOR = "\n\n"
+# 句末标点, 优先在这些位置断开
+SENTENCE_ENDINGS = ('。', '！', '？', '；', '.', '!', '?', ';')
+
+DEFAULT_CHUNKING_CONFIG = {
+    'tokenizer': 'BAAI/bge-m3',
+    'max_tokens': 512,
+    'overlap_tokens': 64,
+    'max_content_bytes': 4096,  # 与Milvus集合中content字段的max_length保持一致
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_chunking_config() -> Dict:
+    return {**DEFAULT_CHUNKING_CONFIG, **getattr(settings, 'CHUNKING_CONFIG', {})}
+
+
+def get_tokenizer():
+    """获取嵌入模型的tokenizer（单例模式）"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(get_chunking_config()['tokenizer'])
+    return _tokenizer
+
+
+@dataclass
+class TokenChunk:
+    """切分后的文本块"""
+    text: str
+    n_tokens: int
+
+
+@dataclass
+class ChunkedDocument:
+    """单个文档的chunking结果"""
+    chunks: List[TokenChunk] = field(default_factory=list)
+
+    @property
+    def texts(self) -> List[str]:
+        return [chunk.text for chunk in self.chunks]
+
+    @property
+    def token_counts(self) -> List[int]:
+        return [chunk.n_tokens for chunk in self.chunks]
+
+    def stats(self) -> Dict[str, float]:
+        return chunk_size_stats(self.token_counts)
+
+
+def chunk_size_stats(token_counts: List[int]) -> Dict[str, float]:
+    """统计chunk的token数分布"""
+    if not token_counts:
+        return {'count': 0, 'min': 0, 'p50': 0, 'p95': 0, 'max': 0, 'mean': 0.0}
+    ordered = sorted(token_counts)
+    n = len(ordered)
+    return {
+        'count': n,
+        'min': ordered[0],
+        'p50': ordered[(n - 1) // 2],
+        'p95': ordered[min(n - 1, int(n * 0.95))],
+        'max': ordered[-1],
+        'mean': round(sum(ordered) / n, 1),
+    }
+
+
+class TokenChunker:
+    """按token窗口切分文本, 窗口之间保留重叠, 并尽量在段落/句子边界断开"""
+
+    def __init__(self, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+                 max_bytes: Optional[int] = None, tokenizer=None):
+        config = get_chunking_config()
+        self.max_tokens = max_tokens or config['max_tokens']
+        self.overlap_tokens = config['overlap_tokens'] if overlap_tokens is None else overlap_tokens
+        self.max_bytes = max_bytes or config['max_content_bytes']
+        if self.overlap_tokens >= self.max_tokens:
+            raise ValueError("overlap_tokens必须小于max_tokens")
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def chunk(self, texts: List[str]) -> ChunkedDocument:
+        """将一个文档的元素文本列表切分为token窗口"""
+        doc = ELEMENT_SEPARATOR.join(t.strip() for t in texts if t and t.strip())
+        if not doc:
+            return ChunkedDocument()
+
+        encoding = self.tokenizer(
+            doc, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        offsets = encoding['offset_mapping']
+        n = len(offsets)
+        if n == 0:
+            return ChunkedDocument()
+
+        chunks = []
+        start = 0
+        while start < n:
+            end = self._fit_bytes(doc, offsets, start, min(start + self.max_tokens, n))
+            if end < n:
+                end = self._snap_to_boundary(doc, offsets, start, end)
+            text = doc[offsets[start][0]:offsets[end - 1][1]].strip()
+            if text:
+                chunks.append(TokenChunk(text=text, n_tokens=end - start))
+            if end >= n:
+                break
+            start = max(end - self.overlap_tokens, start + 1)
+        return ChunkedDocument(chunks=chunks)
+
+    def _snap_to_boundary(self, doc: str, offsets, start: int, end: int) -> int:
+        """在窗口后部寻找段落或句子边界作为切分点, 找不到时按窗口硬切"""
+        lower = start + int((end - start) * 0.6)
+        # 先找段落边界(两个token之间有换行), 再找句末标点
+        for i in range(end, lower, -1):
+            if '\n' in doc[offsets[i - 1][1]:offsets[i][0]]:
+                return i
+        for i in range(end, lower, -1):
+            if doc[offsets[i - 1][0]:offsets[i - 1][1]].endswith(SENTENCE_ENDINGS):
+                return i
+        return end
+
+    def _fit_bytes(self, doc: str, offsets, start: int, end: int) -> int:
+        """缩小窗口直到文本的UTF-8字节数不超过字段长度限制"""
+        while end - start > 1:
+            size = len(doc[offsets[start][0]:offsets[end - 1][1]].encode('utf-8'))
+            if size <= self.max_bytes:
+                break
+            end = start + max(1, min(end - start - 1, (end - start) * self.max_bytes // size))
+        return end
+
+
+_chunker = None
+
+
+def get_token_chunker() -> TokenChunker:
+    """获取按配置初始化的TokenChunker（单例模式）"""
+    global _chunker
+    if _chunker is None:
+        _chunker = TokenChunker()
+    return _chunker
@@ -0,0 +1,176 @@
+"""
+知识库文件入库流水线: 文件解析/chunking -> 向量生成 -> 写入Milvus
+
+单文件上传(upload_single_file)和批量入库命令(ingest_knowledge)共用这里的逻辑
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from apps.core.milvus_helper import process_singel_file
+from apps.knowledge.chunking import ChunkedDocument, get_token_chunker
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# unstructured支持解析的文件类型
+SUPPORTED_FILE_CATEGORIES = {
+    "CSV": [".csv"],
+    "E-mail": [".eml", ".msg", ".p7s"],
+    "EPUB": [".epub"],
+    "Excel": [".xls", ".xlsx"],
+    "HTML": [".html"],
+    "Image": [".bmp", ".heic", ".jpeg", ".png", ".tiff"],
+    "Markdown": [".md"],
+    "Org Mode": [".org"],
+    "Open Office": [".odt"],
+    "PDF": [".pdf"],
+    "Plain text": [".txt"],
+    "PowerPoint": [".ppt", ".pptx"],
+    "reStructured Text": [".rst"],
+    "Rich Text": [".rtf"],
+    "TSV": [".tsv"],
+    "Word": [".doc", ".docx"],
+    "XML": [".xml"]
+}
+
+SUPPORTED_EXTENSIONS = {ext.lower() for exts in SUPPORTED_FILE_CATEGORIES.values() for ext in exts}
+
+
+def is_supported_file(file_path: str) -> bool:
+    """判断文件扩展名是否可被解析"""
+    return os.path.splitext(file_path)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def compute_file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """分块计算文件内容的sha256, 避免大文件整体读入内存"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def extract_text_contents(chunks) -> List[str]:
+    """从unstructured的chunking结果中提取文本内容"""
+    if not chunks:
+        return []
+    if not isinstance(chunks, list):
+        chunks = [chunks]
+    text_contents = []
+    for chunk in chunks:
+        text = str(chunk.text) if hasattr(chunk, 'text') else str(chunk)
+        if text.strip():
+            text_contents.append(text)
+    return text_contents
+
+
+def parse_file_to_chunks(file_path: str) -> ChunkedDocument:
+    """解析单个文件, 按嵌入模型的token窗口重新切分"""
+    chunks = process_singel_file(file_path)
+    document = get_token_chunker().chunk(extract_text_contents(chunks))
+    logger.info(f"文件chunking完成: {file_path}, token分布: {document.stats()}")
+    return document
+
+
+def parse_file_to_texts(file_path: str) -> List[str]:
+    """解析单个文件, 返回chunking后的文本列表"""
+    return parse_file_to_chunks(file_path).texts
+
+
+def build_chunk_records(text_contents: List[str], embeddings: List[List[float]],
+                        source: str, doc_type: str, chunk_prefix: str) -> List[Dict[str, Any]]:
+    """组装写入Milvus的数据行"""
+    upload_time = datetime.now().isoformat()
+    records = []
+    for i, (text, emb) in enumerate(zip(text_contents, embeddings)):
+        if hasattr(emb, 'tolist'):
+            emb = emb.tolist()
+        records.append({
+            "embedding": emb,                       # 单个embedding向量
+            "content": text,                        # 文本内容
+            "metadata": '{}',                       # 元数据
+            "source": source,                       # 来源
+            "doc_type": doc_type,                   # 文档类型
+            "chunk_id": f"{chunk_prefix}_{i:04d}",  # 块ID
+            "upload_time": upload_time              # 上传时间
+        })
+    return records
+
+
+def embed_and_insert(text_contents: List[str], embedder, vector_store, source: str,
+                     doc_type: str, chunk_prefix: str, flush: bool = True) -> int:
+    """为文本列表生成向量并写入Milvus, 返回写入条数"""
+    if not text_contents:
+        return 0
+    embeddings = embedder.get_embeddings(texts=text_contents, show_progress_bar=False)
+    records = build_chunk_records(text_contents, embeddings, source, doc_type, chunk_prefix)
+    vector_store.add_data(records, flush=flush)
+    return len(records)
+
+
+def ingest_file(file_path: str, embedder, vector_store, source: Optional[str] = None,
+                content_hash: Optional[str] = None) -> int:
+    """单个文件完整入库, 返回写入的chunk数量"""
+    text_contents = parse_file_to_texts(file_path)
+    if not text_contents:
+        return 0
+    content_hash = content_hash or compute_file_hash(file_path)
+    return embed_and_insert(
+        text_contents, embedder, vector_store,
+        source=source or file_path,
+        doc_type=os.path.splitext(file_path)[1],
+        chunk_prefix=content_hash[:10],
+    )
+
+
+class IngestLedger:
+    """入库台账(append-only jsonl), 记录已入库文件的内容hash
+
+    既用于按内容去重, 也作为断点: 中断后重新执行会跳过台账中已有的文件
+    """
+
+    def __init__(self, ledger_path: str):
+        self.ledger_path = ledger_path
+        self._lock = threading.Lock()
+        self._hashes: Set[str] = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.ledger_path):
+            return
+        with open(self.ledger_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._hashes.add(json.loads(line)['hash'])
+                except (ValueError, KeyError):
+                    # 中断时可能写了半行, 忽略即可
+                    continue
+        logger.info(f"加载入库台账: {self.ledger_path}, 已入库文件 {len(self._hashes)} 个")
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def record(self, entries: Iterable[Dict[str, Any]]):
+        """追加已完成(已flush)的文件记录"""
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.ledger_path)), exist_ok=True)
+            with open(self.ledger_path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._hashes.update(entry['hash'] for entry in entries)
@@ -0,0 +1,102 @@
+"""
+对比不同向量精度下的内存占用、召回率和检索延迟
+
+在NumPy中模拟"降精度粗排 + 原始向量精确重排"的流程, 不依赖Milvus, 可用于选择vector_precision和rerank_factor
+
+用法:
+    python manage.py benchmark_vector_precision --snapshot /backup/knowledge_snapshot
+    python manage.py benchmark_vector_precision --synthetic 100000 --queries 200
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.knowledge.quantization import VECTOR_PRECISIONS, bytes_per_vector, normalize_rows
+
+
+def _encode_corpus(corpus: np.ndarray, precision: str) -> np.ndarray:
+    """模拟入库时的降精度(相当于建索引, 不计入检索耗时)"""
+    if precision == 'float16':
+        # NumPy的float16矩阵乘没有BLAS加速, 舍入到float16后仍按float32计算, 只模拟精度损失
+        return corpus.astype(np.float16).astype(np.float32)
+    if precision == 'binary':
+        return np.where(corpus > 0, 1.0, -1.0).astype(np.float32)
+    return corpus
+
+
+def _coarse_scores(encoded: np.ndarray, queries: np.ndarray, precision: str) -> np.ndarray:
+    """按指定精度计算查询与全部向量的粗排分数(越大越相似)"""
+    if precision == 'float16':
+        queries = queries.astype(np.float16).astype(np.float32)
+    elif precision == 'binary':
+        # 取值±1时点积 = dim - 2 * 汉明距离, 与按汉明距离排序等价
+        queries = np.where(queries > 0, 1.0, -1.0).astype(np.float32)
+    return queries @ encoded.T
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+class Command(BaseCommand):
+    help = "对比float32/float16/binary向量精度的内存占用、recall@k和检索延迟"
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--snapshot', help='知识库快照目录, 使用其中的真实向量')
+        source.add_argument('--synthetic', type=int, help='按主题簇生成指定数量的合成向量')
+        parser.add_argument('--dim', type=int, default=1024, help='合成向量的维度')
+        parser.add_argument('--queries', type=int, default=100, help='查询数量(从向量集中抽样并加噪声)')
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--rerank-factors', default='1,2,4,8,16', help='粗排候选倍数, 逗号分隔')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        if options['snapshot']:
+            from apps.knowledge.snapshot import KnowledgeSnapshot
+            corpus = np.array(KnowledgeSnapshot(options['snapshot']).vectors, dtype=np.float32)
+        else:
+            # 合成数据按主题簇生成, 近邻关系更接近真实文档向量
+            n_clusters = max(1, options['synthetic'] // 100)
+            centers = normalize_rows(rng.standard_normal((n_clusters, options['dim']), dtype=np.float32))
+            labels = rng.integers(0, n_clusters, size=options['synthetic'])
+            corpus = centers[labels] + rng.standard_normal(
+                (options['synthetic'], options['dim']), dtype=np.float32) * (1.0 / np.sqrt(options['dim']))
+        if not len(corpus):
+            raise CommandError("向量集为空")
+        corpus = normalize_rows(corpus)
+        n, dim = corpus.shape
+        top_k = options['top_k']
+        factors = [int(f) for f in options['rerank_factors'].split(',') if f.strip()]
+
+        # 查询取自向量集本身并加入噪声, 模拟"与某条文档相近"的真实查询
+        sample = rng.choice(n, size=min(options['queries'], n), replace=False)
+        queries = normalize_rows(corpus[sample] + rng.standard_normal((len(sample), dim), dtype=np.float32) * 0.03)
+        exact = _top_k(queries @ corpus.T, top_k)
+
+        self.stdout.write(f"向量数: {n}, 维度: {dim}, 查询数: {len(queries)}, top_k: {top_k}")
+        self.stdout.write(f"{'precision':<10}{'factor':>8}{'bytes/vec':>12}{'total MB':>12}"
+                          f"{'recall@k':>12}{'ms/query':>12}")
+        for precision in VECTOR_PRECISIONS:
+            encoded = _encode_corpus(corpus, precision)
+            for factor in (factors if precision != 'float32' else [1]):
+                start = time.perf_counter()
+                candidates = _top_k(_coarse_scores(encoded, queries, precision), top_k * factor)
+                if precision != 'float32':
+                    # 用原始向量对候选精确重排
+                    rerank_scores = np.einsum('qd,qkd->qk', queries, corpus[candidates])
+                    order = np.argsort(-rerank_scores, axis=1)[:, :top_k]
+                    candidates = np.take_along_axis(candidates, order, axis=1)
+                elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+                hits = sum(len(set(found) & set(truth)) for found, truth in zip(candidates[:, :top_k], exact))
+                recall = hits / exact.size
+                size = bytes_per_vector(precision, dim)
+                self.stdout.write(f"{precision:<10}{factor:>8}{size:>12}{size * n / 1024 ** 2:>12.1f}"
+                                  f"{recall:>12.3f}{elapsed_ms:>12.2f}")
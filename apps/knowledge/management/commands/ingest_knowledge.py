@@ -0,0 +1,213 @@
+"""
+批量导入知识库: 支持目录树或zip/tar压缩包
+
+用法:
+    python manage.py ingest_knowledge /path/to/wiki_export
+    python manage.py ingest_knowledge wiki_export.zip --workers 8 --flush-every 100
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.knowledge.chunking import chunk_size_stats
+from apps.knowledge.embedding import BGEM3Embedder
+from apps.knowledge.ingestion import (
+    IngestLedger, compute_file_hash, embed_and_insert, is_supported_file, parse_file_to_chunks
+)
+from apps.knowledge.vector_store import MilvusVectorStore
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+
+def _safe_extract(archive_path: str, target_dir: str):
+    """解压压缩包, 拒绝跳出目标目录的成员(路径穿越)"""
+    target_dir = os.path.realpath(target_dir)
+
+    def _check(member_name: str):
+        dest = os.path.realpath(os.path.join(target_dir, member_name))
+        if os.path.commonpath([dest, target_dir]) != target_dir:
+            raise CommandError(f"压缩包中存在非法路径: {member_name}")
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for name in zf.namelist():
+                _check(name)
+            zf.extractall(target_dir)
+    else:
+        with tarfile.open(archive_path) as tf:
+            members = [m for m in tf.getmembers() if m.isfile() or m.isdir()]
+            for member in members:
+                _check(member.name)
+            tf.extractall(target_dir, members=members)
+
+
+def _iter_files(root: str, label_prefix: str) -> Iterator[Tuple[str, str]]:
+    """遍历目录下可解析的文件, 返回(本地路径, 入库时记录的来源)"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.startswith('.'):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            if not is_supported_file(file_path):
+                continue
+            rel_path = os.path.relpath(file_path, root)
+            yield file_path, f"{label_prefix}{rel_path}"
+
+
+class Command(BaseCommand):
+    help = "批量导入目录或zip/tar压缩包中的文档到知识库, 按内容hash去重并支持断点续传"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='待导入的目录或zip/tar压缩包')
+        parser.add_argument('--workers', type=int, default=4, help='并发解析文件的线程数')
+        parser.add_argument('--flush-every', type=int, default=50,
+                            help='每导入多少个文件flush一次Milvus并写入断点')
+        parser.add_argument('--ledger', default=None,
+                            help='入库台账文件路径, 默认取settings.KNOWLEDGE_INGEST_CONFIG["ledger_path"]')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        workers = max(1, options['workers'])
+        self.verbosity = options['verbosity']
+        flush_every = max(1, options['flush_every'])
+        ingest_config = getattr(settings, 'KNOWLEDGE_INGEST_CONFIG', {})
+        ledger_path = options['ledger'] or ingest_config.get(
+            'ledger_path', os.path.join(settings.MEDIA_ROOT, '.ingest_ledger.jsonl')
+        )
+
+        if not os.path.exists(path):
+            raise CommandError(f"路径不存在: {path}")
+
+        temp_dir = None
+        if os.path.isdir(path):
+            root, label_prefix = path, path + os.sep
+        elif zipfile.is_zipfile(path) or tarfile.is_tarfile(path):
+            temp_dir = tempfile.mkdtemp(prefix='ingest_')
+            self.stdout.write(f"解压 {path} ...")
+            _safe_extract(path, temp_dir)
+            root, label_prefix = temp_dir, f"{os.path.basename(path)}!/"
+        else:
+            raise CommandError("只支持目录或zip/tar压缩包")
+
+        ledger = IngestLedger(ledger_path)
+        vector_store = MilvusVectorStore(
+            host=settings.VECTOR_DB_CONFIG['host'],
+            port=settings.VECTOR_DB_CONFIG['port'],
+            collection_name=settings.VECTOR_DB_CONFIG['collection_name']
+        )
+        embedder = BGEM3Embedder(model_name="BAAI/bge-m3")
+
+        try:
+            stats = self._ingest(root, label_prefix, ledger, embedder, vector_store, workers, flush_every)
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        elapsed = max(stats['elapsed'], 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"导入完成: 新增文件 {stats['files']} 个, 跳过(已入库/重复) {stats['skipped']} 个, "
+            f"失败 {stats['failed']} 个, 无有效内容 {stats['empty']} 个\n"
+            f"chunks {stats['chunks']} 个, 向量 {stats['vectors']} 条, 总耗时 {elapsed:.2f} 秒\n"
+            f"chunk token分布: {stats['token_stats']}\n"
+            f"吞吐: {stats['files'] / elapsed:.2f} files/s, "
+            f"{stats['chunks'] / elapsed:.2f} chunks/s, "
+            f"{stats['vectors'] / elapsed:.2f} vectors/s"
+        ))
+
+    def _ingest(self, root, label_prefix, ledger, embedder, vector_store, workers, flush_every):
+        stats = {'files': 0, 'skipped': 0, 'failed': 0, 'empty': 0, 'chunks': 0, 'vectors': 0}
+        token_counts = []
+        seen_hashes = set()
+        pending_entries = []
+        start = time.monotonic()
+
+        def _parse(file_path):
+            content_hash = compute_file_hash(file_path)
+            if content_hash in ledger or content_hash in seen_hashes:
+                return content_hash, None
+            return content_hash, parse_file_to_chunks(file_path)
+
+        def _checkpoint():
+            if pending_entries:
+                vector_store.flush()
+                ledger.record(pending_entries)
+                pending_entries.clear()
+
+        # 控制在途任务数量, 避免一次性提交上万个文件导致解析结果堆积在内存中
+        max_in_flight = workers * 2
+        in_flight = deque()
+        files = _iter_files(root, label_prefix)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    try:
+                        file_path, source = next(files)
+                    except StopIteration:
+                        break
+                    in_flight.append((file_path, source, executor.submit(_parse, file_path)))
+                if not in_flight:
+                    break
+
+                file_path, source, future = in_flight.popleft()
+                try:
+                    content_hash, document = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    logger.error(f"解析文件失败: {source}: {e}")
+                    continue
+
+                if document is None or content_hash in seen_hashes:
+                    stats['skipped'] += 1
+                    continue
+                seen_hashes.add(content_hash)
+                text_contents = document.texts
+                if not text_contents:
+                    # process_singel_file解析失败时也会返回空, 不写入台账以便下次重试
+                    stats['empty'] += 1
+                    continue
+
+                try:
+                    inserted = embed_and_insert(
+                        text_contents, embedder, vector_store,
+                        source=source,
+                        doc_type=os.path.splitext(file_path)[1],
+                        chunk_prefix=content_hash[:10],
+                        flush=False,
+                    )
+                except Exception as e:
+                    stats['failed'] += 1
+                    logger.error(f"向量生成或写入失败: {source}: {e}", exc_info=True)
+                    continue
+
+                stats['files'] += 1
+                stats['chunks'] += len(text_contents)
+                token_counts.extend(document.token_counts)
+                if self.verbosity >= 2:
+                    self.stdout.write(f"{source}: chunk token分布 {document.stats()}")
+                stats['vectors'] += inserted
+                pending_entries.append({'hash': content_hash, 'source': source, 'chunks': inserted})
+                if len(pending_entries) >= flush_every:
+                    _checkpoint()
+                    elapsed = time.monotonic() - start
+                    self.stdout.write(
+                        f"已导入 {stats['files']} 个文件 / {stats['vectors']} 条向量, "
+                        f"{stats['files'] / elapsed:.2f} files/s"
+                    )
+
+        _checkpoint()
+        stats['elapsed'] = time.monotonic() - start
+        stats['token_stats'] = chunk_size_stats(token_counts)
+        return stats
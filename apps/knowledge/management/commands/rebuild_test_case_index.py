@@ -0,0 +1,37 @@
+"""
+全量重建测试用例向量索引
+
+首次启用索引, 或索引与数据库不一致(如Milvus曾不可用)时使用:
+    python manage.py rebuild_test_case_index
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import TestCase
+from apps.knowledge.case_index import TestCaseVectorIndex
+from apps.knowledge.embedding import BGEM3Embedder
+
+
+class Command(BaseCommand):
+    help = "清空并根据数据库中的全部测试用例重建测试用例向量索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256, help='每批向量化并写入的用例条数')
+
+    def handle(self, *args, **options):
+        if settings.VECTOR_DB_CONFIG.get('backend') == 'snapshot':
+            raise CommandError("当前向量库为快照模式(Milvus不可用), 无法重建测试用例索引")
+        index = TestCaseVectorIndex(
+            BGEM3Embedder(model_name="BAAI/bge-m3"),
+            host=settings.VECTOR_DB_CONFIG['host'],
+            port=settings.VECTOR_DB_CONFIG['port'],
+        )
+        start = time.monotonic()
+        total = index.rebuild(TestCase.objects.order_by('id'), batch_size=options['batch_size'])
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"重建完成: {total} 条用例, 耗时 {elapsed:.2f} 秒, {total / elapsed:.0f} rows/s"
+        ))
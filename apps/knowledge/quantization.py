@@ -0,0 +1,142 @@
+"""
+向量降精度存储与精确重排
+
+Milvus中只保存float16或二值化(按符号位)后的向量, HNSW/IVF索引占用的内存随之下降;
+原始float32向量保存在本地的sqlite旁路存储中, 检索时先从Milvus取出扩大范围的粗排候选,
+再用NumPy对候选做精确的余弦相似度重排。
+
+精度选项:
+    float32  原始精度, 每条向量4096字节(1024维), 不需要重排
+    float16  每条向量2048字节, 召回损失很小
+    binary   每条向量128字节(1024 bit), 召回损失较大, 需要更大的重排候选集
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+VECTOR_PRECISIONS = ('float32', 'float16', 'binary')
+
+
+def bytes_per_vector(precision: str, dim: int) -> int:
+    """每条向量在Milvus中占用的原始字节数(不含索引结构开销)"""
+    if precision == 'float32':
+        return dim * 4
+    if precision == 'float16':
+        return dim * 2
+    if precision == 'binary':
+        return dim // 8
+    raise ValueError(f"不支持的向量精度: {precision}")
+
+
+def encode_vectors(vectors, precision: str) -> list:
+    """将float向量转换为写入Milvus时对应精度的格式"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    if precision == 'float32':
+        return [row.tolist() for row in matrix]
+    if precision == 'float16':
+        return [row for row in matrix.astype(np.float16)]
+    if precision == 'binary':
+        # 按符号位二值化, 每8维打包为1个字节
+        return [row.tobytes() for row in np.packbits(matrix > 0, axis=1)]
+    raise ValueError(f"不支持的向量精度: {precision}")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FullPrecisionStore:
+    """原始float32向量的旁路存储(sqlite), 以Milvus主键为key"""
+
+    def __init__(self, db_path: str, dim: int):
+        self.db_path = db_path
+        self.dim = dim
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (id INTEGER PRIMARY KEY, vec BLOB NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def put_many(self, ids: Sequence[int], vectors) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (id, vec) VALUES (?, ?)",
+                ((int(pk), row.tobytes()) for pk, row in zip(ids, matrix))
+            )
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        ids = [int(pk) for pk in ids]
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(f"SELECT id, vec FROM vectors WHERE id IN ({placeholders})", ids).fetchall()
+        return {pk: np.frombuffer(blob, dtype=np.float32) for pk, blob in rows}
+
+    def delete_many(self, ids: Iterable[int]) -> None:
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM vectors WHERE id = ?", ((int(pk),) for pk in ids))
+
+
+def rerank_exact(query_vector, hits: List[Dict], store: FullPrecisionStore,
+                 top_k: int) -> List[Dict]:
+    """用原始精度向量对粗排候选重新计算余弦相似度并排序
+
+    旁路存储中缺失向量的候选保留粗排分数, 排在有精确分数的候选之后
+    """
+    if not hits:
+        return hits
+    full_vectors = store.get_many(hit["id"] for hit in hits)
+    found = [hit for hit in hits if hit["id"] in full_vectors]
+    missing = [hit for hit in hits if hit["id"] not in full_vectors]
+    if missing:
+        logger.warning(f"{len(missing)} 条候选在旁路存储中没有原始向量, 无法精确重排")
+
+    if found:
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32))
+        matrix = normalize_rows(np.stack([full_vectors[hit["id"]] for hit in found]))
+        scores = matrix @ query
+        for hit, score in zip(found, scores):
+            hit["coarse_score"] = hit["score"]
+            hit["score"] = float(score)
+        found.sort(key=lambda hit: hit["score"], reverse=True)
+    return (found + missing)[:top_k]
+
+
+def coarse_search_params(precision: str) -> Dict:
+    """不同精度下集合的索引参数和检索参数"""
+    if precision == 'binary':
+        return {
+            'index_params': {"metric_type": "HAMMING", "index_type": "BIN_IVF_FLAT", "params": {"nlist": 128}},
+            'search_params': {"metric_type": "HAMMING", "params": {"nprobe": 16}},
+        }
+    return {
+        'index_params': {"metric_type": "COSINE", "index_type": "HNSW", "params": {"M": 8, "efConstruction": 64}},
+        'search_params': {"metric_type": "COSINE", "params": {"ef": 32}},
+    }
+
+
+def encode_query(query_vector, precision: str):
+    """将查询向量转换为与集合相同的精度"""
+    return encode_vectors([query_vector], precision)[0]
+
+
+def hamming_to_cosine(distance: float, dim: int) -> float:
+    """由二值向量的汉明距离估算原始向量的余弦相似度: cos(pi * h / dim)"""
+    return float(np.cos(np.pi * distance / dim))
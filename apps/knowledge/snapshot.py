@@ -0,0 +1,236 @@
+"""
+知识库快照导出/导入
+
+快照目录结构:
+    manifest.json                 元信息(条数、向量维度、字段列表等)
+    vectors.npy                   float32向量矩阵 [count, dim], 读取时使用memmap
+    columns/<field>.bin           该字段所有行的UTF-8文本依次拼接
+    columns/<field>.offsets.npy   int64偏移量 [count + 1], 第i行为 bin[offsets[i]:offsets[i+1]]
+
+导入时直接从磁盘批量读取, 不需要重新解析文档和调用嵌入模型
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+from pymilvus import Collection
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_VERSION = 1
+# 除主键和向量外需要导出的标量字段
+SNAPSHOT_FIELDS = ["content", "metadata", "source", "doc_type", "chunk_id", "upload_time"]
+
+
+def _column_paths(snapshot_dir: str, field_name: str):
+    columns_dir = os.path.join(snapshot_dir, 'columns')
+    return (
+        os.path.join(columns_dir, f'{field_name}.bin'),
+        os.path.join(columns_dir, f'{field_name}.offsets.npy'),
+    )
+
+
+def export_snapshot(collection_name: str, snapshot_dir: str, dim: int = 1024,
+                    batch_size: int = 1000, side_store=None) -> Dict[str, Any]:
+    """将Milvus集合导出为快照
+
+    Args:
+        collection_name: 集合名称(需已建立连接)
+        snapshot_dir: 快照输出目录, 必须为空或不存在
+        dim: 向量维度
+        batch_size: 每批从Milvus读取的行数
+        side_store: 集合为降精度存储时传入FullPrecisionStore, 快照中保存原始float32向量
+
+    Returns:
+        manifest信息
+    """
+    if os.path.exists(snapshot_dir) and os.listdir(snapshot_dir):
+        raise ValueError(f"快照目录不为空: {snapshot_dir}")
+    os.makedirs(os.path.join(snapshot_dir, 'columns'), exist_ok=True)
+
+    collection = Collection(collection_name)
+    collection.load()
+    # num_entities可能包含尚未compaction的已删除数据, 只作为上限
+    capacity = collection.num_entities
+    vectors_path = os.path.join(snapshot_dir, 'vectors.npy')
+    vectors = np.lib.format.open_memmap(vectors_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+
+    column_files = {}
+    column_offsets = {}
+    for field_name in SNAPSHOT_FIELDS:
+        bin_path, _ = _column_paths(snapshot_dir, field_name)
+        column_files[field_name] = open(bin_path, 'wb')
+        column_offsets[field_name] = [0]
+
+    count = 0
+    output_fields = SNAPSHOT_FIELDS if side_store is not None else ["embedding"] + SNAPSHOT_FIELDS
+    iterator = collection.query_iterator(
+        batch_size=batch_size, expr="id >= 0", output_fields=["id"] + output_fields
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            if count + len(rows) > capacity:
+                raise RuntimeError("导出过程中集合数据发生了变化, 请在无写入时重新导出")
+            vectors[count:count + len(rows)] = _batch_vectors(rows, side_store)
+            for field_name in SNAPSHOT_FIELDS:
+                f = column_files[field_name]
+                offsets = column_offsets[field_name]
+                for row in rows:
+                    data = (row.get(field_name) or '').encode('utf-8')
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+            count += len(rows)
+            logger.info(f"快照导出进度: {count}/{capacity}")
+    finally:
+        iterator.close()
+        for f in column_files.values():
+            f.close()
+
+    vectors.flush()
+    del vectors
+    if count < capacity:
+        _truncate_vectors(vectors_path, count, dim)
+
+    for field_name, offsets in column_offsets.items():
+        _, offsets_path = _column_paths(snapshot_dir, field_name)
+        np.save(offsets_path, np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'collection_name': collection_name,
+        'count': count,
+        'dim': dim,
+        'dtype': 'float32',
+        'fields': SNAPSHOT_FIELDS,
+        'created_at': datetime.now().isoformat(),
+    }
+    with open(os.path.join(snapshot_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info(f"快照导出完成: {snapshot_dir}, 共 {count} 条")
+    return manifest
+
+
+def _batch_vectors(rows: List[Dict[str, Any]], side_store) -> np.ndarray:
+    """取一批行的float32向量, 降精度集合从旁路存储读取原始向量"""
+    if side_store is None:
+        return np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+    full_vectors = side_store.get_many(row["id"] for row in rows)
+    missing = [row["id"] for row in rows if row["id"] not in full_vectors]
+    if missing:
+        raise RuntimeError(f"旁路存储中缺少 {len(missing)} 条原始向量(如id={missing[0]}), 无法导出快照")
+    return np.stack([full_vectors[row["id"]] for row in rows])
+
+
+def _truncate_vectors(vectors_path: str, count: int, dim: int, block_rows: int = 65536):
+    """实际导出条数少于预分配大小时, 重写为准确大小的npy文件"""
+    source = np.load(vectors_path, mmap_mode='r')
+    temp_path = vectors_path + '.tmp'
+    target = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32, shape=(count, dim))
+    for start in range(0, count, block_rows):
+        end = min(start + block_rows, count)
+        target[start:end] = source[start:end]
+    target.flush()
+    del source, target
+    shutil.move(temp_path, vectors_path)
+
+
+class KnowledgeSnapshot:
+    """只读方式打开的知识库快照, 向量和文本均按需从磁盘读取"""
+
+    def __init__(self, snapshot_dir: str):
+        self.snapshot_dir = snapshot_dir
+        with open(os.path.join(snapshot_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {self.manifest.get('version')}")
+        self.count = self.manifest['count']
+        self.dim = self.manifest['dim']
+        self.fields = self.manifest['fields']
+        self.vectors = np.load(os.path.join(snapshot_dir, 'vectors.npy'), mmap_mode='r')
+        self._columns = {}
+        for field_name in self.fields:
+            bin_path, offsets_path = _column_paths(snapshot_dir, field_name)
+            data = np.memmap(bin_path, dtype=np.uint8, mode='r') if os.path.getsize(bin_path) else np.empty(0, np.uint8)
+            self._columns[field_name] = (data, np.load(offsets_path, mmap_mode='r'))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_value(self, field_name: str, index: int) -> str:
+        data, offsets = self._columns[field_name]
+        return bytes(data[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def get_row(self, index: int) -> Dict[str, Any]:
+        return {field_name: self.get_value(field_name, index) for field_name in self.fields}
+
+    def iter_batches(self, batch_size: int = 2000) -> Iterator[List[Dict[str, Any]]]:
+        """按批返回可直接写入Milvus的数据行"""
+        for start in range(0, self.count, batch_size):
+            end = min(start + batch_size, self.count)
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            rows = []
+            for i in range(start, end):
+                row = self.get_row(i)
+                row["embedding"] = block[i - start].tolist()
+                rows.append(row)
+            yield rows
+
+
+def import_snapshot(snapshot: KnowledgeSnapshot, vector_store, batch_size: int = 2000) -> int:
+    """将快照批量写入MilvusVectorStore, 返回写入条数"""
+    inserted = 0
+    for rows in snapshot.iter_batches(batch_size):
+        vector_store.add_data(rows, flush=False)
+        inserted += len(rows)
+        logger.info(f"快照导入进度: {inserted}/{snapshot.count}")
+    vector_store.flush()
+    return inserted
+
+
+class InMemoryVectorIndex:
+    """基于快照的进程内向量索引, 提供与MilvusVectorStore.search相同的接口
+
+    适用于Milvus不可用时的临时恢复或本地调试, 采用暴力检索(矩阵乘)
+    """
+
+    def __init__(self, snapshot: KnowledgeSnapshot):
+        self.snapshot = snapshot
+        # 拷贝到内存中并归一化, 检索时直接做点积
+        self.vectors = np.array(snapshot.vectors, dtype=np.float32)
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors /= norms
+
+    @classmethod
+    def load(cls, snapshot_dir: str) -> 'InMemoryVectorIndex':
+        return cls(KnowledgeSnapshot(snapshot_dir))
+
+    def search(self, query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+        """搜索最相似的文档(COSINE)"""
+        if not len(self.vectors):
+            return []
+        query = np.array(query_vector, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1.0)
+        scores = self.vectors @ query
+        top_k = min(top_k, len(scores))
+        top_idx = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+        ret = []
+        for idx in top_idx:
+            row = self.snapshot.get_row(int(idx))
+            ret.append({
+                "id": int(idx),
+                "score": float(scores[idx]),
+                **row,
+            })
+        return ret
@@ -5,19 +5,49 @@ from typing import List, Dict, Any, Optional
 import os
 from django.conf import settings
 from utils.logger_manager import get_logger
+from .quantization import (
+    VECTOR_PRECISIONS, FullPrecisionStore, coarse_search_params, encode_query, encode_vectors,
+    hamming_to_cosine, rerank_exact
+)
 
 logger = get_logger(__name__)
 
+# 向量精度对应的Milvus字段类型
+VECTOR_DATA_TYPES = {
+    'float32': DataType.FLOAT_VECTOR,
+    'float16': DataType.FLOAT16_VECTOR,
+    'binary': DataType.BINARY_VECTOR,
+}
+
 class MilvusVectorStore:
     """Milvus向量数据库服务"""
     
     def __init__(self, 
                 host: str = "localhost", 
                 port: str = "19530",
-                collection_name: str = "vv_knowledge_collection"):
+                collection_name: str = "vv_knowledge_collection",
+                vector_precision: Optional[str] = None,
+                rerank_factor: Optional[int] = None,
+                side_store_path: Optional[str] = None):
         self.host = host
         self.port = port
         self.collection_name = collection_name
+        self.dim = 1024
+
+        # 向量精度: float32(默认) / float16 / binary, 降精度时原始向量保存在旁路存储中用于精确重排
+        db_config = getattr(settings, 'VECTOR_DB_CONFIG', {})
+        self.vector_precision = vector_precision or db_config.get('vector_precision', 'float32')
+        if self.vector_precision not in VECTOR_PRECISIONS:
+            raise ValueError(f"不支持的向量精度: {self.vector_precision}")
+        self.rerank_factor = rerank_factor or db_config.get('rerank_factor', 4)
+        self.side_store = None
+        if self.vector_precision != 'float32':
+            side_store_path = side_store_path or os.path.join(
+                db_config.get('side_store_dir', os.path.join(settings.BASE_DIR, 'vector_side_store')),
+                f"{collection_name}.sqlite3"
+            )
+            self.side_store = FullPrecisionStore(side_store_path, self.dim)
+        self._search_config = coarse_search_params(self.vector_precision)
         # 原来的逻辑
         self._connect()
         self._ensure_collection()
@@ -52,8 +82,8 @@ class MilvusVectorStore:
                 ),
                 FieldSchema(
                     name="embedding",
-                    dtype=DataType.FLOAT_VECTOR,
-                    dim=1024  
+                    dtype=VECTOR_DATA_TYPES[self.vector_precision],
+                    dim=self.dim
                 ),
                 FieldSchema(
                     name="content",    # 存储文档片段的实际内容
@@ -92,11 +122,7 @@ class MilvusVectorStore:
             
             # 创建索引
             logger.info("开始创建索引...")
-            index_params = {
-                "metric_type": "COSINE",
-                "index_type": "HNSW",
-                "params": {"M": 8, "efConstruction": 64}
-            }
+            index_params = self._search_config['index_params']
             collection.create_index(
                 field_name="embedding", 
                 index_params=index_params
@@ -107,32 +133,60 @@ class MilvusVectorStore:
         else:
             logger.info(f"集合 {self.collection_name} 已存在，直接返回")
             collection = Collection(self.collection_name)
+            existing_dtype = next(f.dtype for f in collection.schema.fields if f.name == "embedding")
+            if existing_dtype != VECTOR_DATA_TYPES[self.vector_precision]:
+                raise ValueError(
+                    f"集合 {self.collection_name} 的向量类型为 {existing_dtype.name}, "
+                    f"与配置的向量精度 {self.vector_precision} 不一致, 请使用新的集合名称或快照迁移"
+                )
             collection.load()
             return collection
         
-    def add_data(self, data: List[Dict[str, Any]]):
-        """添加文档到向量数据库"""
+    def add_data(self, data: List[Dict[str, Any]], flush: bool = True):
+        """添加文档到向量数据库
+
+        Args:
+            data: 待插入的数据行
+            flush: 是否立即flush; 批量入库时可关闭, 由调用方统一调用flush()
+        """
         logger.info("进入到add_data方法")
         collection = Collection(self.collection_name)
 
+        full_vectors = None
+        if self.vector_precision != 'float32':
+            full_vectors = [row["embedding"] for row in data]
+            encoded = encode_vectors(full_vectors, self.vector_precision)
+            data = [{**row, "embedding": emb} for row, emb in zip(data, encoded)]
+
         try:
-            collection.insert(data)
+            result = collection.insert(data)
         except Exception as e:
             raise
+
+        if full_vectors is not None:
+            # 原始向量按Milvus生成的主键写入旁路存储
+            self.side_store.put_many(result.primary_keys, full_vectors)
                 
-        collection.flush()
+        if flush:
+            collection.flush()
+
+    def flush(self):
+        """将已插入的数据落盘"""
+        Collection(self.collection_name).flush()
         
     def search(self, query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
         """搜索最相似的文档"""
         collection = Collection(self.collection_name)
         collection.load()
         
-        search_params = {"metric_type": "COSINE", "params": {"ef": 32}}
+        search_params = self._search_config['search_params']
+        # 降精度存储时扩大粗排候选范围, 再用原始向量精确重排
+        limit = top_k if self.side_store is None else top_k * self.rerank_factor
         results = collection.search(
-            data=[query_vector], 
+            data=[encode_query(query_vector, self.vector_precision)], 
             anns_field="embedding", 
             param=search_params,
-            limit=top_k,
+            limit=limit,
             output_fields=[
                 "content", "metadata", "source", 
                 "doc_type", "chunk_id", "upload_time"
@@ -154,4 +208,11 @@ class MilvusVectorStore:
                 })
         
         collection.release()
+
+        if self.vector_precision == 'binary':
+            # 汉明距离越小越相似, 先换算为近似余弦相似度, 与其它精度的score含义保持一致
+            for item in ret:
+                item["score"] = hamming_to_cosine(item["score"], self.dim)
+        if self.side_store is not None:
+            ret = rerank_exact(query_vector, ret, self.side_store, top_k)
         return ret 
\ No newline at end of file
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
+import hashlib
+import json
 import os
+import threading
 import time
 from dotenv import load_dotenv
 from utils.logger_manager import get_logger
@@ -8,8 +11,10 @@ from django.conf import settings
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import BaseMessage
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from .cache import get_llm_cache
 from .callbacks import LoggingCallbackHandler
 from .deepseek import DeepSeekChatModel
+from .http_pool import build_openai_client
 from .qwen import QwenChatModel
 
 
@@ -78,13 +83,24 @@ class BaseLLMService(BaseChatModel):
         return "base_llm_service"
 
 class LLMServiceFactory:
-    """大模型服务工厂"""
-    
+    """大模型服务工厂
+
+    创建的模型实例按(提供商, 配置)缓存在进程内复用, 同一配置的请求共享底层HTTP连接池
+    """
+
+    _registry: Dict[str, BaseChatModel] = {}
+    _registry_lock = threading.Lock()
+
+    @staticmethod
+    def _registry_key(provider: str, config: Dict[str, Any]) -> str:
+        # 配置中包含API密钥, 只保存其hash
+        raw = json.dumps(config, sort_keys=True, ensure_ascii=False, default=repr)
+        return f"{provider}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
     @staticmethod
     def create(provider: str, **config) -> BaseChatModel:
-        """创建LLM服务实例"""
+        """获取LLM服务实例, 相同提供商和配置返回同一个实例"""
         logger = get_logger(__class__.__name__)
-        logger.info(f"创建LLM服务: provider={provider}")
         
         # 获取LLM配置
         llm_config = getattr(settings, 'LLM_PROVIDERS', {})
@@ -96,35 +112,54 @@ class LLMServiceFactory:
             logger.warning(f"不支持的LLM提供商: {provider}，使用默认提供商: {default_provider}")
             provider = default_provider
         
-        # 获取提供商配置
-        provider_config = providers.get(provider, {})
+        # 获取提供商配置(拷贝一份, 避免修改settings中的配置)
+        provider_config = dict(providers.get(provider, {}))
         
         # 获取API密钥
         api_key = config.get('api_key') or os.getenv(f"{provider.upper()}_API_KEY")
         if api_key:
             provider_config['api_key'] = api_key
         
+        merged_config = {**provider_config, **config}
+        key = LLMServiceFactory._registry_key(provider, merged_config)
+        with LLMServiceFactory._registry_lock:
+            llm = LLMServiceFactory._registry.get(key)
+            if llm is None:
+                logger.info(f"创建LLM服务: provider={provider}")
+                llm = LLMServiceFactory._build(provider, merged_config, logger)
+                LLMServiceFactory._registry[key] = llm
+        return llm
+
+    @staticmethod
+    def _build(provider: str, config: Dict[str, Any], logger) -> BaseChatModel:
+        """根据提供商创建新的模型实例"""
         # 创建回调处理器
         callbacks = [LoggingCallbackHandler()]
         
-        # 合并配置
-        merged_config = {
-            **provider_config,
+        model_config = {
             **config,
             'callbacks': callbacks,
             'verbose': True  # 启用详细日志
         }
+
+        # 挂载本地响应缓存(调用方显式传入cache时以调用方为准)
+        if 'cache' not in config:
+            llm_cache = get_llm_cache(provider)
+            if llm_cache is not None:
+                model_config['cache'] = llm_cache
         
         # 根据提供商创建相应的服务实例
         if provider.lower() == "deepseek":
-            from .deepseek import DeepSeekChatModel
-            return DeepSeekChatModel(**merged_config)
+            return DeepSeekChatModel(**model_config)
         elif provider.lower() == "qwen":
-            from .qwen import QwenChatModel
-            return QwenChatModel(**merged_config)
+            return QwenChatModel(**model_config)
         elif provider.lower() == "openai":
             from langchain_community.chat_models import ChatOpenAI
-            return ChatOpenAI(**merged_config)
+            api_key = model_config.pop('api_key', None) or os.getenv("OPENAI_API_KEY")
+            model_config.setdefault('client', build_openai_client(
+                api_key, model_config.get('api_base'), model_config.get('max_retries', 2)
+            ))
+            return ChatOpenAI(openai_api_key=api_key, **model_config)
         else:
             logger.error(f"未实现的LLM提供商: {provider}")
-            raise NotImplementedError(f"LLM provider {provider} is not implemented") 
\ No newline at end of file
+            raise NotImplementedError(f"LLM provider {provider} is not implemented")
@@ -0,0 +1,227 @@
+"""
+LLM响应缓存
+
+作为langchain的BaseCache挂在LLMServiceFactory创建的聊天模型上, 相同的提示词(同一提供商、模型和参数)
+直接返回本地缓存的结果, 不再调用大模型。
+
+缓存key = sha256(提供商 + 模型参数(llm_string, 含模型名/temperature/max_tokens等) + 归一化后的消息列表)
+存储在本地sqlite中, 支持TTL过期和按条数淘汰(最久未访问的先淘汰)。
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Sequence
+
+from django.conf import settings
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LLM_CACHE_CONFIG = {
+    'enabled': True,
+    'db_path': os.path.join(settings.BASE_DIR, 'llm_cache.sqlite3'),
+    'ttl_seconds': 7 * 24 * 3600,   # 0表示永不过期
+    'max_entries': 5000,            # 0表示不限制条数
+}
+
+_bypass = contextvars.ContextVar('llm_cache_bypass', default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled: bool = True):
+    """在with块内跳过LLM缓存(既不读取也不写入)
+
+    注意: contextvars不会自动传递到线程池中的线程, 需要在实际调用大模型的线程内使用
+    """
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def get_llm_cache_config() -> Dict[str, Any]:
+    return {**DEFAULT_LLM_CACHE_CONFIG, **getattr(settings, 'LLM_CACHE_CONFIG', {})}
+
+
+def _normalize_text(text: str) -> str:
+    """统一换行符并去掉行尾空白, 避免只有空白差异的提示词无法命中"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """对langchain序列化后的消息列表做归一化"""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return _normalize_text(prompt)
+
+    def _walk(value):
+        if isinstance(value, str):
+            return _normalize_text(value)
+        if isinstance(value, list):
+            return [_walk(v) for v in value]
+        if isinstance(value, dict):
+            # 消息id每次构造都可能不同, 不参与key计算
+            return {k: _walk(v) for k, v in value.items() if k != 'id' or not isinstance(v, str)}
+        return value
+
+    return json.dumps(_walk(messages), ensure_ascii=False, sort_keys=True)
+
+
+class SQLiteLLMCache(BaseCache):
+    """基于sqlite的LLM响应缓存, 同一数据库文件可被多个提供商共用(key中包含提供商)"""
+
+    def __init__(self, provider: str, db_path: Optional[str] = None,
+                 ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        config = get_llm_cache_config()
+        self.provider = provider
+        self.db_path = db_path or config['db_path']
+        self.ttl_seconds = config['ttl_seconds'] if ttl_seconds is None else ttl_seconds
+        self.max_entries = config['max_entries'] if max_entries is None else max_entries
+        self._lock = threading.Lock()
+        # 记录每个线程最近一次未命中的key和时间, update时据此计算大模型调用耗时(即以后命中可节省的时间)
+        self._pending = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, provider TEXT NOT NULL, response TEXT NOT NULL,"
+                " latency REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL, hit_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_stats ("
+                " provider TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0,"
+                " misses INTEGER NOT NULL DEFAULT 0, time_saved REAL NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _make_key(self, prompt: str, llm_string: str) -> str:
+        raw = '\x00'.join([self.provider, llm_string, normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _record_stats(self, conn, hits: int = 0, misses: int = 0, time_saved: float = 0.0):
+        conn.execute(
+            "INSERT INTO llm_cache_stats (provider, hits, misses, time_saved) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(provider) DO UPDATE SET hits = hits + excluded.hits, "
+            "misses = misses + excluded.misses, time_saved = time_saved + excluded.time_saved",
+            (self.provider, hits, misses, time_saved)
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if _bypass.get():
+            return None
+        key = self._make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, latency, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds and now - row[2] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._record_stats(conn, misses=1)
+                self._pending.miss = (key, time.monotonic())
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?", (now, key)
+            )
+            self._record_stats(conn, hits=1, time_saved=row[1])
+
+        logger.info(f"LLM缓存命中: provider={self.provider}, 节省 {row[1]:.2f} 秒")
+        try:
+            return [loads(item) for item in json.loads(row[0])]
+        except Exception as e:
+            logger.warning(f"LLM缓存数据无法反序列化, 按未命中处理: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if _bypass.get():
+            return
+        key = self._make_key(prompt, llm_string)
+        pending = getattr(self._pending, 'miss', None)
+        latency = time.monotonic() - pending[1] if pending and pending[0] == key else 0.0
+        self._pending.miss = None
+        response = json.dumps([dumps(gen) for gen in return_val], ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, response, latency, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.provider, response, latency, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空当前提供商的缓存条目和统计"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE provider = ?", (self.provider,))
+            conn.execute("DELETE FROM llm_cache_stats WHERE provider = ?", (self.provider,))
+
+
+def get_llm_cache_stats(db_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """按提供商汇总缓存命中率和节省的时间"""
+    db_path = db_path or get_llm_cache_config()['db_path']
+    if not os.path.exists(db_path):
+        return {}
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        entries = dict(conn.execute("SELECT provider, COUNT(*) FROM llm_cache GROUP BY provider").fetchall())
+        stats = {}
+        for provider, hits, misses, time_saved in conn.execute(
+                "SELECT provider, hits, misses, time_saved FROM llm_cache_stats"):
+            total = hits + misses
+            stats[provider] = {
+                'entries': entries.get(provider, 0),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / total, 4) if total else 0.0,
+                'time_saved_seconds': round(time_saved, 2),
+            }
+        for provider, count in entries.items():
+            stats.setdefault(provider, {
+                'entries': count, 'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'time_saved_seconds': 0.0
+            })
+    return stats
+
+
+_caches: Dict[str, SQLiteLLMCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(provider: str) -> Optional[SQLiteLLMCache]:
+    """获取提供商对应的缓存实例(单例), 未启用缓存时返回None"""
+    if not get_llm_cache_config()['enabled']:
+        return None
+    with _caches_lock:
+        if provider not in _caches:
+            _caches[provider] = SQLiteLLMCache(provider)
+        return _caches[provider]
@@ -0,0 +1,249 @@
+"""
+大模型调用并发控制
+
+同一提供商的并发请求数受settings.LLM_CONCURRENCY限制, 进程内所有Agent共用同一个限流器,
+避免并行生成/评审时超出提供商的并发配额
+
+AdaptiveConcurrencyLimiter按AIMD(加性增、乘性减)动态调整并发数, 用于大批量的调用(如接口用例批量生成):
+    - 并发数用满且调用成功时, 每完成约limit次调用并发数加1, 直到max_limit
+    - 收到限流响应(429)时, 并发数乘以decrease_factor(冷却时间内只减一次)
+    - 被限流的调用按带抖动的指数退避重试
+延迟不作为减小并发的信号: 打包生成后单次调用可能生成1条或几十条用例, 延迟主要取决于输出长度而不是负载
+"""
+
+import collections
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LLM_CONCURRENCY = {
+    'default': 4,
+}
+
+DEFAULT_ADAPTIVE_CONCURRENCY = {
+    'min_limit': 1,
+    'max_limit': 32,             # 并发数上限, 初始值为LLM_CONCURRENCY中的配置
+    'decrease_factor': 0.5,      # 限流时的乘性减系数
+    'cooldown': 5.0,             # 两次减小并发之间的最小间隔(秒), 同一波限流只减一次
+    'max_retries': 5,            # 被限流的调用最多重试次数
+    'backoff_base': 1.0,         # 退避基数(秒), 第n次重试等待 uniform(0, min(backoff_max, base * 2^n))
+    'backoff_max': 30.0,
+    'cache_hit_latency': 0.2,    # 低于该延迟的调用视为命中本地缓存, 不计入平均延迟
+}
+
+T = TypeVar('T')
+
+
+class ConcurrencyLimiter:
+    """基于信号量的并发限制, 以with语句包裹一次大模型调用"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+        return False
+
+
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limit(provider: str) -> int:
+    config = {**DEFAULT_LLM_CONCURRENCY, **getattr(settings, 'LLM_CONCURRENCY', {})}
+    return int(config.get(provider, config['default']))
+
+
+def get_concurrency_limiter(provider: str) -> ConcurrencyLimiter:
+    """获取提供商对应的并发限制器（单例模式）"""
+    provider = provider or 'default'
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ConcurrencyLimiter(provider, get_concurrency_limit(provider))
+            logger.info(f"LLM并发限制: provider={provider}, limit={_limiters[provider].limit}")
+        return _limiters[provider]
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """判断异常是否为提供商的限流响应(HTTP 429)
+
+    按异常类型和状态码判断, 消息文本只匹配明确的限流短语(不匹配'429', 请求ID或token数中可能含有这几个数字)
+    """
+    if any(cls.__name__ == 'RateLimitError' for cls in type(error).__mro__):
+        return True
+    response = getattr(error, 'response', None)
+    for status in (getattr(error, 'status_code', None), getattr(response, 'status_code', None)):
+        if status == 429:
+            return True
+    message = str(error).lower()
+    return 'rate limit' in message or 'too many requests' in message
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """读取限流响应中的Retry-After(秒)"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD自适应并发限制, 用法与ConcurrencyLimiter相同; call()在被限流时自动退避重试"""
+
+    def __init__(self, name: str, initial_limit: int, config: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.config = {**DEFAULT_ADAPTIVE_CONCURRENCY, **(config or {})}
+        self._limit = float(min(max(initial_limit, self.config['min_limit']), self.config['max_limit']))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._completed = collections.deque()              # 最近60秒内完成调用的时间, 用于计算吞吐量
+        self._stats = {'completed': 0, 'throttled': 0, 'retries': 0, 'failed': 0}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def __enter__(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+        return False
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.config['cooldown']:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self._limit = max(float(self.config['min_limit']), self._limit * self.config['decrease_factor'])
+        logger.warning(f"LLM并发下调: provider={self.name}, {old} -> {self.limit}, 原因: {reason}")
+
+    def record_success(self, latency: float):
+        """记录一次成功调用, 并发数用满时加性增加并发数; 延迟只用于统计"""
+        with self._cond:
+            now = time.monotonic()
+            self._stats['completed'] += 1
+            self._completed.append(now)
+            if latency >= self.config['cache_hit_latency']:
+                self._latency_ewma = (latency if self._latency_ewma is None
+                                      else 0.8 * self._latency_ewma + 0.2 * latency)
+            if self._in_flight >= int(self._limit) and self._limit < self.config['max_limit']:
+                # 只有并发数用满时才增加, 避免空闲时并发数无限上涨
+                old = self.limit
+                self._limit = min(float(self.config['max_limit']), self._limit + 1.0 / self._limit)
+                if self.limit > old:
+                    logger.info(f"LLM并发上调: provider={self.name}, {old} -> {self.limit}")
+                    self._cond.notify_all()
+
+    def record_throttled(self):
+        """记录一次限流响应, 乘性减小并发数"""
+        with self._cond:
+            self._stats['throttled'] += 1
+            self._decrease("提供商返回限流(429)")
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在并发限制内执行一次大模型调用, 被限流时按带抖动的指数退避重试"""
+        attempt = 0
+        while True:
+            with self:
+                start = time.monotonic()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        with self._cond:
+                            self._stats['failed'] += 1
+                        raise
+                    self.record_throttled()
+                    error = e
+                else:
+                    self.record_success(time.monotonic() - start)
+                    return result
+            # 退避等待时释放并发名额
+            if attempt >= self.config['max_retries']:
+                with self._cond:
+                    self._stats['failed'] += 1
+                raise error
+            attempt += 1
+            delay = random.uniform(0, min(self.config['backoff_max'], self.config['backoff_base'] * 2 ** attempt))
+            delay = max(delay, _retry_after(error) or 0.0)
+            with self._cond:
+                self._stats['retries'] += 1
+            logger.info(f"LLM调用被限流, {delay:.1f} 秒后第 {attempt} 次重试: provider={self.name}")
+            time.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前并发数与吞吐量"""
+        with self._cond:
+            now = time.monotonic()
+            while self._completed and now - self._completed[0] > 60:
+                self._completed.popleft()
+            return {
+                'provider': self.name,
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'max_limit': self.config['max_limit'],
+                'throughput_per_minute': len(self._completed),
+                'avg_latency': round(self._latency_ewma, 2) if self._latency_ewma is not None else None,
+                **self._stats,
+            }
+
+
+_adaptive_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_adaptive_limiter(provider: str) -> AdaptiveConcurrencyLimiter:
+    """获取提供商对应的自适应并发限制器（单例模式）, 初始并发数取LLM_CONCURRENCY中的配置"""
+    provider = provider or 'default'
+    with _limiters_lock:
+        if provider not in _adaptive_limiters:
+            config = getattr(settings, 'LLM_ADAPTIVE_CONCURRENCY', {})
+            _adaptive_limiters[provider] = AdaptiveConcurrencyLimiter(
+                provider, get_concurrency_limit(provider), {**config.get('default', {}), **config.get(provider, {})}
+            )
+            logger.info(f"LLM自适应并发: provider={provider}, 初始limit={_adaptive_limiters[provider].limit}")
+        return _adaptive_limiters[provider]
+
+
+def get_adaptive_concurrency_stats() -> Dict[str, Dict[str, Any]]:
+    """各提供商自适应并发限制器的当前状态"""
+    with _limiters_lock:
+        limiters = list(_adaptive_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
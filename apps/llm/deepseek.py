@@ -1,5 +1,6 @@
 from langchain_community.chat_models import ChatOpenAI
 import os
+from .http_pool import build_openai_client
 
 class DeepSeekChatModel(ChatOpenAI):
     """DeepSeek聊天模型"""
@@ -22,11 +23,12 @@ class DeepSeekChatModel(ChatOpenAI):
                 "or pass it directly."
             )
         
-        # 设置为OpenAI格式的API密钥
-        os.environ["OPENAI_API_KEY"] = api_key
+        # 显式传入API密钥, 并复用共享的HTTP连接池
+        kwargs.setdefault('client', build_openai_client(api_key, api_base, kwargs.get('max_retries', 2)))
         
         super().__init__(
             model_name=model,
             openai_api_base=api_base,
+            openai_api_key=api_key,
             **kwargs
         )
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+大模型HTTP连接池
+
+所有OpenAI兼容的聊天模型共用一个httpx.Client, 按host复用keep-alive连接, 避免每次请求都重新建立TCP/TLS连接
+"""
+
+import threading
+from typing import Optional
+
+import httpx
+import openai
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LLM_HTTP_POOL = {
+    'max_connections': 50,            # 连接总数上限
+    'max_keepalive_connections': 20,  # 空闲时保持的keep-alive连接数
+    'keepalive_expiry': 60,           # 空闲连接保持时间(秒)
+    'timeout': 600,                   # 单次请求超时(秒), 生成大量用例时响应较慢
+}
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_pool_config():
+    return {**DEFAULT_LLM_HTTP_POOL, **getattr(settings, 'LLM_HTTP_POOL', {})}
+
+
+def get_http_client() -> httpx.Client:
+    """获取进程内共享的httpx.Client（单例模式）"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                config = get_http_pool_config()
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=config['max_connections'],
+                        max_keepalive_connections=config['max_keepalive_connections'],
+                        keepalive_expiry=config['keepalive_expiry'],
+                    ),
+                    timeout=httpx.Timeout(config['timeout'], connect=10.0),
+                )
+                logger.info(f"创建LLM HTTP连接池: {config}")
+    return _http_client
+
+
+def build_openai_client(api_key: str, api_base: Optional[str], max_retries: int = 2):
+    """创建使用共享连接池的OpenAI兼容客户端, 可直接作为ChatOpenAI的client参数
+
+    API密钥显式传入, 不经过环境变量, 多线程下不同提供商互不影响
+    """
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=api_base,
+        max_retries=max_retries,
+        http_client=get_http_client(),
+    ).chat.completions
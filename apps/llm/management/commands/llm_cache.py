@@ -0,0 +1,39 @@
+"""
+查看或清理LLM响应缓存
+
+用法:
+    python manage.py llm_cache stats
+    python manage.py llm_cache clear --provider deepseek
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.llm.cache import SQLiteLLMCache, get_llm_cache_stats
+
+
+class Command(BaseCommand):
+    help = "查看LLM响应缓存的命中率和节省的时间, 或清空缓存"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['stats', 'clear'])
+        parser.add_argument('--provider', default=None, help='只清理指定提供商的缓存, 默认全部')
+
+    def handle(self, *args, **options):
+        stats = get_llm_cache_stats()
+        if options['action'] == 'stats':
+            if not stats:
+                self.stdout.write("LLM缓存为空")
+                return
+            for provider, item in sorted(stats.items()):
+                self.stdout.write(
+                    f"{provider}: 缓存 {item['entries']} 条, 命中 {item['hits']} 次, 未命中 {item['misses']} 次, "
+                    f"命中率 {item['hit_rate']:.1%}, 节省 {item['time_saved_seconds']:.1f} 秒"
+                )
+            return
+
+        providers = [options['provider']] if options['provider'] else list(stats)
+        if options['provider'] and options['provider'] not in stats:
+            raise CommandError(f"没有提供商 {options['provider']} 的缓存")
+        for provider in providers:
+            SQLiteLLMCache(provider).clear()
+        self.stdout.write(self.style.SUCCESS(f"已清空缓存: {', '.join(providers) or '无'}"))
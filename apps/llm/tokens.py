@@ -0,0 +1,47 @@
+"""
+提示词token数估算与按token预算打包
+
+不依赖具体模型的分词器: 中日韩字符按1个token计, 其余字符按约4个字符1个token计,
+误差在±20%以内, 足够用于拆分批次/控制上下文长度
+"""
+
+import re
+from typing import Callable, List, Sequence, TypeVar
+
+T = TypeVar('T')
+
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+def pack_by_budget(items: Sequence[T], cost: Callable[[T], int], budget: int,
+                   max_items: int = 0) -> List[List[T]]:
+    """按顺序把items打包为多个批次, 每批的cost之和不超过budget(单个超出预算的元素独占一批)
+
+    Args:
+        items: 待打包的元素
+        cost: 计算单个元素token数的函数
+        budget: 每批的token预算
+        max_items: 每批最多元素个数, 0表示不限制
+    """
+    batches: List[List[T]] = []
+    current: List[T] = []
+    used = 0
+    for item in items:
+        item_cost = cost(item)
+        full = max_items and len(current) >= max_items
+        if current and (used + item_cost > budget or full):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += item_cost
+    if current:
+        batches.append(current)
+    return batches
@@ -37,6 +37,14 @@ ENABLE_MILVUS = False
 MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')
 MEDIA_URL = '/uploads/'
 
+# 各类上传文件的大小上限(字节), 由对应视图上的streaming_upload(HashingUploadHandler)在Django解析请求体时
+# 逐块检查, 超出后立即中止接收; 未使用该处理器的请求仍受Django默认的DATA_UPLOAD_MAX_MEMORY_SIZE(非文件字段)限制
+FILE_UPLOAD_LIMITS = {
+    'knowledge': 100 * 1024 * 1024,        # 知识库文档
+    'prd': 50 * 1024 * 1024,               # PRD文档
+    'api_definition': 1024 * 1024 * 1024,  # 接口定义导出文件
+}
+
 # 允许所有域名跨域（开发环境用，生产环境需调整）
 CORS_ORIGIN_ALLOW_ALL = True
 
@@ -153,6 +161,93 @@ LLM_PROVIDERS = {
     }
 }
 
+# LLM HTTP连接池: 所有大模型客户端共用, 复用keep-alive连接
+LLM_HTTP_POOL = {
+    'max_connections': 50,
+    'max_keepalive_connections': 20,
+    'keepalive_expiry': 60,   # 空闲连接保持时间(秒)
+    'timeout': 600,           # 单次请求超时(秒)
+}
+
+# 各提供商同时进行的大模型请求数上限(进程内), 未配置的提供商使用default
+LLM_CONCURRENCY = {
+    'default': 4,
+    'deepseek': 8,
+    'qwen': 4,
+}
+
+# 自适应并发(接口用例批量生成): 初始并发数取LLM_CONCURRENCY, 按限流(429)在min_limit~max_limit之间调整
+# 可按提供商覆盖, 未配置的项使用default
+LLM_ADAPTIVE_CONCURRENCY = {
+    'default': {
+        'min_limit': 1,
+        'max_limit': 32,
+        'max_retries': 5,     # 被限流的调用最多重试次数(带抖动的指数退避)
+    },
+}
+
+# 用例条数较多时拆分为多个批次并行生成(按选择的设计方法/用例类型或固定条数拆分), 合并后去重
+CASE_GENERATION_SHARDING = {
+    'enabled': True,
+    'shard_size': 10,    # 每个批次最多生成的用例条数
+    'max_shards': 10,    # 最多拆分的批次数
+}
+
+# 合法用例不足(格式错误被丢弃或输出截断)时, 只针对缺少的条数补充生成, 最多补充max_rounds次
+CASE_GENERATION_TOPUP = {
+    'enabled': True,
+    'max_rounds': 2,
+    'max_listed': 30,              # 补充请求中列出的已生成用例描述条数, 用于避免重复
+    'description_max_chars': 80,
+}
+
+# 批量AI评审: 多条较短的用例按token预算打包到同一个提示词, 批次之间按LLM_CONCURRENCY并发
+CASE_REVIEW_BATCH = {
+    'token_budget': 3000,
+    'max_cases_per_batch': 8,
+}
+
+# PRD分析: 文档超过section_max_tokens时按标题层级拆分为章节并发分析, 合并测试点后在本地计算汇总信息
+PRD_ANALYSIS_CONFIG = {
+    'map_reduce': True,
+    'section_max_tokens': 3000,
+    'incremental': True,   # 按上传文件名保存各章节的分析结果, 文档修订后只重新分析新增/变更的章节
+}
+
+# 后台自动评审(python manage.py auto_review): 按优先级评审待评审用例, 游标和统计保存在state_path
+AUTO_REVIEW_CONFIG = {
+    'round_size': 40,
+    'poll_interval': 30,
+    'max_llm_calls_per_hour': 120,   # 0表示不限制
+    'max_attempts': 3,
+    'state_path': os.path.join(BASE_DIR, 'auto_review_state.json'),
+}
+
+# 生成用例的语义去重: 描述+步骤向量化后余弦相似度不低于threshold的用例只保留一条
+CASE_DEDUP_CONFIG = {
+    'enabled': True,
+    'threshold': 0.92,
+}
+
+# 已保存测试用例的向量索引(Milvus), 保存/更新/删除用例时增量维护
+# 生成用例时检索few_shot_count条相似度不低于few_shot_min_score的已通过用例作为参考示例
+# 全量重建: python manage.py rebuild_test_case_index
+TEST_CASE_INDEX_CONFIG = {
+    'enabled': True,
+    'collection_name': 'test_case_collection',
+    'few_shot_count': 3,
+    'few_shot_min_score': 0.6,
+}
+
+# LLM响应缓存: 相同提供商/模型参数/提示词的请求直接返回本地缓存结果
+# 单次请求可通过参数use_cache=false跳过缓存, 命中统计可通过 python manage.py llm_cache stats 查看
+LLM_CACHE_CONFIG = {
+    'enabled': True,
+    'db_path': os.path.join(BASE_DIR, 'llm_cache.sqlite3'),
+    'ttl_seconds': 7 * 24 * 3600,   # 缓存有效期, 0表示永不过期
+    'max_entries': 5000,            # 最多缓存条数, 超出时淘汰最久未访问的条目
+}
+
 # # 默认大模型提供商
 # DEFAULT_LLM_PROVIDER = 'deepseek'
 
@@ -161,6 +256,54 @@ VECTOR_DB_CONFIG = {
     'host': 'localhost',
     'port': '19530',
     'collection_name': 'vv_knowledge_collection',
+    # 'backend': 'snapshot',  # 设置为snapshot时不连接Milvus, 从snapshot_dir加载只读的进程内索引
+    # 'snapshot_dir': os.path.join(BASE_DIR, 'snapshots', 'knowledge'),
+    # 向量精度: float32 / float16 / binary, 降精度可减少Milvus内存占用, 原始向量存入旁路存储用于精确重排
+    # 注意: 修改精度需要使用新的集合名称(可先导出快照再导入)
+    'vector_precision': 'float32',
+    'rerank_factor': 4,          # 降精度时粗排候选数 = top_k * rerank_factor
+    'side_store_dir': os.path.join(BASE_DIR, 'vector_side_store'),
+}
+
+# 知识库chunking配置: 用嵌入模型的tokenizer度量长度, 按token窗口切分
+CHUNKING_CONFIG = {
+    'tokenizer': 'BAAI/bge-m3',
+    'max_tokens': 512,           # 每个chunk的目标token数
+    'overlap_tokens': 64,        # 相邻chunk之间重叠的token数
+    'max_content_bytes': 4096,   # 不超过Milvus集合content字段的max_length
+}
+
+# 知识库批量导入配置(manage.py ingest_knowledge)
+KNOWLEDGE_INGEST_CONFIG = {
+    'ledger_path': os.path.join(MEDIA_ROOT, '.ingest_ledger.jsonl'),  # 已入库文件台账, 用于去重和断点续传
+}
+
+# 接口用例批量生成: 较小的接口按token预算打包到一次调用中生成, 减少重复发送的模板和系统提示词
+API_CASE_BUNDLE = {
+    'enabled': True,
+    'token_budget': 2000,
+    'max_apis_per_bundle': 8,
+    'max_cases_per_bundle': 30,
+}
+
+# 接口定义文件索引: 流式扫描apiDefinitions生成索引(接口信息+字节区间), 按文件内容hash缓存
+API_DEFINITION_INDEX_CONFIG = {
+    'cache_dir': os.path.join(MEDIA_ROOT, '.api_index'),
+    'memory_cache_size': 16,
+}
+
+# 接口用例复用: 请求/响应结构相同(只有路径不同)的接口复用已生成的用例, 按结构指纹缓存
+API_CASE_REUSE_CONFIG = {
+    'enabled': True,
+    'cache_dir': os.path.join(MEDIA_ROOT, '.api_case_reuse'),
+    'memory_cache_size': 256,
+}
+
+# Word文档转Markdown配置(PRD分析), 转换结果按文件内容hash缓存
+DOCX_CONVERSION_CONFIG = {
+    'cache_dir': os.path.join(MEDIA_ROOT, '.markdown_cache'),
+    'memory_cache_size': 32,
+    'engine': 'auto',     # auto: python-docx失败时回退pandoc; docx: 只用python-docx; pandoc: 只用pandoc
 }
 
 # 嵌入模型配置
@@ -115,8 +115,18 @@ document.addEventListener('DOMContentLoaded', function() {
             
             console.log('发送的数据:', requestData);
             
-            // 发送请求
-            fetch('/generate/', {
+            // 发送请求: 流式接口, 每生成一条用例就立即显示
+            const generatedCases = [];
+            const finishLoading = () => {
+                if (loadingIndicator) {
+                    loadingIndicator.style.display = 'none';
+                }
+                if (generateButton) {
+                    generateButton.disabled = false;
+                }
+            };
+            
+            fetch('/generate/stream/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -126,62 +136,81 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(response => {
                 console.log('收到服务器响应:', response.status);
-                return response.json();
-            })
-            .then(data => {
-                console.log('解析后的响应数据:', data);
-                
-                // 隐藏加载指示器
-                if (loadingIndicator) {
-                    loadingIndicator.style.display = 'none';
+                if (!response.ok || !response.body) {
+                    // 参数校验失败时返回的是普通JSON
+                    return response.json().then(data => {
+                        throw new Error(data.message || `HTTP ${response.status}`);
+                    });
                 }
-                if (generateButton) {
-                    generateButton.disabled = false;
-                }
-                
-                if (data.success) {
-                    // 创建或获取 result-container
-                    let resultContainer = document.getElementById('result-container');
-                    if (!resultContainer) {
-                        resultContainer = document.createElement('div');
-                        resultContainer.id = 'result-container';
-                        resultContainer.className = 'mt-4';
-                        generateForm.parentNode.insertBefore(resultContainer, generateForm.nextSibling);
-                    }
-                    
-                    // 使用已有的 displayTestCases 函数显示测试用例
-                    displayTestCases(data.test_cases);
-                    
-                    // 保存生成的测试用例到会话存储
-                    sessionStorage.setItem('generatedTestCases', JSON.stringify(data.test_cases));
-                    sessionStorage.setItem('inputText', inputTextValue);
-                    
-                    // 重新绑定保存按钮事件
-                    const saveButton = document.getElementById('save-button');
-                    if (saveButton) {
-                        saveButton.disabled = false;
-                    }
-                } else {
-                    console.error('服务器返回错误:', data.message);
-                    if (resultContainer) {
-                        resultContainer.innerHTML = `<div class="alert alert-danger">${data.message || '生成测试用例时出错'}</div>`;
+                return readEventStream(response.body, (event, payload) => {
+                    if (event === 'case') {
+                        generatedCases.push(payload.test_case);
+                        displayTestCases(generatedCases, true);
+                        // 保存生成的测试用例到会话存储
+                        sessionStorage.setItem('generatedTestCases', JSON.stringify(generatedCases));
+                        sessionStorage.setItem('inputText', inputTextValue);
+                    } else if (event === 'error') {
+                        throw new Error(payload.message || '生成测试用例时出错');
                     }
-                }
+                });
+            })
+            .then(() => {
+                console.log('流式生成结束, 用例数:', generatedCases.length);
+                finishLoading();
+                displayTestCases(generatedCases);
             })
             .catch(error => {
                 console.error('请求发生错误:', error);
-                if (loadingIndicator) {
-                    loadingIndicator.style.display = 'none';
+                finishLoading();
+                if (generatedCases.length) {
+                    // 已收到的用例保留, 仍可保存
+                    displayTestCases(generatedCases);
                 }
+                const resultContainer = document.getElementById('result-container');
                 if (resultContainer) {
-                    resultContainer.innerHTML = `<div class="alert alert-danger">请求失败: ${error.message}</div>`;
+                    resultContainer.insertAdjacentHTML('afterbegin',
+                        `<div class="alert alert-danger">生成测试用例时出错: ${error.message}</div>`);
                 }
             });
         });
     }
     
-    // 显示测试用例
-    function displayTestCases(testCases) {
+    // 读取SSE响应流, 每收到一个完整事件回调一次
+    function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                let separatorIndex;
+                while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, separatorIndex);
+                    buffer = buffer.slice(separatorIndex + 2);
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) {
+                            event = line.slice(6).trim();
+                        } else if (line.startsWith('data:')) {
+                            data += line.slice(5).trim();
+                        }
+                    });
+                    if (data) {
+                        onEvent(event, JSON.parse(data));
+                    }
+                }
+                if (!done) {
+                    return pump();
+                }
+            });
+        }
+        return pump();
+    }
+    
+    // 显示测试用例, streaming为true时表示仍在生成中, 暂不允许保存
+    function displayTestCases(testCases, streaming = false) {
         // 获取或创建 resultContainer
         let resultContainer = document.getElementById('result-container');
         if (!resultContainer) {
@@ -263,7 +292,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // 重新绑定保存按钮事件
         const saveButton = document.getElementById('save-button');
         if (saveButton) {
-            saveButton.disabled = false;
+            saveButton.disabled = streaming;
             
             // 添加保存按钮的点击事件监听器
             saveButton.addEventListener('click', function() {
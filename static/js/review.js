@@ -44,6 +44,112 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // 批量AI评审: 评审当前页全部待评审用例, 每完成一个批次即在对应行显示评审结果
+    const batchReviewButton = document.getElementById('batch-review');
+    if (batchReviewButton) {
+        batchReviewButton.addEventListener('click', function() {
+            const ids = Array.from(document.querySelectorAll('#pending .review-button'))
+                .map(button => button.getAttribute('data-id'));
+            if (ids.length === 0) {
+                alert('当前页没有待评审的测试用例');
+                return;
+            }
+            const progress = document.getElementById('batch-review-progress');
+            let finished = 0;
+            batchReviewButton.disabled = true;
+            progress.textContent = `评审中 0/${ids.length}`;
+            
+            fetch('/api/review/batch/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfToken
+                },
+                body: JSON.stringify({ ids: ids })
+            })
+            .then(response => {
+                if (!response.ok || !response.body) {
+                    return response.json().then(data => { throw new Error(data.message || '批量评审失败'); });
+                }
+                return readEventStream(response.body, (event, payload) => {
+                    if (event === 'review') {
+                        finished += 1;
+                        progress.textContent = `评审中 ${finished}/${ids.length}`;
+                        showBatchReviewResult(payload);
+                    } else if (event === 'done') {
+                        progress.textContent = `评审完成: 成功 ${payload.reviewed} 条, 失败 ${payload.failed} 条, 耗时 ${payload.elapsed_seconds} 秒`;
+                    } else if (event === 'error') {
+                        throw new Error(payload.message || '批量评审失败');
+                    }
+                });
+            })
+            .catch(error => {
+                console.error('批量评审失败:', error);
+                progress.textContent = '批量评审失败: ' + error.message;
+            })
+            .finally(() => {
+                batchReviewButton.disabled = false;
+            });
+        });
+    }
+    
+    // 在待评审列表对应行的操作列中显示评审结论
+    function showBatchReviewResult(payload) {
+        const button = document.querySelector(`#pending .review-button[data-id="${payload.test_case_id}"]`);
+        if (!button) {
+            return;
+        }
+        let resultElement = button.parentElement.querySelector('.batch-review-result');
+        if (!resultElement) {
+            resultElement = document.createElement('div');
+            resultElement.className = 'batch-review-result small mt-1';
+            button.parentElement.appendChild(resultElement);
+        }
+        if (!payload.success) {
+            resultElement.innerHTML = `<span class="text-danger">评审失败</span>`;
+            resultElement.title = payload.message || '';
+            return;
+        }
+        const result = payload.review_result || {};
+        const passed = result.recommendation === '通过';
+        resultElement.innerHTML = `<span class="badge ${passed ? 'badge-success' : 'badge-danger'}">${result.recommendation || '-'}</span> 评分: ${result.score ?? '-'}`;
+        resultElement.title = result.comments || '';
+    }
+    
+    // 读取SSE响应流, 每收到一个完整事件回调一次
+    function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                let separatorIndex;
+                while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, separatorIndex);
+                    buffer = buffer.slice(separatorIndex + 2);
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) {
+                            event = line.slice(6).trim();
+                        } else if (line.startsWith('data:')) {
+                            data += line.slice(5).trim();
+                        }
+                    });
+                    if (data) {
+                        onEvent(event, JSON.parse(data));
+                    }
+                }
+                if (!done) {
+                    return pump();
+                }
+            });
+        }
+        return pump();
+    }
+    
     // 获取所有状态更新按钮
     const statusButtons = document.querySelectorAll('.status-button');
     
@@ -1,4 +1,41 @@
+"""
+Word文档转Markdown
+
+DocxMarkdownConverter在进程内用python-docx把docx转换为Markdown文本, 不落地中间文件:
+    - 标题/列表/粗体斜体/超链接/表格按Markdown输出, 修订插入、域、内容控件中的文字一并保留,
+      图片等无法用文本表达的内容忽略
+    - python-docx解析失败(如文档结构不规范)时回退到pandoc
+    - 转换结果按文件内容的sha256缓存: 进程内LRU + 磁盘缓存, 同一份PRD重复上传不再重新转换
+    - 同一份文件的并发转换按hash加锁, 只转换一次; 不同文件之间互不阻塞
+"""
+
+import collections
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
 import pypandoc
+from django.conf import settings
+
+from utils.logger_manager import get_logger
+
+logger = get_logger(__name__)
+
+# 转换逻辑变化时递增, 使已缓存的旧结果失效
+CONVERTER_VERSION = 2
+
+DEFAULT_DOCX_CONVERSION_CONFIG = {
+    'cache_dir': os.path.join(settings.MEDIA_ROOT, '.markdown_cache'),  # 磁盘缓存目录, 为空时不使用磁盘缓存
+    'memory_cache_size': 32,   # 进程内缓存的文档个数
+    'engine': 'auto',          # auto: python-docx失败时回退pandoc; docx: 只用python-docx; pandoc: 只用pandoc
+}
+
+_HEADING_STYLE = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+_MD_SPECIAL = re.compile(r'([\\`*_\[\]])')
+
 
 def word_to_markdown(input_file, output_file):
     '''
@@ -15,3 +52,261 @@ def word_to_markdown(input_file, output_file):
         print(f"转换失败: {e}")
 
 
+def _file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _run_text(run) -> str:
+    text = _MD_SPECIAL.sub(r'\\\1', run.text)
+    if not text.strip():
+        return text
+    if run.bold and run.italic:
+        return f"***{text}***"
+    if run.bold:
+        return f"**{text}**"
+    if run.italic:
+        return f"*{text}*"
+    return text
+
+
+_nested_runs_xpath = None
+
+
+def _nested_runs(element) -> List[Any]:
+    """元素内(不在修订删除中)的所有<w:r>"""
+    global _nested_runs_xpath
+    if _nested_runs_xpath is None:
+        from docx.oxml.ns import nsmap
+        from lxml import etree
+        # 预编译并显式指定命名空间: 未注册的元素(如w:ins)不支持python-docx的xpath前缀
+        _nested_runs_xpath = etree.XPath(
+            './/w:r[not(ancestor::w:del) and not(ancestor::w:moveFrom)]', namespaces={'w': nsmap['w']}
+        )
+    return _nested_runs_xpath(element)
+
+
+def _inline_text(paragraph) -> str:
+    """段落的行内文本
+
+    paragraph.runs只包含段落直接的<w:r>子元素, 超链接、修订插入(w:ins)、域(w:fldSimple)、
+    内容控件(w:sdt)等元素中的文字需要单独处理; 修订删除(w:del/w:moveFrom)的内容不输出
+    """
+    from docx.text.hyperlink import Hyperlink
+    from docx.text.run import Run
+
+    parts = []
+    for child in paragraph._p.iterchildren():
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'r':
+            parts.append(_run_text(Run(child, paragraph)))
+        elif tag == 'hyperlink':
+            hyperlink = Hyperlink(child, paragraph)
+            text = ''.join(_run_text(run) for run in hyperlink.runs)
+            url = hyperlink.url
+            parts.append(f"[{text}]({url})" if url and text.strip() else text)
+        elif tag not in ('pPr', 'del', 'moveFrom'):
+            parts.extend(_run_text(Run(r, paragraph)) for r in _nested_runs(child))
+    return ''.join(parts)
+
+
+def _paragraph_to_markdown(paragraph) -> str:
+    text = _inline_text(paragraph).strip()
+    if not text:
+        return ''
+    style_name = (paragraph.style.name if paragraph.style is not None else '') or ''
+    match = _HEADING_STYLE.match(style_name.strip())
+    if match:
+        # 标题整体已经是强调, 去掉加粗标记
+        return f"{'#' * min(int(match.group(1)), 6)} {text.replace('**', '')}"
+    if style_name == 'Title':
+        return f"# {text.replace('**', '')}"
+    num_pr = paragraph._p.pPr.numPr if paragraph._p.pPr is not None else None
+    if style_name.startswith('List') or num_pr is not None:
+        level = 0
+        if num_pr is not None and num_pr.ilvl is not None:
+            level = int(num_pr.ilvl.val)
+        marker = '1.' if 'Number' in style_name else '-'
+        return f"{'  ' * level}{marker} {text}"
+    return text
+
+
+def _cell_text(cell) -> str:
+    lines = [_inline_text(p).strip() for p in cell.paragraphs]
+    return '<br>'.join(line for line in lines if line).replace('|', '\\|')
+
+
+def _table_to_markdown(table) -> str:
+    rows = []
+    for row in table.rows:
+        cells, previous = [], None
+        for cell in row.cells:
+            # 合并单元格在python-docx中会重复返回同一个单元格, 只保留一次内容
+            cells.append('' if cell._tc is previous else _cell_text(cell))
+            previous = cell._tc
+        rows.append(cells)
+    if not rows:
+        return ''
+    width = max(len(cells) for cells in rows)
+    rows = [cells + [''] * (width - len(cells)) for cells in rows]
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '| ' + ' | '.join(['---'] * width) + ' |']
+    lines.extend('| ' + ' | '.join(cells) + ' |' for cells in rows[1:])
+    return '\n'.join(lines)
+
+
+def docx_to_markdown_text(path: str) -> str:
+    """用python-docx把docx转换为Markdown文本(按正文中段落和表格的原始顺序)"""
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    document = Document(path)
+    blocks = []
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            block = _paragraph_to_markdown(Paragraph(element, document))
+        elif tag == 'tbl':
+            block = _table_to_markdown(Table(element, document))
+        else:
+            continue
+        if block:
+            blocks.append(block)
+    # 相邻的列表项之间不空行
+    output = []
+    for block in blocks:
+        is_item = re.match(r'^\s*(-|1\.) ', block) is not None
+        if output and is_item and output[-1][1]:
+            output[-1] = (output[-1][0] + '\n' + block, True)
+        else:
+            output.append((block, is_item))
+    return '\n\n'.join(block for block, _ in output) + '\n'
+
+
+class DocxMarkdownConverter:
+    """带缓存的docx转Markdown服务, 线程安全"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**DEFAULT_DOCX_CONVERSION_CONFIG, **(config or {})}
+        self._memory = collections.OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._hash_locks: Dict[str, List] = {}   # sha256 -> [锁, 引用计数]
+        self._hash_locks_lock = threading.Lock()
+
+    def _acquire_hash_lock(self, key: str) -> threading.Lock:
+        with self._hash_locks_lock:
+            entry = self._hash_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry[0]
+
+    def _release_hash_lock(self, key: str):
+        with self._hash_locks_lock:
+            entry = self._hash_locks[key]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._hash_locks[key]
+
+    def _cache_key(self, sha256: str) -> str:
+        return f"{sha256}.v{CONVERTER_VERSION}"
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        cache_dir = self.config['cache_dir']
+        return os.path.join(cache_dir, key[:2], f"{key}.md") if cache_dir else None
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    markdown = f.read()
+            except OSError as e:
+                logger.warning(f"读取Markdown缓存失败: {path}, {str(e)}")
+                return None
+            self._remember(key, markdown)
+            return markdown
+        return None
+
+    def _remember(self, key: str, markdown: str):
+        with self._memory_lock:
+            self._memory[key] = markdown
+            self._memory.move_to_end(key)
+            while len(self._memory) > max(self.config['memory_cache_size'], 0):
+                self._memory.popitem(last=False)
+
+    def _store(self, key: str, markdown: str):
+        self._remember(key, markdown)
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.md_', suffix='.part')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(markdown)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入Markdown缓存失败: {path}, {str(e)}")
+
+    def _convert(self, path: str) -> str:
+        engine = self.config['engine']
+        if engine != 'pandoc':
+            try:
+                return docx_to_markdown_text(path)
+            except Exception as e:
+                if engine == 'docx':
+                    raise
+                logger.warning(f"python-docx转换失败, 回退到pandoc: {path}, {str(e)}")
+        return pypandoc.convert_file(path, 'markdown')
+
+    def convert(self, path: str, sha256: Optional[str] = None) -> str:
+        """把docx文件转换为Markdown文本
+
+        Args:
+            path: docx文件路径
+            sha256: 文件内容的sha256(上传时已计算的可直接传入), 为空时读取文件计算
+        """
+        key = self._cache_key(sha256 or _file_sha256(path))
+        markdown = self._get_cached(key)
+        if markdown is not None:
+            logger.info(f"Word文档转换命中缓存: {path}")
+            return markdown
+
+        self._acquire_hash_lock(key)
+        try:
+            # 等锁期间其他线程可能已完成同一文件的转换
+            markdown = self._get_cached(key)
+            if markdown is None:
+                markdown = self._convert(path)
+                self._store(key, markdown)
+                logger.info(f"Word文档转换完成: {path}, Markdown长度: {len(markdown)}")
+            return markdown
+        finally:
+            self._release_hash_lock(key)
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_docx_converter() -> DocxMarkdownConverter:
+    """获取进程内共享的docx转换服务（单例模式）"""
+    global _converter
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                _converter = DocxMarkdownConverter(getattr(settings, 'DOCX_CONVERSION_CONFIG', {}))
+    return _converter
+
+
+def docx_to_markdown(path: str, sha256: Optional[str] = None) -> str:
+    """把docx文件转换为Markdown文本, 结果按内容hash缓存"""
+    return get_docx_converter().convert(path, sha256)